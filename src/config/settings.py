@@ -9,9 +9,96 @@ MINIO_ENDPOINT: str = f"{MINIO_HOST}:{MINIO_PORT}"
 MINIO_ROOT_USER: str = config("MINIO_ROOT_USER")
 MINIO_ROOT_PASSWORD: str = config("MINIO_ROOT_PASSWORD")
 
+MINIO_PART_SIZE: int = config("MINIO_PART_SIZE", default=32 * 1024 * 1024, cast=int)
+MINIO_PARALLEL_PART_UPLOADS: int = config(
+    "MINIO_PARALLEL_PART_UPLOADS", default=8, cast=int
+)
+MINIO_ASYNC_MAX_CONNECTIONS: int = config(
+    "MINIO_ASYNC_MAX_CONNECTIONS", default=512, cast=int
+)
+MINIO_MAX_WORKERS: int = config("MINIO_MAX_WORKERS", default=32, cast=int)
+MINIO_ADAPTIVE_CONCURRENCY: bool = config(
+    "MINIO_ADAPTIVE_CONCURRENCY", default=True, cast=bool
+)
+MINIO_MIN_CONCURRENCY: int = config("MINIO_MIN_CONCURRENCY", default=1, cast=int)
+# Bandwidth cap over the client's requests, 0 for unlimited
+MINIO_MAX_BYTES_PER_SECOND: int = config(
+    "MINIO_MAX_BYTES_PER_SECOND", default=0, cast=int
+)
+
 MINIO_PENDING_ANNOTATIONS_BUCKET_NAME: str = config(
     "MINIO_PENDING_ANNOTATIONS_BUCKET_NAME"
 )
 MINIO_PENDING_REVIEWS_BUCKET_NAME: str = config("MINIO_PENDING_REVIEWS_BUCKET_NAME")
 MINIO_DATA_SOURCES_BUCKET_NAME: str = config("MINIO_DATA_SOURCES_BUCKET_NAME")
 MINIO_DATASETS_BUCKET_NAME: str = config("MINIO_DATASETS_BUCKET_NAME")
+
+FILESYSTEM_BUCKETS_ROOT_PATH: str = config(
+    "FILESYSTEM_BUCKETS_ROOT_PATH", default="buckets"
+)
+
+LOCAL_SYNC_SCAN_WORKERS: int = config("LOCAL_SYNC_SCAN_WORKERS", default=16, cast=int)
+LOCAL_SYNC_DELETE_REMOVED: bool = config(
+    "LOCAL_SYNC_DELETE_REMOVED", default=False, cast=bool
+)
+LOCAL_SYNC_VERIFY_CHECKSUMS: bool = config(
+    "LOCAL_SYNC_VERIFY_CHECKSUMS", default=False, cast=bool
+)
+
+# Path of the SQLite journal of the uploads, from which interrupted uploads resume, empty to disable
+DATA_UPLOAD_JOURNAL_PATH: str = config("DATA_UPLOAD_JOURNAL_PATH", default="")
+
+HUGGINGFACE_STREAMING: bool = config("HUGGINGFACE_STREAMING", default=False, cast=bool)
+# Folder holding local copies of the HuggingFace datasets, as `{path}/{dataset name}`
+HUGGINGFACE_DATASETS_PATH: str = config("HUGGINGFACE_DATASETS_PATH", default="")
+# Number of processes encoding and hashing the images, 0 to do it in the uploading threads
+HUGGINGFACE_ENCODE_WORKERS: int = config(
+    "HUGGINGFACE_ENCODE_WORKERS", default=0, cast=int
+)
+# "original" to keep the source's bytes, or "png", "webp" or "jpeg" to transcode the images
+HUGGINGFACE_IMAGE_FORMAT: str = config("HUGGINGFACE_IMAGE_FORMAT", default="original")
+HUGGINGFACE_IMAGE_QUALITY: int = config(
+    "HUGGINGFACE_IMAGE_QUALITY", default=90, cast=int
+)
+# 0 to keep the images' size
+HUGGINGFACE_IMAGE_MAX_SIDE: int = config(
+    "HUGGINGFACE_IMAGE_MAX_SIDE", default=0, cast=int
+)
+
+DATASET_PREPARATION_FETCH_WORKERS: int = config(
+    "DATASET_PREPARATION_FETCH_WORKERS", default=16, cast=int
+)
+DATASET_PREPARATION_VALIDATE_WORKERS: int = config(
+    "DATASET_PREPARATION_VALIDATE_WORKERS", default=4, cast=int
+)
+DATASET_PREPARATION_COPY_WORKERS: int = config(
+    "DATASET_PREPARATION_COPY_WORKERS", default=16, cast=int
+)
+DATASET_PREPARATION_MAX_IN_FLIGHT: int = config(
+    "DATASET_PREPARATION_MAX_IN_FLIGHT", default=256, cast=int
+)
+DATASET_PREPARATION_IMAGE_VALIDATION_LEVEL: str = config(
+    "DATASET_PREPARATION_IMAGE_VALIDATION_LEVEL", default="header"
+)
+# Large enough for JPEG headers, whose EXIF segment alone can take up to 64 KiB
+DATASET_PREPARATION_IMAGE_HEADER_SIZE: int = config(
+    "DATASET_PREPARATION_IMAGE_HEADER_SIZE", default=64 * 1024, cast=int
+)
+
+DATA_SOURCE_ANNOTATION_LAYOUT: str = config(
+    "DATA_SOURCE_ANNOTATION_LAYOUT", default="objects"
+)
+DATASET_ANNOTATION_LAYOUT: str = config("DATASET_ANNOTATION_LAYOUT", default="objects")
+ANNOTATION_BATCH_SIZE: int = config(
+    "ANNOTATION_BATCH_SIZE", default=4 * 1024 * 1024, cast=int
+)
+ANNOTATION_BATCH_COMPRESSION: bool = config(
+    "ANNOTATION_BATCH_COMPRESSION", default=False, cast=bool
+)
+
+DATASET_SPLIT_STRATEGY: str = config("DATASET_SPLIT_STRATEGY", default="hash")
+
+DATASET_FORMAT: str = config("DATASET_FORMAT", default="objects")
+DATASET_SHARD_SIZE: int = config(
+    "DATASET_SHARD_SIZE", default=256 * 1024 * 1024, cast=int
+)
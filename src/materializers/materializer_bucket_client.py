@@ -6,12 +6,19 @@ from zenml.enums import ArtifactType
 from zenml.io import fileio
 from zenml.materializers.base_materializer import BaseMaterializer
 
-from src.config.settings import MINIO_ENDPOINT, MINIO_ROOT_USER, MINIO_ROOT_PASSWORD
-from src.models.model_bucket_client import MinioClient, BucketClient
+from src.config.settings import MINIO_ENDPOINT, MINIO_ROOT_PASSWORD, MINIO_ROOT_USER
+from src.models.model_bucket_client import (
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_PARALLEL_PART_UPLOADS,
+    DEFAULT_PART_SIZE,
+    BucketClient,
+    MinioClient,
+)
+from src.models.model_filesystem_bucket_client import FilesystemBucketClient
 
 
 class BucketClientMaterializer(BaseMaterializer):
-    ASSOCIATED_TYPES = (BucketClient, MinioClient)
+    ASSOCIATED_TYPES = (BucketClient, MinioClient, FilesystemBucketClient)
     ASSOCIATED_ARTIFACT_TYPE = ArtifactType.DATA
 
     def load(self, data_type: Type[BucketClient]) -> BucketClient:
@@ -26,6 +33,19 @@ class BucketClientMaterializer(BaseMaterializer):
                 access_key=MINIO_ROOT_USER,
                 secret_key=MINIO_ROOT_PASSWORD,
                 secure=config["secure"],
+                max_workers=config.get("max_workers", DEFAULT_MAX_WORKERS),
+                part_size=config.get("part_size", DEFAULT_PART_SIZE),
+                parallel_part_uploads=config.get(
+                    "parallel_part_uploads", DEFAULT_PARALLEL_PART_UPLOADS
+                ),
+                adaptive_concurrency=config.get("adaptive_concurrency", True),
+                min_concurrency=config.get("min_concurrency", 1),
+                max_bytes_per_second=config.get("max_bytes_per_second"),
+            )
+        elif config["class"] == "FilesystemBucketClient":
+            return FilesystemBucketClient(
+                root_path=config["root_path"],
+                max_workers=config.get("max_workers", DEFAULT_MAX_WORKERS),
             )
         else:
             raise NotImplementedError(
@@ -35,7 +55,22 @@ class BucketClientMaterializer(BaseMaterializer):
     def save(self, bucket_client: BucketClient) -> None:
         """Serialize BucketClient object."""
         if isinstance(bucket_client, MinioClient):
-            config = {"class": "MinioClient", "secure": bucket_client.secure}
+            config = {
+                "class": "MinioClient",
+                "secure": bucket_client.secure,
+                "max_workers": bucket_client.max_workers,
+                "part_size": bucket_client.part_size,
+                "parallel_part_uploads": bucket_client.parallel_part_uploads,
+                "adaptive_concurrency": bucket_client.adaptive_concurrency,
+                "min_concurrency": bucket_client.min_concurrency,
+                "max_bytes_per_second": bucket_client.max_bytes_per_second,
+            }
+        elif isinstance(bucket_client, FilesystemBucketClient):
+            config = {
+                "class": "FilesystemBucketClient",
+                "root_path": bucket_client.root_path,
+                "max_workers": bucket_client.max_workers,
+            }
         else:
             raise NotImplementedError(
                 f"Serialization for {type(bucket_client)} not implemented"
@@ -2,7 +2,7 @@
 
 import json
 import os
-from typing import Type
+from typing import Any, Type
 
 from zenml.enums import ArtifactType
 from zenml.io import fileio
@@ -14,6 +14,7 @@ from src.models.model_data_source import (
     HuggingFaceDataSource,
     LocalDataSource,
 )
+from src.models.model_image_transcoding import ImageTranscodingPolicy
 
 
 class DataSourceMaterializer(BaseMaterializer):
@@ -24,7 +25,7 @@ class DataSourceMaterializer(BaseMaterializer):
         """Serialize a DataSourceList object."""
         serialized_data_sources = []
         for data_source in data_source_list.data_sources:
-            data_source_info = {
+            data_source_info: dict[str, Any] = {
                 "class": data_source.__class__.__name__,
                 "root_folder_path": data_source.root_folder_path,
                 "object_folder_path": data_source.object_folder_path,
@@ -35,6 +36,11 @@ class DataSourceMaterializer(BaseMaterializer):
             if isinstance(data_source, HuggingFaceDataSource):
                 data_source_info["dataset_name"] = data_source.dataset_name
                 data_source_info["api_token"] = data_source.api_token
+                data_source_info["streaming"] = data_source.streaming
+                data_source_info["local_path"] = data_source.local_path
+                data_source_info[
+                    "image_transcoding"
+                ] = data_source.image_transcoding.to_dict()
 
             serialized_data_sources.append(data_source_info)
 
@@ -54,6 +60,11 @@ class DataSourceMaterializer(BaseMaterializer):
                 data_source: DataSource = HuggingFaceDataSource(
                     dataset_name=data_source_info["dataset_name"],
                     api_token=data_source_info.get("api_token"),
+                    streaming=data_source_info.get("streaming", False),
+                    local_path=data_source_info.get("local_path"),
+                    image_transcoding=ImageTranscodingPolicy.from_dict(
+                        data_source_info.get("image_transcoding", {})
+                    ),
                 )
             elif data_source_info["class"] == "LocalDataSource":
                 data_source = LocalDataSource(
@@ -6,7 +6,8 @@ from zenml.enums import ArtifactType
 from zenml.io import fileio
 from zenml.materializers.base_materializer import BaseMaterializer
 
-from src.models.model_dataset import Dataset
+from src.models.model_annotation_batch import AnnotationLayout
+from src.models.model_dataset import Dataset, DatasetFormat, SplitStrategy
 
 
 class DatasetMaterializer(BaseMaterializer):
@@ -22,6 +23,13 @@ class DatasetMaterializer(BaseMaterializer):
             "annotations_path": dataset.annotations_path,
             "images_path": dataset.images_path,
             "distribution_weights": dataset.distribution_weights,
+            "dataset_format": dataset.dataset_format.value,
+            "shards_path": dataset.shards_path,
+            "annotation_layout": dataset.annotation_layout.value,
+            "annotation_batch_size": dataset.annotation_batch_size,
+            "compress_annotations": dataset.compress_annotations,
+            "split_strategy": dataset.split_strategy.value,
+            "parent_uuid": dataset.parent_uuid,
         }
 
         data_path = os.path.join(self.uri, "dataset_config.json")
@@ -40,6 +48,23 @@ class DatasetMaterializer(BaseMaterializer):
             annotations_path=serialized_dataset["annotations_path"],
             images_path=serialized_dataset["images_path"],
             distribution_weights=serialized_dataset["distribution_weights"],
+            # Datasets serialized before sharding was introduced are stored as objects
+            dataset_format=DatasetFormat(
+                serialized_dataset.get("dataset_format", DatasetFormat.OBJECTS)
+            ),
+            shards_path=serialized_dataset.get("shards_path", "shards"),
+            annotation_layout=AnnotationLayout(
+                serialized_dataset.get("annotation_layout", AnnotationLayout.OBJECTS)
+            ),
+            annotation_batch_size=serialized_dataset.get(
+                "annotation_batch_size", 4 * 1024 * 1024
+            ),
+            compress_annotations=serialized_dataset.get("compress_annotations", False),
+            # Datasets serialized before the hash strategy was introduced were split in sequence
+            split_strategy=SplitStrategy(
+                serialized_dataset.get("split_strategy", SplitStrategy.SEQUENTIAL)
+            ),
+            parent_uuid=serialized_dataset.get("parent_uuid"),
         )
         dataset.uuid = serialized_dataset["uuid"]  # Manually setting the uuid
 
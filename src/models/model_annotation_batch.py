@@ -0,0 +1,241 @@
+import gzip
+import json
+import threading
+from enum import Enum
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from src.models.model_bucket_client import BucketClient
+
+ANNOTATION_INDEX_FILE_NAME = "annotation_index.jsonl"
+ANNOTATION_BATCH_EXTENSION = "jsonl"
+COMPRESSED_ANNOTATION_BATCH_EXTENSION = "jsonl.gz"
+
+
+class AnnotationLayout(str, Enum):
+    # One JSON object per annotation
+    OBJECTS = "objects"
+    # Annotations packed into JSON lines batches, located through an offset index
+    BATCHED = "batched"
+
+
+class BatchedAnnotation:
+    def __init__(
+        self, annotation_path: str, batch_object_name: str, offset: int, length: int
+    ):
+        """
+        Initialize a BatchedAnnotation, the location of an annotation within a batch object.
+
+        Args:
+            annotation_path (str): The annotation's path, as it would be named in the objects
+                layout.
+            batch_object_name (str): Name of the batch object holding the annotation.
+            offset (int): Offset of the annotation's record in the batch object, in bytes.
+            length (int): Length of the annotation's record in the batch object, in bytes.
+        """
+        self.annotation_path = annotation_path
+        self.batch_object_name = batch_object_name
+        self.offset = offset
+        self.length = length
+
+    @property
+    def is_compressed(self) -> bool:
+        return self.batch_object_name.endswith(".gz")
+
+    def decode(self, record_data: bytes) -> bytes:
+        """
+        Decodes the annotation's record, as read from its batch, into the annotation's JSON
+        content.
+        """
+        if self.is_compressed:
+            record_data = gzip.decompress(record_data)
+        return record_data.rstrip(b"\n")
+
+    def read_from_batch(self, batch_data: bytes) -> bytes:
+        """
+        Reads the annotation's JSON content from the whole content of its batch.
+        """
+        return self.decode(batch_data[self.offset : self.offset + self.length])
+
+    def to_dict(self) -> dict:
+        return {
+            "annotation_path": self.annotation_path,
+            "batch_object_name": self.batch_object_name,
+            "offset": self.offset,
+            "length": self.length,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "BatchedAnnotation":
+        return BatchedAnnotation(
+            annotation_path=data["annotation_path"],
+            batch_object_name=data["batch_object_name"],
+            offset=data["offset"],
+            length=data["length"],
+        )
+
+
+class AnnotationBatchIndex:
+    def __init__(self, entries: Optional[List[BatchedAnnotation]] = None):
+        """
+        Initialize an AnnotationBatchIndex, the offset index of annotations packed into batches.
+
+        The index is stored as a JSON lines object, one entry per annotation in the order they
+        were packed, i.e. batch by batch. It lets a single annotation be read with a ranged
+        request, and a whole batch be read once for all of its annotations.
+
+        Args:
+            entries (Optional[List[BatchedAnnotation]]): The index's initial entries.
+        """
+        self._entries: dict[str, BatchedAnnotation] = {
+            entry.annotation_path: entry for entry in entries or []
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[BatchedAnnotation]:
+        return iter(self._entries.values())
+
+    def __contains__(self, annotation_path: str) -> bool:
+        return annotation_path in self._entries
+
+    def get(self, annotation_path: str) -> Optional[BatchedAnnotation]:
+        return self._entries.get(annotation_path)
+
+    def add_entry(self, entry: BatchedAnnotation) -> None:
+        self._entries[entry.annotation_path] = entry
+
+    def get_batch_object_names(self) -> List[str]:
+        return list(dict.fromkeys(entry.batch_object_name for entry in self))
+
+    def to_bytes(self) -> bytes:
+        return "".join(json.dumps(entry.to_dict()) + "\n" for entry in self).encode()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "AnnotationBatchIndex":
+        return AnnotationBatchIndex(
+            entries=[
+                BatchedAnnotation.from_dict(json.loads(line))
+                for line in data.decode("utf-8").splitlines()
+                if line.strip()
+            ]
+        )
+
+    @staticmethod
+    def get_index_object_name(folder_name: str) -> str:
+        return f"{folder_name}/{ANNOTATION_INDEX_FILE_NAME}"
+
+    @staticmethod
+    def download(
+        bucket_client: BucketClient, bucket_name: str, folder_name: str
+    ) -> Optional["AnnotationBatchIndex"]:
+        """
+        Downloads the annotation index of a folder, i.e. of a data source or a dataset's split.
+
+        Args:
+            bucket_client (BucketClient): The bucket client to download the index with.
+            bucket_name (str): Name of the bucket holding the index.
+            folder_name (str): Name of the folder the index describes.
+
+        Returns:
+            Optional[AnnotationBatchIndex]: The index, or None if there is none.
+        """
+        index_data = bucket_client.get_object_data_or_none(
+            bucket_name=bucket_name,
+            object_name=AnnotationBatchIndex.get_index_object_name(folder_name),
+        )
+        if index_data is None:
+            return None
+
+        return AnnotationBatchIndex.from_bytes(index_data)
+
+
+class AnnotationBatchWriter:
+    def __init__(
+        self,
+        format_batch_path: Callable[[int, str], str],
+        batch_size: int = 4 * 1024 * 1024,
+        compress: bool = False,
+    ):
+        """
+        Initialize an AnnotationBatchWriter, packing annotations into JSON lines batches of about
+        `batch_size` bytes, and indexing where each one is stored.
+
+        With `compress`, each record is compressed as its own gzip member. The concatenated
+        members form a regular gzip file, while each record can still be read and decompressed
+        on its own from a ranged request. Safe to call from several threads.
+
+        Args:
+            format_batch_path (Callable[[int, str], str]): Formats a batch's object name from
+                its number and extension.
+            batch_size (int): Size from which a batch is closed and the next one started.
+            compress (bool): Whether the records are gzip-compressed.
+        """
+        self.format_batch_path = format_batch_path
+        self.batch_size = max(1, batch_size)
+        self.compress = compress
+        self.index = AnnotationBatchIndex()
+
+        self._batch_number = 0
+        self._records: List[bytes] = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(
+        self, annotation_path: str, annotation: dict
+    ) -> Optional[Tuple[str, bytes]]:
+        """
+        Appends an annotation to the current batch.
+
+        Returns:
+            Optional[Tuple[str, bytes]]: The object name and content of the batch closed by the
+                annotation, to be uploaded, or None if the batch is not full yet.
+        """
+        record = json.dumps(annotation).encode() + b"\n"
+        if self.compress:
+            record = gzip.compress(record, mtime=0)
+
+        with self._lock:
+            self.index.add_entry(
+                BatchedAnnotation(
+                    annotation_path=annotation_path,
+                    batch_object_name=self._get_batch_object_name(),
+                    offset=self._size,
+                    length=len(record),
+                )
+            )
+            self._records.append(record)
+            self._size += len(record)
+
+            if self._size < self.batch_size:
+                return None
+            return self._close_batch()
+
+    def get_open_batch(self) -> Optional[Tuple[str, bytes]]:
+        """
+        Gets the batch being filled, without closing it. Once uploaded, the batch is uploaded
+        again under the same name, with more annotations, when it gets closed.
+
+        Returns:
+            Optional[Tuple[str, bytes]]: The object name and content of the open batch, or None
+                if it is empty.
+        """
+        with self._lock:
+            if not self._records:
+                return None
+            return self._get_batch_object_name(), b"".join(self._records)
+
+    def _close_batch(self) -> Tuple[str, bytes]:
+        batch = (self._get_batch_object_name(), b"".join(self._records))
+        self._batch_number += 1
+        self._records = []
+        self._size = 0
+        return batch
+
+    def _get_batch_object_name(self) -> str:
+        return self.format_batch_path(
+            self._batch_number,
+            COMPRESSED_ANNOTATION_BATCH_EXTENSION
+            if self.compress
+            else ANNOTATION_BATCH_EXTENSION,
+        )
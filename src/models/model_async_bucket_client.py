@@ -0,0 +1,439 @@
+import hashlib
+import hmac
+import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Mapping
+from urllib.parse import quote
+
+import aiohttp
+from minio import S3Error
+from minio.datatypes import Object
+from minio.helpers import ObjectWriteResult
+from yarl import URL
+
+from src.models.model_concurrency_controller import AsyncConcurrencyController
+
+S3_NAMESPACE = {"s3": "http://s3.amazonaws.com/doc/2006-03-01/"}
+DEFAULT_MAX_CONNECTIONS = 512
+DEFAULT_REGION = "us-east-1"
+
+
+class AsyncBucketClient(ABC):
+    async def __aenter__(self) -> "AsyncBucketClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @abstractmethod
+    async def check_connection(self) -> None:
+        pass
+
+    @abstractmethod
+    async def bucket_exists(self, bucket_name: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def upload_data(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data: bytes,
+        metadata: dict | None = None,
+    ) -> ObjectWriteResult:
+        pass
+
+    @abstractmethod
+    def list_objects(
+        self, bucket_name: str, prefix: str | None = None, recursive: bool = False
+    ) -> AsyncIterator[Object]:
+        pass
+
+    @abstractmethod
+    async def get_object(
+        self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0
+    ) -> bytes:
+        pass
+
+    @abstractmethod
+    async def get_object_with_headers(
+        self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0
+    ) -> tuple[bytes, Mapping[str, str]]:
+        pass
+
+    @abstractmethod
+    async def stat_object(self, bucket_name: str, object_name: str) -> Object:
+        pass
+
+    @abstractmethod
+    async def copy_object(
+        self,
+        source_bucket_name: str,
+        source_object_name: str,
+        destination_bucket_name: str,
+        destination_object_name: str,
+    ) -> str:
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        pass
+
+    async def get_object_data_or_none(
+        self, bucket_name: str, object_name: str
+    ) -> bytes | None:
+        """
+        Asynchronous counterpart of `BucketClient.get_object_data_or_none`.
+        """
+        try:
+            return await self.get_object(
+                bucket_name=bucket_name, object_name=object_name
+            )
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise e
+
+
+class AsyncMinioClient(AsyncBucketClient):
+    def __init__(
+        self,
+        endpoint: str,
+        access_key: str,
+        secret_key: str,
+        secure: bool = False,
+        region: str = DEFAULT_REGION,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        concurrency_controller: AsyncConcurrencyController | None = None,
+    ):
+        """
+        Asynchronous client for S3-compatible storages such as MinIO, signing its requests with
+        AWS Signature Version 4. Up to `max_connections` requests are kept in flight on a single
+        event loop, without a thread per request. With a `concurrency_controller`, the number of
+        requests in flight adapts to the storage's latency and throttling, up to its limit.
+
+        The HTTP session is bound to the running event loop: use the client as an async context
+        manager, or call `close` before the loop ends.
+        """
+        self.endpoint = endpoint
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.secure = secure
+        self.region = region
+        self.max_connections = max_connections
+        self.concurrency_controller = concurrency_controller
+
+        self._session: aiohttp.ClientSession | None = None
+
+    async def check_connection(self) -> None:
+        try:
+            await self._request("GET", "/")
+        except S3Error as e:
+            raise e
+        except Exception as e:
+            raise ConnectionError("Failed to connect to MinIO") from e
+
+    async def bucket_exists(self, bucket_name: str) -> bool:
+        try:
+            await self._request("HEAD", self._get_path(bucket_name))
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchBucket", "NotFound"):
+                return False
+            raise e
+
+    async def upload_data(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data: bytes,
+        metadata: dict | None = None,
+    ) -> ObjectWriteResult:
+        headers = {"Content-Type": "application/octet-stream"}
+        for key, value in (metadata or {}).items():
+            if value is not None:
+                headers[f"x-amz-meta-{key}"] = str(value)
+
+        _, response_headers, _ = await self._request(
+            "PUT",
+            self._get_path(bucket_name, object_name),
+            headers=headers,
+            body=data,
+        )
+        return ObjectWriteResult(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            version_id=response_headers.get("x-amz-version-id"),
+            etag=response_headers.get("ETag", "").strip('"'),
+            http_headers=response_headers,
+        )
+
+    async def list_objects(
+        self, bucket_name: str, prefix: str | None = None, recursive: bool = False
+    ) -> AsyncIterator[Object]:
+        query = {"list-type": "2", "prefix": prefix or ""}
+        if not recursive:
+            query["delimiter"] = "/"
+
+        while True:
+            _, _, body = await self._request(
+                "GET", self._get_path(bucket_name), query=query
+            )
+            root = ET.fromstring(body)
+
+            objects = [
+                Object(
+                    bucket_name=bucket_name,
+                    object_name=content.findtext("s3:Key", namespaces=S3_NAMESPACE),
+                    last_modified=datetime.fromisoformat(
+                        content.findtext(
+                            "s3:LastModified", default="", namespaces=S3_NAMESPACE
+                        )
+                    ),
+                    etag=content.findtext(
+                        "s3:ETag", default="", namespaces=S3_NAMESPACE
+                    ).strip('"'),
+                    size=int(
+                        content.findtext("s3:Size", default="", namespaces=S3_NAMESPACE)
+                    ),
+                )
+                for content in root.findall("s3:Contents", S3_NAMESPACE)
+            ]
+            objects += [
+                Object(
+                    bucket_name=bucket_name,
+                    object_name=common_prefix.findtext(
+                        "s3:Prefix", namespaces=S3_NAMESPACE
+                    ),
+                )
+                for common_prefix in root.findall("s3:CommonPrefixes", S3_NAMESPACE)
+            ]
+
+            # Objects and folders are listed separately within a page
+            for obj in sorted(objects, key=lambda o: o.object_name):
+                yield obj
+
+            if root.findtext("s3:IsTruncated", namespaces=S3_NAMESPACE) != "true":
+                return
+            query["continuation-token"] = root.findtext(
+                "s3:NextContinuationToken", default="", namespaces=S3_NAMESPACE
+            )
+
+    async def get_object(
+        self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0
+    ) -> bytes:
+        body, _ = await self.get_object_with_headers(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            offset=offset,
+            length=length,
+        )
+        return body
+
+    async def get_object_with_headers(
+        self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0
+    ) -> tuple[bytes, Mapping[str, str]]:
+        """
+        Reads an object, or a range of it, along with the response's headers, such as the ETag
+        of the object the range was read from.
+        """
+        headers = {}
+        if offset or length:
+            end = (offset + length - 1) if length else ""
+            headers["Range"] = f"bytes={offset}-{end}"
+
+        _, response_headers, body = await self._request(
+            "GET", self._get_path(bucket_name, object_name), headers=headers
+        )
+        return body, response_headers
+
+    async def stat_object(self, bucket_name: str, object_name: str) -> Object:
+        _, headers, _ = await self._request(
+            "HEAD", self._get_path(bucket_name, object_name)
+        )
+        return Object(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            last_modified=parsedate_to_datetime(headers["Last-Modified"])
+            if "Last-Modified" in headers
+            else None,
+            etag=headers.get("ETag", "").strip('"'),
+            size=int(headers.get("Content-Length", 0)),
+            metadata=dict(headers),
+            version_id=headers.get("x-amz-version-id"),
+            content_type=headers.get("Content-Type"),
+        )
+
+    async def copy_object(
+        self,
+        source_bucket_name: str,
+        source_object_name: str,
+        destination_bucket_name: str,
+        destination_object_name: str,
+    ) -> str:
+        _, _, body = await self._request(
+            "PUT",
+            self._get_path(destination_bucket_name, destination_object_name),
+            headers={
+                "x-amz-copy-source": self._get_path(
+                    source_bucket_name, source_object_name
+                )
+            },
+            # A copy lasts as long as the object is large, which is not known here
+            measure_latency=False,
+        )
+        root = ET.fromstring(body)
+        # Copies can fail after a 200 OK, with the error in the response's body
+        if root.tag == "Error":
+            raise self._get_error(root, source_object_name)
+        return root.findtext("s3:ETag", default="", namespaces=S3_NAMESPACE).strip('"')
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=300),
+            )
+        return self._session
+
+    @staticmethod
+    def _get_path(bucket_name: str, object_name: str | None = None) -> str:
+        path = f"/{bucket_name}"
+        if object_name:
+            path += f"/{object_name}"
+        return quote(path, safe="/~")
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        query: dict | None = None,
+        headers: dict | None = None,
+        body: bytes = b"",
+        measure_latency: bool = True,
+    ) -> tuple[int, Mapping[str, str], bytes]:
+        if self.concurrency_controller is None:
+            return await self._send_request(method, path, query, headers, body)
+        return await self.concurrency_controller.call_async(
+            lambda: self._send_request(method, path, query, headers, body),
+            number_of_bytes=len(body),
+            get_response_size=lambda response: len(response[2]),
+            measure_latency=measure_latency,
+        )
+
+    async def _send_request(
+        self,
+        method: str,
+        path: str,
+        query: dict | None,
+        headers: dict | None,
+        body: bytes,
+    ) -> tuple[int, Mapping[str, str], bytes]:
+        canonical_query = "&".join(
+            f"{quote(key, safe='-_.~')}={quote(value, safe='-_.~')}"
+            for key, value in sorted((query or {}).items())
+        )
+        headers = self._sign(method, path, canonical_query, dict(headers or {}), body)
+
+        scheme = "https" if self.secure else "http"
+        url = URL(
+            f"{scheme}://{self.endpoint}{path}"
+            + (f"?{canonical_query}" if canonical_query else ""),
+            encoded=True,
+        )
+
+        async with self._get_session().request(
+            method, url, headers=headers, data=body
+        ) as response:
+            response_body = await response.read()
+            if response.status >= 300:
+                error = (
+                    ET.fromstring(response_body)
+                    if response_body
+                    else ET.Element("Error")
+                )
+                if not response_body:
+                    ET.SubElement(error, "Code").text = (
+                        "NotFound" if response.status == 404 else str(response.status)
+                    )
+                raise self._get_error(error, path)
+            # Header names are matched case-insensitively
+            return response.status, response.headers.copy(), response_body
+
+    def _sign(
+        self,
+        method: str,
+        path: str,
+        canonical_query: str,
+        headers: dict,
+        body: bytes,
+    ) -> dict:
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        scope_date = now.strftime("%Y%m%d")
+        payload_hash = hashlib.sha256(body).hexdigest()
+
+        headers["Host"] = self.endpoint
+        headers["x-amz-date"] = amz_date
+        headers["x-amz-content-sha256"] = payload_hash
+
+        signed_headers = {
+            key.lower(): " ".join(str(value).split())
+            for key, value in headers.items()
+            if key.lower() in ("host", "content-type", "range")
+            or key.lower().startswith("x-amz-")
+        }
+        signed_header_names = ";".join(sorted(signed_headers))
+        canonical_request = "\n".join(
+            [
+                method,
+                path,
+                canonical_query,
+                "".join(
+                    f"{key}:{signed_headers[key]}\n" for key in sorted(signed_headers)
+                ),
+                signed_header_names,
+                payload_hash,
+            ]
+        )
+
+        scope = f"{scope_date}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(
+            [
+                "AWS4-HMAC-SHA256",
+                amz_date,
+                scope,
+                hashlib.sha256(canonical_request.encode()).hexdigest(),
+            ]
+        )
+
+        signing_key = f"AWS4{self.secret_key}".encode()
+        for part in (scope_date, self.region, "s3", "aws4_request"):
+            signing_key = hmac.new(signing_key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(
+            signing_key, string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+
+        headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope},"
+            f" SignedHeaders={signed_header_names}, Signature={signature}"
+        )
+        return headers
+
+    @staticmethod
+    def _get_error(error: ET.Element, resource: str) -> S3Error:
+        return S3Error(
+            code=error.findtext("Code"),
+            message=error.findtext("Message"),
+            resource=error.findtext("Resource") or resource,
+            request_id=error.findtext("RequestId"),
+            host_id=error.findtext("HostId"),
+            response=None,
+        )
@@ -1,17 +1,121 @@
+import hashlib
 import os
 from abc import ABC, abstractmethod
-from typing import Any, BinaryIO, Generator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Generator, Iterable, Iterator, TypeVar
 
+import certifi
 import tqdm
 import urllib3
 from minio import Minio, S3Error
 from minio.commonconfig import ENABLED, CopySource
 from minio.datatypes import Object
+from minio.deleteobjects import DeleteObject
 from minio.helpers import ObjectWriteResult
 from minio.versioningconfig import VersioningConfig
 
+from src.models.model_concurrency_controller import ConcurrencyController
+from src.models.model_download_state import DownloadState
+from src.models.model_transfer_stats import TransferStats
+from src.utils.concurrency_helper import iter_completed
+
+DEFAULT_MAX_WORKERS = 16
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Size of the default Minio connection pool, used as a floor for the tuned pool
+MINIO_DEFAULT_POOL_SIZE = 10
+MINIO_TIMEOUT_SECONDS = 300
+# Multipart uploads hold up to `parallel_part_uploads` parts of `part_size` bytes in memory
+DEFAULT_PART_SIZE = 32 * 1024 * 1024
+DEFAULT_PARALLEL_PART_UPLOADS = 8
+
+T = TypeVar("T")
+
+
+class ChecksumReader:
+    def __init__(self, stream: BinaryIO):
+        """
+        Wraps a binary stream, computing the SHA-256 and MD5 checksums of the bytes read from it.
+
+        Args:
+            stream (BinaryIO): The stream to read from, read sequentially.
+        """
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+        self.md5 = hashlib.md5()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.sha256.update(data)
+        self.md5.update(data)
+        return data
+
+
+class UploadRequest:
+    def __init__(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data: BinaryIO,
+        length: int,
+        metadata: dict | None = None,
+    ):
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.data = data
+        self.length = length
+        self.metadata = metadata
+
+
+class GetRequest:
+    def __init__(
+        self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0
+    ):
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.offset = offset
+        self.length = length
+
+
+class StatRequest:
+    def __init__(self, bucket_name: str, object_name: str):
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+
+
+class CopyRequest:
+    def __init__(
+        self,
+        source_bucket_name: str,
+        source_object_name: str,
+        destination_bucket_name: str,
+        destination_object_name: str,
+    ):
+        self.source_bucket_name = source_bucket_name
+        self.source_object_name = source_object_name
+        self.destination_bucket_name = destination_bucket_name
+        self.destination_object_name = destination_object_name
+
+
+class BulkResult:
+    def __init__(
+        self, request: Any, result: Any = None, error: Exception | None = None
+    ):
+        """
+        Outcome of a single request of a bulk operation: either its result or its error.
+        """
+        self.request = request
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
 
 class BucketClient(ABC):
+    max_workers: int = DEFAULT_MAX_WORKERS
+    concurrency_controller: ConcurrencyController | None = None
+
     @abstractmethod
     def check_connection(self) -> None:
         pass
@@ -35,7 +139,7 @@ class BucketClient(ABC):
         object_name: str,
         file_path: str,
         metadata: dict | None = None,
-    ):
+    ) -> tuple[str, str | None]:
         pass
 
     @abstractmethod
@@ -46,15 +150,28 @@ class BucketClient(ABC):
         data: BinaryIO,
         length: int,
         metadata: dict | None = None,
+    ) -> ObjectWriteResult:
+        pass
+
+    @abstractmethod
+    def list_objects(
+        self, bucket_name: str, prefix: str | None = None, recursive: bool = False
     ):
         pass
 
     @abstractmethod
-    def list_objects(self, bucket_name: str, prefix: str | None = None):
+    def get_object(
+        self,
+        bucket_name: str,
+        object_name: str,
+        offset: int = 0,
+        length: int = 0,
+        version_id: str | None = None,
+    ):
         pass
 
     @abstractmethod
-    def get_object(self, bucket_name: str, object_name: str):
+    def stat_object(self, bucket_name: str, object_name: str) -> Object:
         pass
 
     @abstractmethod
@@ -69,22 +186,251 @@ class BucketClient(ABC):
 
     @abstractmethod
     def download_folder(
-        self, bucket_name: str, folder_name: str, destination_path: str
-    ) -> None:
+        self,
+        bucket_name: str,
+        folder_name: str,
+        destination_path: str,
+        on_object_downloaded: Callable[[str], None] | None = None,
+    ) -> TransferStats:
         pass
 
+    @abstractmethod
+    def remove_objects(self, bucket_name: str, object_names: Iterable[str]) -> None:
+        pass
+
+    def upload_many(self, requests: Iterable[UploadRequest]) -> Iterator[BulkResult]:
+        """
+        Uploads many objects concurrently, yielding each result as it completes.
+
+        Args:
+            requests (Iterable[UploadRequest]): The uploads to run, consumed lazily.
+
+        Returns:
+            Iterator[BulkResult]: The results, in completion order.
+        """
+        return self._run_many(
+            lambda request: self.upload_data(
+                bucket_name=request.bucket_name,
+                object_name=request.object_name,
+                data=request.data,
+                length=request.length,
+                metadata=request.metadata,
+            ),
+            requests,
+        )
+
+    def get_many(self, requests: Iterable[GetRequest]) -> Iterator[BulkResult]:
+        """
+        Downloads many objects concurrently, yielding each object's content as it completes.
+
+        Args:
+            requests (Iterable[GetRequest]): The objects to download, consumed lazily.
+
+        Returns:
+            Iterator[BulkResult]: The results holding the objects' bytes, in completion order.
+        """
+        return self._run_many(self._get_object_data, requests)
+
+    def copy_many(self, requests: Iterable[CopyRequest]) -> Iterator[BulkResult]:
+        """
+        Copies many objects concurrently, yielding each result as it completes.
+
+        Args:
+            requests (Iterable[CopyRequest]): The copies to run, consumed lazily.
+
+        Returns:
+            Iterator[BulkResult]: The results holding ObjectWriteResults, in completion order.
+        """
+        return self._run_many(
+            lambda request: self.copy_object(
+                source_bucket_name=request.source_bucket_name,
+                source_object_name=request.source_object_name,
+                destination_bucket_name=request.destination_bucket_name,
+                destination_object_name=request.destination_object_name,
+            ),
+            requests,
+        )
+
+    def stat_many(self, requests: Iterable[StatRequest]) -> Iterator[BulkResult]:
+        """
+        Retrieves many objects' information concurrently, yielding each as it completes.
+
+        Args:
+            requests (Iterable[StatRequest]): The objects to describe, consumed lazily.
+
+        Returns:
+            Iterator[BulkResult]: The results holding the objects' information, in completion order.
+        """
+        return self._run_many(
+            lambda request: self.stat_object(
+                bucket_name=request.bucket_name, object_name=request.object_name
+            ),
+            requests,
+        )
+
+    def get_object_data_or_none(
+        self, bucket_name: str, object_name: str
+    ) -> bytes | None:
+        """
+        Downloads an object's content, such as a manifest or an index that may not exist.
+
+        Args:
+            bucket_name (str): Name of the bucket holding the object.
+            object_name (str): Name of the object.
+
+        Returns:
+            bytes | None: The object's content, or None if the object does not exist.
+        """
+        try:
+            return self._get_object_data(
+                GetRequest(bucket_name=bucket_name, object_name=object_name)
+            )
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise e
+
+    def _get_object_data(self, request: GetRequest) -> bytes:
+        response = self.get_object(
+            bucket_name=request.bucket_name,
+            object_name=request.object_name,
+            offset=request.offset,
+            length=request.length,
+        )
+        try:
+            return response.data
+        finally:
+            response.close()
+            response.release_conn()
+
+    def _call(
+        self,
+        fn: Callable[[], T],
+        number_of_bytes: int = 0,
+        retry: bool = True,
+        measure_latency: bool = True,
+    ) -> T:
+        """
+        Runs a request to the storage through the client's concurrency controller, if any.
+
+        Args:
+            fn (Callable[[], T]): The request.
+            number_of_bytes (int): Number of bytes the request transfers before returning.
+            retry (bool): Whether the request can be retried when throttled.
+            measure_latency (bool): Whether the request's latency is a sign of the storage's
+                load, False for requests lasting as long as a transfer of unknown size.
+
+        Returns:
+            T: The request's result.
+        """
+        if self.concurrency_controller is None:
+            return fn()
+        return self.concurrency_controller.call(
+            fn,
+            number_of_bytes=number_of_bytes,
+            retry=retry,
+            measure_latency=measure_latency,
+        )
+
+    def _run_many(
+        self, fn: Callable[[Any], Any], requests: Iterable[Any]
+    ) -> Iterator[BulkResult]:
+        """
+        Runs `fn` over the requests on `max_workers` threads, yielding results as they complete.
+        Failures are reported in their result rather than interrupting the other requests.
+        """
+
+        def _run(request: Any) -> BulkResult:
+            try:
+                return BulkResult(request=request, result=fn(request))
+            except Exception as e:
+                return BulkResult(request=request, error=e)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for future in iter_completed(
+                executor, _run, requests, max_in_flight=self.max_workers * 2
+            ):
+                yield future.result()
+
 
 class MinioClient(BucketClient):
     def __init__(
-        self, endpoint: str, access_key: str, secret_key: str, secure: bool = False
+        self,
+        endpoint: str,
+        access_key: str,
+        secret_key: str,
+        secure: bool = False,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        part_size: int = DEFAULT_PART_SIZE,
+        parallel_part_uploads: int = DEFAULT_PARALLEL_PART_UPLOADS,
+        adaptive_concurrency: bool = True,
+        min_concurrency: int = 1,
+        max_bytes_per_second: int | None = None,
     ):
+        """
+        Client for S3-compatible storages such as MinIO.
+
+        With `adaptive_concurrency`, uploads, downloads, copies and stats go through a
+        concurrency controller: the number of requests in flight starts at half of
+        `max_workers`, is raised while the storage keeps up and lowered when its latency
+        increases or it throttles the requests, which are then retried. Bulk operations keep
+        `max_workers` threads, the controller deciding how many of them send requests.
+        `max_bytes_per_second` caps the bandwidth of the requests, with or without it.
+        """
         self.secure = secure
+        self.max_workers = max_workers
+        self.part_size = part_size
+        self.parallel_part_uploads = parallel_part_uploads
+        self.adaptive_concurrency = adaptive_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_bytes_per_second = max_bytes_per_second
+
+        if adaptive_concurrency or max_bytes_per_second:
+            self.concurrency_controller = ConcurrencyController(
+                initial_limit=max(min_concurrency, max_workers // 2)
+                if adaptive_concurrency
+                else max_workers,
+                min_limit=min_concurrency if adaptive_concurrency else max_workers,
+                max_limit=max_workers,
+                max_bytes_per_second=max_bytes_per_second,
+            )
 
         self.client = Minio(
             endpoint=endpoint,
             access_key=access_key,
             secret_key=secret_key,
             secure=self.secure,
+            http_client=self._create_http_client(
+                max_workers=self.max_workers + self.parallel_part_uploads,
+                retry_throttled=not adaptive_concurrency,
+            ),
+        )
+
+    @staticmethod
+    def _create_http_client(
+        max_workers: int, retry_throttled: bool = True
+    ) -> urllib3.PoolManager:
+        """
+        Creates Minio's default HTTP client, with a connection pool large enough for every
+        worker to keep its connection alive instead of re-opening one per request.
+
+        Without `retry_throttled`, 503 responses are not retried by the connection pool, so
+        that the concurrency controller sees them and slows down before retrying.
+        """
+        return urllib3.PoolManager(
+            timeout=urllib3.util.Timeout(
+                connect=MINIO_TIMEOUT_SECONDS, read=MINIO_TIMEOUT_SECONDS
+            ),
+            maxsize=max(max_workers, MINIO_DEFAULT_POOL_SIZE),
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+            retries=urllib3.Retry(
+                total=5,
+                backoff_factor=0.2,
+                status_forcelist=[500, 502, 503, 504]
+                if retry_throttled
+                else [500, 502, 504],
+            ),
         )
 
     def check_connection(self) -> None:
@@ -126,14 +472,52 @@ class MinioClient(BucketClient):
         object_name: str,
         file_path: str,
         metadata: dict | None = None,
-    ):
-        self.client.fput_object(
-            bucket_name=bucket_name,
-            object_name=object_name,
-            file_path=file_path,
-            metadata=metadata,
+    ) -> tuple[str, str | None]:
+        """
+        Uploads a file, in parts of `part_size` bytes sent `parallel_part_uploads` at a time
+        when it is larger than a single part.
+
+        The file is checksummed while it is read for the upload. Single-part uploads are
+        verified against the ETag returned by the server, which is the content's MD5.
+
+        Args:
+            bucket_name (str): Name of the bucket to upload to.
+            object_name (str): Name of the object to create.
+            file_path (str): Path of the file to upload.
+            metadata (dict | None): The object's metadata.
+
+        Returns:
+            tuple[str, str | None]: The hexadecimal SHA-256 of the uploaded content, and the
+                version of the object created, None in a bucket without versioning.
+        """
+
+        def _upload() -> tuple[ObjectWriteResult, ChecksumReader]:
+            with open(file_path, "rb") as f:
+                checksum_reader = ChecksumReader(f)
+                return (
+                    self.client.put_object(
+                        bucket_name=bucket_name,
+                        object_name=object_name,
+                        data=checksum_reader,
+                        length=os.fstat(f.fileno()).st_size,
+                        metadata=metadata,
+                        part_size=self.part_size,
+                        num_parallel_uploads=self.parallel_part_uploads,
+                    ),
+                    checksum_reader,
+                )
+
+        result, checksum_reader = self._call(
+            _upload, number_of_bytes=os.path.getsize(file_path)
         )
 
+        if "-" not in result.etag and result.etag != checksum_reader.md5.hexdigest():
+            raise OSError(
+                f"Checksum mismatch after uploading {file_path} to {object_name}"
+            )
+
+        return checksum_reader.sha256.hexdigest(), result.version_id
+
     def upload_data(
         self,
         bucket_name: str,
@@ -141,29 +525,72 @@ class MinioClient(BucketClient):
         data: BinaryIO,
         length: int,
         metadata: dict | None = None,
-    ):
-        self.client.put_object(
-            bucket_name=bucket_name,
-            object_name=object_name,
-            data=data,
-            metadata=metadata,
-            length=length,
+    ) -> ObjectWriteResult:
+        # Seekable streams are rewound before each attempt, so that a throttled upload is retried
+        start_position = data.tell() if hasattr(data, "seek") else None
+
+        def _upload() -> ObjectWriteResult:
+            if start_position is not None:
+                data.seek(start_position)
+            return self.client.put_object(
+                bucket_name=bucket_name,
+                object_name=object_name,
+                data=data,
+                metadata=metadata,
+                length=length,
+                part_size=self.part_size,
+                num_parallel_uploads=self.parallel_part_uploads,
+            )
+
+        return self._call(
+            _upload, number_of_bytes=length, retry=start_position is not None
         )
 
     def list_objects(
-        self, bucket_name: str, prefix: str | None = None
+        self, bucket_name: str, prefix: str | None = None, recursive: bool = False
     ) -> Generator[Object, Any, None]:
         try:
-            return self.client.list_objects(bucket_name=bucket_name, prefix=prefix)
+            return self.client.list_objects(
+                bucket_name=bucket_name, prefix=prefix, recursive=recursive
+            )
         except S3Error as e:
             raise e
 
     def get_object(
-        self, bucket_name: str, object_name: str
+        self,
+        bucket_name: str,
+        object_name: str,
+        offset: int = 0,
+        length: int = 0,
+        version_id: str | None = None,
     ) -> urllib3.response.BaseHTTPResponse:
         try:
-            return self.client.get_object(
-                bucket_name=bucket_name, object_name=object_name
+            # The call returns once the headers are received, so its latency is the time to
+            # first byte, and the body is charged to the bandwidth cap by its actual length
+            response = self._call(
+                lambda: self.client.get_object(
+                    bucket_name=bucket_name,
+                    object_name=object_name,
+                    offset=offset,
+                    length=length,
+                    version_id=version_id,
+                )
+            )
+        except S3Error as e:
+            raise e
+
+        if self.concurrency_controller is not None:
+            self.concurrency_controller.consume_bandwidth(
+                int(response.headers.get("Content-Length", length))
+            )
+        return response
+
+    def stat_object(self, bucket_name: str, object_name: str) -> Object:
+        try:
+            return self._call(
+                lambda: self.client.stat_object(
+                    bucket_name=bucket_name, object_name=object_name
+                )
             )
         except S3Error as e:
             raise e
@@ -176,31 +603,194 @@ class MinioClient(BucketClient):
         destination_object_name: str,
     ) -> ObjectWriteResult:
         try:
-            return self.client.copy_object(
-                bucket_name=destination_bucket_name,
-                object_name=destination_object_name,
-                source=CopySource(source_bucket_name, source_object_name),
+            return self._call(
+                lambda: self.client.copy_object(
+                    bucket_name=destination_bucket_name,
+                    object_name=destination_object_name,
+                    source=CopySource(source_bucket_name, source_object_name),
+                ),
+                # A copy lasts as long as the object is large, which is not known here
+                measure_latency=False,
             )
         except S3Error as e:
             raise e
 
+    def remove_objects(self, bucket_name: str, object_names: Iterable[str]) -> None:
+        """
+        Removes objects from a bucket, in batches of up to a thousand per request.
+
+        Raises:
+            S3Error: The first error returned for an object that could not be removed.
+        """
+        delete_object_list = [DeleteObject(object_name) for object_name in object_names]
+        for delete_error in self._call(
+            lambda: list(
+                self.client.remove_objects(
+                    bucket_name=bucket_name,
+                    delete_object_list=delete_object_list,
+                )
+            )
+        ):
+            raise S3Error(
+                code=delete_error.code,
+                message=delete_error.message,
+                resource=delete_error.name,
+                request_id=None,
+                host_id=None,
+                response=None,
+                bucket_name=bucket_name,
+                object_name=delete_error.name,
+            )
+
     def download_folder(
-        self, bucket_name: str, folder_name: str, destination_path: str
-    ) -> None:
+        self,
+        bucket_name: str,
+        folder_name: str,
+        destination_path: str,
+        on_object_downloaded: Callable[[str], None] | None = None,
+    ) -> TransferStats:
+        """
+        Downloads every object under a folder, using a pool of `max_workers` parallel downloads.
+
+        Files already present locally with a matching size and ETag are skipped, and partially
+        downloaded files are resumed from where they stopped.
+
+        Args:
+            bucket_name (str): Name of the bucket to download from.
+            folder_name (str): The folder's prefix inside the bucket.
+            destination_path (str): The local folder to download the objects into.
+            on_object_downloaded (Callable[[str], None] | None): Called with the name of each
+                object once its local file is up to date, from the download threads.
+
+        Returns:
+            TransferStats: The throughput of the download.
+        """
         os.makedirs(destination_path, exist_ok=True)
 
-        try:
-            objects = self.client.list_objects(
-                bucket_name=bucket_name, prefix=folder_name, recursive=True
-            )
-            for obj in tqdm.tqdm(objects):
-                if not obj.is_dir:
-                    object_name = obj.object_name
-                    local_file_path = os.path.join(destination_path, object_name)
+        download_state = DownloadState(destination_path)
+        transfer_stats = TransferStats()
 
-                    # Create directories if they don't exist
-                    os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+        def _download(obj: Object) -> None:
+            self._download_object(
+                bucket_name=bucket_name,
+                obj=obj,
+                destination_path=destination_path,
+                download_state=download_state,
+                transfer_stats=transfer_stats,
+            )
+            if on_object_downloaded is not None:
+                on_object_downloaded(obj.object_name)
 
-                    self.client.fget_object(bucket_name, object_name, local_file_path)
+        try:
+            objects = (
+                obj
+                for obj in self.client.list_objects(
+                    bucket_name=bucket_name, prefix=folder_name, recursive=True
+                )
+                if not obj.is_dir
+            )
+            with ThreadPoolExecutor(
+                max_workers=self.max_workers
+            ) as executor, tqdm.tqdm(unit="objects") as progress_bar:
+                for future in iter_completed(
+                    executor, _download, objects, max_in_flight=self.max_workers * 4
+                ):
+                    future.result()
+                    progress_bar.update(1)
+                    progress_bar.set_postfix_str(
+                        f"{transfer_stats.bytes_per_second / 1e6:.2f} MB/s"
+                    )
         except S3Error as e:
             raise e
+
+        return transfer_stats.stop()
+
+    def _download_object(
+        self,
+        bucket_name: str,
+        obj: Object,
+        destination_path: str,
+        download_state: DownloadState,
+        transfer_stats: TransferStats,
+    ) -> None:
+        """
+        Downloads a single object, resuming from its partial file if a previous download stopped.
+        """
+        object_name = obj.object_name
+        local_file_path = os.path.join(destination_path, object_name)
+
+        if download_state.is_complete(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            etag=obj.etag,
+            size=obj.size,
+            local_file_path=local_file_path,
+        ):
+            transfer_stats.add_skipped(obj.size)
+            return
+
+        # Create directories if they don't exist
+        os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+
+        # The partial file is bound to the ETag, so a changed object is never resumed
+        partial_file_path = f"{local_file_path}.{obj.etag}.part"
+        offset = (
+            os.path.getsize(partial_file_path)
+            if os.path.exists(partial_file_path)
+            else 0
+        )
+        if offset > obj.size:
+            os.remove(partial_file_path)
+            offset = 0
+
+        if offset < obj.size or obj.size == 0:
+            self._call(
+                lambda: self._download_to_partial_file(
+                    bucket_name=bucket_name,
+                    obj=obj,
+                    partial_file_path=partial_file_path,
+                ),
+                number_of_bytes=obj.size - offset,
+            )
+
+        downloaded_size = os.path.getsize(partial_file_path)
+        if downloaded_size != obj.size:
+            raise OSError(
+                f"Incomplete download of {object_name}: {downloaded_size} out of"
+                f" {obj.size} bytes"
+            )
+
+        os.replace(partial_file_path, local_file_path)
+        download_state.mark_complete(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            etag=obj.etag,
+            size=obj.size,
+        )
+        transfer_stats.add_transferred(obj.size - offset)
+
+    def _download_to_partial_file(
+        self, bucket_name: str, obj: Object, partial_file_path: str
+    ) -> None:
+        """
+        Appends the missing end of an object to its partial file. A retried download resumes
+        from what the failed attempt already wrote.
+        """
+        offset = (
+            os.path.getsize(partial_file_path)
+            if os.path.exists(partial_file_path)
+            else 0
+        )
+        response = self.client.get_object(
+            bucket_name=bucket_name,
+            object_name=obj.object_name,
+            offset=offset,
+            request_headers={"If-Match": f'"{obj.etag}"'},
+        )
+        try:
+            with open(partial_file_path, "ab") as partial_file:
+                for chunk in response.stream(DOWNLOAD_CHUNK_SIZE):
+                    partial_file.write(chunk)
+        finally:
+            response.close()
+            response.release_conn()
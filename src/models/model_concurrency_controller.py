@@ -0,0 +1,387 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import urllib3
+from minio import S3Error
+from minio.error import InvalidResponseError, ServerError
+
+# S3 error codes returned by storages shedding load
+THROTTLING_ERROR_CODES = frozenset(
+    {
+        "SlowDown",
+        "ServiceUnavailable",
+        "RequestTimeout",
+        "Throttling",
+        "ThrottlingException",
+        "TooManyRequests",
+        "RequestLimitExceeded",
+    }
+)
+THROTTLING_STATUS_CODES = frozenset({429, 503})
+
+T = TypeVar("T")
+# Latencies are averaged per MiB transferred, so that large transfers do not look like overload
+DEFAULT_LATENCY_REFERENCE_BYTES = 1024 * 1024
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """
+    Checks if an error means that the storage is overloaded, rather than that the request is
+    invalid: throttling responses, 429 and 503 statuses, timeouts and exhausted retries.
+
+    Args:
+        error (BaseException): The error raised by a bucket client's call.
+
+    Returns:
+        bool: True if the error is a sign of overload, False otherwise.
+    """
+    if isinstance(error, S3Error):
+        return error.code in THROTTLING_ERROR_CODES
+    if isinstance(error, ServerError):
+        return error.status_code in THROTTLING_STATUS_CODES
+    if isinstance(error, InvalidResponseError):
+        return getattr(error, "_code", None) in THROTTLING_STATUS_CODES
+    return isinstance(
+        error,
+        (
+            TimeoutError,
+            urllib3.exceptions.TimeoutError,
+            urllib3.exceptions.MaxRetryError,
+        ),
+    )
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Initialize a TokenBucket, capping the average rate of a resource such as bandwidth.
+
+        Tokens are added at `rate` per second, up to `capacity`. Consuming more tokens than
+        available puts the bucket in debt, which the following consumers wait to be repaid, so
+        that a request larger than the capacity is never blocked forever.
+
+        Args:
+            rate (float): Number of tokens added per second.
+            capacity (Optional[float]): Maximum number of tokens, one second of rate if None.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Consumes tokens, possibly in advance.
+
+        Args:
+            amount (float): Number of tokens to consume.
+
+        Returns:
+            float: The number of seconds to wait before using the reserved tokens.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._last_refill) * self.rate
+            )
+            self._last_refill = now
+
+            wait_seconds = max(0.0, -self._tokens / self.rate)
+            self._tokens -= amount
+            return wait_seconds
+
+
+class AdaptiveConcurrencyLimit:
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        latency_tolerance: float = 2.0,
+        backoff_ratio: float = 0.5,
+        latency_backoff_ratio: float = 0.9,
+        latency_reference_bytes: int = DEFAULT_LATENCY_REFERENCE_BYTES,
+    ):
+        """
+        Initialize an AdaptiveConcurrencyLimit, an additive-increase/multiplicative-decrease
+        (AIMD) limit on the number of requests in flight.
+
+        Each successful request raises the limit by 1/limit, i.e. by one per window of requests.
+        A throttling error multiplies it by `backoff_ratio`, and a short-term average latency
+        above `latency_tolerance` times the long-term one by `latency_backoff_ratio`. After a
+        decrease, the next one waits for a window of requests to complete, so that the
+        requests already in flight when the storage got overloaded only count once.
+
+        The latency of a request transferring data is divided by one plus its size in units of
+        `latency_reference_bytes`: small requests are compared by their latency, and large
+        transfers by their time per unit, so that a burst of large objects does not look like
+        an overloaded storage.
+
+        Args:
+            initial_limit (int): The limit before any request completes.
+            min_limit (int): Lowest value of the limit.
+            max_limit (int): Highest value of the limit.
+            latency_tolerance (float): Latency increase ratio considered as overload.
+            backoff_ratio (float): Factor applied to the limit on throttling errors.
+            latency_backoff_ratio (float): Factor applied to the limit on latency increases.
+            latency_reference_bytes (int): Size from which latencies are averaged per byte.
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.latency_backoff_ratio = latency_backoff_ratio
+        self.latency_reference_bytes = max(1, latency_reference_bytes)
+
+        self.number_of_throttles = 0
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._short_term_latency: Optional[float] = None
+        self._long_term_latency: Optional[float] = None
+        self._cooldown = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def on_success(self, latency: float, number_of_bytes: Optional[int] = 0) -> None:
+        """
+        Records a successful request and its latency, in seconds.
+
+        Args:
+            latency (float): Duration of the request.
+            number_of_bytes (Optional[int]): Number of bytes transferred during the request, None
+                if its duration depends on a size that is not known, e.g. a server-side copy.
+                Such requests raise the limit without being compared by their latency.
+        """
+        with self._lock:
+            is_latency_increasing = number_of_bytes is not None and self._add_latency(
+                latency / (1 + number_of_bytes / self.latency_reference_bytes)
+            )
+
+            if self._cooldown > 0:
+                self._cooldown -= 1
+            elif is_latency_increasing:
+                self._decrease(self.latency_backoff_ratio)
+                return
+
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def on_throttled(self) -> None:
+        """
+        Records a request rejected or timed out because the storage is overloaded.
+        """
+        with self._lock:
+            self.number_of_throttles += 1
+            if self._cooldown == 0:
+                self._decrease(self.backoff_ratio)
+
+    def _add_latency(self, latency: float) -> bool:
+        """
+        Adds a latency to the averages, and checks if the short-term one exceeds the tolerance.
+        """
+        if self._short_term_latency is None or self._long_term_latency is None:
+            self._short_term_latency = self._long_term_latency = latency
+            return False
+
+        self._short_term_latency += 0.2 * (latency - self._short_term_latency)
+        self._long_term_latency += 0.01 * (latency - self._long_term_latency)
+        return (
+            self._short_term_latency > self.latency_tolerance * self._long_term_latency
+        )
+
+    def _decrease(self, ratio: float) -> None:
+        self._limit = max(self.min_limit, self._limit * ratio)
+        self._cooldown = self.limit
+
+
+class ConcurrencyController:
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        max_bytes_per_second: Optional[int] = None,
+        max_retries: int = 3,
+        retry_backoff_seconds: float = 0.5,
+    ):
+        """
+        Initialize a ConcurrencyController, gating the calls of a bucket client from any number
+        of threads behind an adaptive concurrency limit and an optional bandwidth cap.
+
+        Calls failing with a throttling error are retried up to `max_retries` times, with an
+        exponential and jittered backoff, after the limit has been lowered.
+
+        Args:
+            initial_limit (int): Number of calls allowed in flight before any completes.
+            min_limit (int): Lowest number of calls allowed in flight.
+            max_limit (int): Highest number of calls allowed in flight.
+            max_bytes_per_second (Optional[int]): Bandwidth cap over the calls, None if unlimited.
+            max_retries (int): Number of retries of a throttled call.
+            retry_backoff_seconds (float): Backoff before the first retry, doubled afterwards.
+        """
+        self.concurrency_limit = AdaptiveConcurrencyLimit(
+            initial_limit=initial_limit, min_limit=min_limit, max_limit=max_limit
+        )
+        self.bandwidth_limiter = (
+            TokenBucket(rate=max_bytes_per_second) if max_bytes_per_second else None
+        )
+        self.max_bytes_per_second = max_bytes_per_second
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def call(
+        self,
+        fn: Callable[[], T],
+        number_of_bytes: int = 0,
+        retry: bool = True,
+        measure_latency: bool = True,
+    ) -> T:
+        """
+        Runs `fn` once a slot is available and its bytes fit in the bandwidth cap.
+
+        Args:
+            fn (Callable[[], T]): The bucket client's call.
+            number_of_bytes (int): Number of bytes the call transfers, if known.
+            retry (bool): Whether the call can be retried when throttled.
+            measure_latency (bool): Whether the call's latency is a sign of the storage's load,
+                False for calls lasting as long as a transfer of unknown size.
+
+        Returns:
+            T: The call's result.
+        """
+        max_retries = self.max_retries if retry else 0
+
+        attempt = 0
+        while True:
+            with self._condition:
+                while self.in_flight >= self.concurrency_limit.limit:
+                    self._condition.wait()
+                self.in_flight += 1
+
+            try:
+                self.consume_bandwidth(number_of_bytes)
+
+                start_time = time.monotonic()
+                result = fn()
+                self.concurrency_limit.on_success(
+                    time.monotonic() - start_time,
+                    number_of_bytes if measure_latency else None,
+                )
+                return result
+            except Exception as e:
+                if not is_throttling_error(e):
+                    raise
+                self.concurrency_limit.on_throttled()
+                if attempt == max_retries:
+                    raise
+            finally:
+                with self._condition:
+                    self.in_flight -= 1
+                    self._condition.notify_all()
+
+            time.sleep(self._get_backoff_seconds(attempt))
+            attempt += 1
+
+    def consume_bandwidth(self, number_of_bytes: int) -> None:
+        """
+        Waits for bytes to fit in the bandwidth cap, e.g. those of a response body streamed once
+        its call has returned.
+        """
+        if self.bandwidth_limiter is not None and number_of_bytes:
+            time.sleep(self.bandwidth_limiter.reserve(number_of_bytes))
+
+    def _get_backoff_seconds(self, attempt: int) -> float:
+        return self.retry_backoff_seconds * 2**attempt * random.uniform(0.5, 1.5)
+
+
+class AsyncConcurrencyController(ConcurrencyController):
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize an AsyncConcurrencyController, the counterpart of ConcurrencyController for
+        the coroutines of an async bucket client, all running on the same event loop.
+        """
+        super().__init__(*args, **kwargs)
+        self._async_condition: Optional[asyncio.Condition] = None
+        self._event_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def call_async(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        number_of_bytes: int = 0,
+        get_response_size: Optional[Callable[[T], int]] = None,
+        measure_latency: bool = True,
+    ) -> T:
+        """
+        Asynchronous counterpart of `call`.
+
+        Args:
+            fn (Callable[[], Awaitable[T]]): Creates the bucket client's coroutine.
+            number_of_bytes (int): Number of bytes the call sends, if known.
+            get_response_size (Optional[Callable[[T], int]]): Gets the number of bytes the call
+                received from its result, charged to the bandwidth cap once it returns.
+            measure_latency (bool): Whether the call's latency is a sign of the storage's load,
+                False for calls lasting as long as a transfer of unknown size.
+
+        Returns:
+            T: The coroutine's result.
+        """
+        condition = self._get_async_condition()
+
+        attempt = 0
+        while True:
+            async with condition:
+                await condition.wait_for(
+                    lambda: self.in_flight < self.concurrency_limit.limit
+                )
+                self.in_flight += 1
+
+            try:
+                await self.consume_bandwidth_async(number_of_bytes)
+
+                start_time = time.monotonic()
+                result = await fn()
+                latency = time.monotonic() - start_time
+                response_size = get_response_size(result) if get_response_size else 0
+                self.concurrency_limit.on_success(
+                    latency,
+                    number_of_bytes + response_size if measure_latency else None,
+                )
+                await self.consume_bandwidth_async(response_size)
+                return result
+            except Exception as e:
+                if not is_throttling_error(e):
+                    raise
+                self.concurrency_limit.on_throttled()
+                if attempt == self.max_retries:
+                    raise
+            finally:
+                async with condition:
+                    self.in_flight -= 1
+                    condition.notify_all()
+
+            await asyncio.sleep(self._get_backoff_seconds(attempt))
+            attempt += 1
+
+    async def consume_bandwidth_async(self, number_of_bytes: int) -> None:
+        """
+        Asynchronous counterpart of `consume_bandwidth`.
+        """
+        if self.bandwidth_limiter is not None and number_of_bytes:
+            await asyncio.sleep(self.bandwidth_limiter.reserve(number_of_bytes))
+
+    def _get_async_condition(self) -> asyncio.Condition:
+        # Conditions are bound to an event loop, and each `asyncio.run` starts a new one
+        event_loop = asyncio.get_running_loop()
+        if self._async_condition is None or self._event_loop is not event_loop:
+            self._async_condition = asyncio.Condition()
+            self._event_loop = event_loop
+            self.in_flight = 0
+        return self._async_condition
@@ -7,6 +7,7 @@ import requests
 import ulid
 
 from src.models.model_datasource_metadata import DataSourceMetadata, DataSourceType
+from src.models.model_image_transcoding import ImageTranscodingPolicy
 
 
 class DataSource(ABC):
@@ -81,7 +82,23 @@ class HuggingFaceDataSource(DataSource):
         self,
         dataset_name: str,
         api_token: str | None = None,
+        streaming: bool = False,
+        local_path: str | None = None,
+        image_transcoding: ImageTranscodingPolicy | None = None,
     ):
+        """
+        Initialize a HuggingFaceDataSource.
+
+        Args:
+            dataset_name (str): The dataset's identifier on HuggingFace.
+            api_token (str | None): Token for gated or private datasets.
+            streaming (bool): Whether the dataset's rows are read as they are uploaded, instead
+                of the whole dataset being downloaded to the local cache first.
+            local_path (str | None): Folder holding a copy of the dataset's repository or data
+                files, loaded instead of HuggingFace's, e.g. for workers without internet access.
+            image_transcoding (ImageTranscodingPolicy | None): How the dataset's images are
+                stored, their original bytes being kept if None.
+        """
         super().__init__(
             root_folder_path=dataset_name,
             object_folder_path=None,
@@ -89,17 +106,34 @@ class HuggingFaceDataSource(DataSource):
         )
         self.dataset_name = dataset_name
         self.api_token = api_token
+        self.streaming = streaming
+        self.local_path = local_path
+        self.image_transcoding = image_transcoding or ImageTranscodingPolicy()
 
     def verify_data_source_path(self) -> None:
         """
-        Check if the data source's identifier exists in HuggingFace's Dataset registry.
-        Raises specific exceptions based on the dataset's availability and access requirements.
+        Check if the data source's identifier exists in HuggingFace's Dataset registry, or that
+        its local copy exists. Raises specific exceptions based on the dataset's availability
+        and access requirements.
 
         Raises:
             ValueError: If the dataset is not valid or not found in HuggingFace's registry.
             PermissionError: If the dataset is gated and requires a private API token.
-            FileNotFoundError: If there is an issue with the request or the dataset is not found.
+            FileNotFoundError: If there is an issue with the request, the dataset is not found
+                or its local copy does not exist.
+            NotADirectoryError: If the dataset's local copy is not a directory.
         """
+        if self.local_path is not None:
+            if not os.path.exists(self.local_path):
+                raise FileNotFoundError(
+                    f"The data source's local copy '{self.local_path}' does not exist."
+                )
+            if not os.path.isdir(self.local_path):
+                raise NotADirectoryError(
+                    f"The data source's local copy '{self.local_path}' is not a directory."
+                )
+            return
+
         headers = {}
         if self.api_token:
             headers["Authorization"] = f"Bearer {self.api_token}"
@@ -0,0 +1,161 @@
+import json
+import threading
+from typing import Iterator, List, Optional
+
+from src.models.model_bucket_client import BucketClient
+
+MANIFEST_FILE_NAME = "manifest.jsonl"
+
+
+class ManifestEntry:
+    def __init__(
+        self,
+        annotation_path: str,
+        image_path: Optional[str],
+        annotation: Optional[dict],
+        annotation_sha256: Optional[str] = None,
+        annotation_size: Optional[int] = None,
+        image_sha256: Optional[str] = None,
+        image_size: Optional[int] = None,
+        image_format: Optional[str] = None,
+        image_version_id: Optional[str] = None,
+    ):
+        """
+        Initialize a ManifestEntry, describing an annotation object and the image it references.
+
+        Args:
+            annotation_path (str): The annotation's object name in the bucket.
+            image_path (Optional[str]): The image's object name, as referenced by the annotation.
+            annotation (Optional[dict]): The parsed annotation, None if it could not be decoded.
+            annotation_sha256 (Optional[str]): SHA-256 of the annotation's content.
+            annotation_size (Optional[int]): Size of the annotation object, in bytes.
+            image_sha256 (Optional[str]): SHA-256 of the image's content.
+            image_size (Optional[int]): Size of the image object, in bytes.
+            image_format (Optional[str]): Format the image is stored in, e.g. "jpeg", when
+                known from its transcoding.
+            image_version_id (Optional[str]): Version of the image object returned by its
+                upload, None in a bucket without versioning.
+        """
+        self.annotation_path = annotation_path
+        self.image_path = image_path
+        self.annotation = annotation
+        self.annotation_sha256 = annotation_sha256
+        self.annotation_size = annotation_size
+        self.image_sha256 = image_sha256
+        self.image_size = image_size
+        self.image_format = image_format
+        self.image_version_id = image_version_id
+
+    def to_dict(self) -> dict:
+        return {
+            "annotation_path": self.annotation_path,
+            "annotation_sha256": self.annotation_sha256,
+            "annotation_size": self.annotation_size,
+            "image_path": self.image_path,
+            "image_sha256": self.image_sha256,
+            "image_size": self.image_size,
+            "image_format": self.image_format,
+            "image_version_id": self.image_version_id,
+            "annotation": self.annotation,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "ManifestEntry":
+        return ManifestEntry(
+            annotation_path=data["annotation_path"],
+            image_path=data.get("image_path"),
+            annotation=data.get("annotation"),
+            annotation_sha256=data.get("annotation_sha256"),
+            annotation_size=data.get("annotation_size"),
+            image_sha256=data.get("image_sha256"),
+            image_size=data.get("image_size"),
+            image_format=data.get("image_format"),
+            image_version_id=data.get("image_version_id"),
+        )
+
+
+class DataSourceManifest:
+    def __init__(
+        self, data_source_name: str, entries: Optional[List[ManifestEntry]] = None
+    ):
+        """
+        Initialize a DataSourceManifest, the index of a data source's annotations written
+        alongside its objects at upload time.
+
+        The manifest is stored as a JSON lines object, one entry per annotation sorted by
+        annotation path, i.e. in the order a bucket listing would return them. Reading it
+        replaces the listing of the annotations folder and the download of every annotation.
+
+        Args:
+            data_source_name (str): Name of the data source the manifest describes.
+            entries (Optional[List[ManifestEntry]]): The manifest's initial entries.
+        """
+        self.data_source_name = data_source_name
+        self._entries: dict[str, ManifestEntry] = {
+            entry.annotation_path: entry for entry in entries or []
+        }
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[ManifestEntry]:
+        """
+        Iterates over the entries, sorted by annotation path.
+        """
+        for annotation_path in sorted(self._entries):
+            yield self._entries[annotation_path]
+
+    def add_entry(self, entry: ManifestEntry) -> None:
+        """
+        Adds or replaces the entry of an annotation. Safe to call from several threads.
+        """
+        with self._lock:
+            self._entries[entry.annotation_path] = entry
+
+    def get_object_name(self) -> str:
+        return DataSourceManifest.get_manifest_object_name(self.data_source_name)
+
+    def to_bytes(self) -> bytes:
+        return "".join(json.dumps(entry.to_dict()) + "\n" for entry in self).encode()
+
+    @staticmethod
+    def from_bytes(data_source_name: str, data: bytes) -> "DataSourceManifest":
+        return DataSourceManifest(
+            data_source_name=data_source_name,
+            entries=[
+                ManifestEntry.from_dict(json.loads(line))
+                for line in data.decode("utf-8").splitlines()
+                if line.strip()
+            ],
+        )
+
+    @staticmethod
+    def get_manifest_object_name(data_source_name: str) -> str:
+        return f"{data_source_name}/{MANIFEST_FILE_NAME}"
+
+    @staticmethod
+    def download(
+        bucket_client: BucketClient, bucket_name: str, data_source_name: str
+    ) -> Optional["DataSourceManifest"]:
+        """
+        Downloads the manifest of a data source.
+
+        Args:
+            bucket_client (BucketClient): The bucket client to download the manifest with.
+            bucket_name (str): Name of the bucket holding the data source.
+            data_source_name (str): Name of the data source.
+
+        Returns:
+            Optional[DataSourceManifest]: The data source's manifest, or None if it has none.
+        """
+        manifest_data = bucket_client.get_object_data_or_none(
+            bucket_name=bucket_name,
+            object_name=DataSourceManifest.get_manifest_object_name(data_source_name),
+        )
+        if manifest_data is None:
+            return None
+
+        return DataSourceManifest.from_bytes(
+            data_source_name=data_source_name, data=manifest_data
+        )
@@ -1,9 +1,53 @@
+import bisect
+import functools
+import hashlib
+import itertools
+import json
+import os
 import random
-from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Callable, List, Optional
 
 import ulid
 
+from src.models.model_annotation_batch import (
+    AnnotationBatchIndex,
+    AnnotationBatchWriter,
+    AnnotationLayout,
+)
 from src.models.model_bucket_client import BucketClient
+from src.models.model_dataset_manifest import DatasetManifest, DatasetManifestEntry
+from src.models.model_dataset_statistics import DatasetStatistics
+from src.models.model_image_transcoding import get_image_format_extension
+from src.models.model_shard_index import SHARD_INDEX_FILE_NAME, ShardIndex
+from src.models.model_split_assignment import SplitAssignmentTable
+from src.models.model_transfer_stats import TransferStats
+from src.utils.concurrency_helper import iter_completed
+from src.utils.shard_helper import iter_shard_samples
+from src.utils.split_helper import (
+    get_label_strata,
+    get_stratified_splits,
+    hash_sample_keys,
+)
+
+
+class DatasetFormat(str, Enum):
+    # One image object and one annotation object per sample
+    OBJECTS = "objects"
+    # Each split packed into WebDataset-style tar shards, in place of its objects
+    SHARDS = "shards"
+    # Only a manifest referencing the data sources' objects, at their version, and the splits
+    VIRTUAL = "virtual"
+
+
+class SplitStrategy(str, Enum):
+    # Splits drawn in sequence from the seeded generator, i.e. depending on the samples' order
+    SEQUENTIAL = "sequential"
+    # Splits derived from a hash of each sample's key and the seed, whatever the order
+    HASH = "hash"
+    # Splits balanced per label, assigned over a whole data source before its preparation
+    STRATIFIED = "stratified"
 
 
 class Dataset:
@@ -15,6 +59,13 @@ class Dataset:
         annotations_path: str = "annotations",
         images_path: str = "images",
         distribution_weights: Optional[List[float]] = None,
+        dataset_format: DatasetFormat = DatasetFormat.OBJECTS,
+        shards_path: str = "shards",
+        annotation_layout: AnnotationLayout = AnnotationLayout.OBJECTS,
+        annotation_batch_size: int = 4 * 1024 * 1024,
+        compress_annotations: bool = False,
+        split_strategy: SplitStrategy = SplitStrategy.HASH,
+        parent_uuid: Optional[str] = None,
     ):
         if distribution_weights is None:
             distribution_weights = [0.6, 0.2, 0.2]
@@ -27,19 +78,44 @@ class Dataset:
         self.seed = seed
         self.random_instance = random.Random(seed)
         self.split_names = ["train", "test", "validation"]
+        self.dataset_format = DatasetFormat(dataset_format)
+        self.shards_path = shards_path
+        self.annotation_layout = AnnotationLayout(annotation_layout)
+        self.annotation_batch_size = annotation_batch_size
+        self.compress_annotations = compress_annotations
+        self.split_strategy = SplitStrategy(split_strategy)
+        # UUID of the dataset this one was incrementally prepared from
+        self.parent_uuid = parent_uuid
+        # The samples prepared into the dataset, uploaded as its manifest
+        self.manifest = DatasetManifest()
+        # The splits assigned by the stratified strategy
+        self.split_assignments = SplitAssignmentTable()
+        # The statistics of the samples prepared into the dataset, uploaded as a sidecar
+        self.statistics = DatasetStatistics(self.split_names)
+        self._annotation_batch_writers: dict[str, AnnotationBatchWriter] = {}
 
-    def format_bucket_image_path(self, image_file_path: str, split_name: str) -> str:
+    def format_bucket_image_path(
+        self,
+        image_file_path: str,
+        split_name: str,
+        image_format: Optional[str] = None,
+    ) -> str:
         """
         Formats the bucket path for an image file based on the dataset's UUID and folder distribution.
 
         Args:
             image_file_path (str): The original path of the image file.
             split_name (str): The name of the split (train, test, or validation) the file will go into.
+            image_format (Optional[str]): The format the image was stored in, e.g. "jpeg", whose
+                extension the file is given when known.
 
         Returns:
             str: A formatted bucket path for the image file.
         """
         image_filename = image_file_path.split("/")[-1]
+        if image_format is not None:
+            image_name = image_filename.rpartition(".")[0] or image_filename
+            image_filename = f"{image_name}.{get_image_format_extension(image_format)}"
         return f"{self.uuid}/{split_name}/{self.images_path}/{image_filename}"
 
     def format_bucket_annotation_path(
@@ -58,6 +134,93 @@ class Dataset:
         annotation_filename = annotation_file_path.split("/")[-1]
         return f"{self.uuid}/{split_name}/{self.annotations_path}/{annotation_filename}"
 
+    def format_bucket_annotation_batch_path(
+        self, split_name: str, batch_number: int, extension: str = "jsonl"
+    ) -> str:
+        """
+        Formats the bucket path for a batch of annotations of a split, in the batched layout.
+
+        Args:
+            split_name (str): The name of the split (train, test, or validation) the batch packs.
+            batch_number (int): The batch's position within the split.
+            extension (str): The batch's extension, "jsonl" or "jsonl.gz".
+
+        Returns:
+            str: A formatted bucket path for the batch.
+        """
+        return f"{self.uuid}/{split_name}/{self.annotations_path}/batch-{batch_number:06d}.{extension}"
+
+    def get_split_folder_path(self, split_name: str) -> str:
+        return f"{self.uuid}/{split_name}"
+
+    def get_annotation_index_path(self, split_name: str) -> str:
+        return AnnotationBatchIndex.get_index_object_name(
+            self.get_split_folder_path(split_name)
+        )
+
+    def get_manifest_path(self) -> str:
+        return DatasetManifest.get_manifest_object_name(self.uuid)
+
+    def get_split_assignments_path(self) -> str:
+        return SplitAssignmentTable.get_split_assignments_object_name(self.uuid)
+
+    def get_statistics_path(self) -> str:
+        return DatasetStatistics.get_statistics_object_name(self.uuid)
+
+    def get_statistics(self, bucket_client: BucketClient) -> Optional[dict]:
+        """
+        Gets the dataset's statistics: those computed while it is being prepared, or those
+        stored alongside a dataset prepared before.
+
+        Returns:
+            Optional[dict]: The dataset's statistics, or None if it has none.
+        """
+        self.statistics.flush()
+        if self.statistics.number_of_samples or self.statistics.data_sources:
+            return self.statistics.to_dict()
+        return DatasetStatistics.download(
+            bucket_client=bucket_client,
+            bucket_name=self.bucket_name,
+            dataset_uuid=self.uuid,
+        )
+
+    def get_annotation_batch_writer(self, split_name: str) -> AnnotationBatchWriter:
+        """
+        Gets the writer packing the annotations of a split into batches, in the batched layout.
+        The same writer is kept for every data source the dataset is prepared from.
+        """
+        if split_name not in self._annotation_batch_writers:
+            self._annotation_batch_writers[split_name] = AnnotationBatchWriter(
+                format_batch_path=functools.partial(
+                    self.format_bucket_annotation_batch_path, split_name
+                ),
+                batch_size=self.annotation_batch_size,
+                compress=self.compress_annotations,
+            )
+        return self._annotation_batch_writers[split_name]
+
+    def get_annotation_batch_writers(self) -> dict[str, AnnotationBatchWriter]:
+        return dict(self._annotation_batch_writers)
+
+    def format_bucket_shard_path(self, split_name: str, shard_number: int) -> str:
+        """
+        Formats the bucket path for a tar shard of a split.
+
+        Args:
+            split_name (str): The name of the split (train, test, or validation) the shard packs.
+            shard_number (int): The shard's position within the split.
+
+        Returns:
+            str: A formatted bucket path for the shard.
+        """
+        return f"{self.get_shards_folder_path()}/{split_name}/{split_name}-{shard_number:06d}.tar"
+
+    def get_shards_folder_path(self) -> str:
+        return f"{self.uuid}/{self.shards_path}"
+
+    def get_shard_index_path(self) -> str:
+        return f"{self.get_shards_folder_path()}/{SHARD_INDEX_FILE_NAME}"
+
     @staticmethod
     def get_data_source_uuid() -> str:
         """
@@ -79,9 +242,315 @@ class Dataset:
             self.split_names, self.distribution_weights
         )[0]
 
-    def download(self, bucket_client: BucketClient, destination_root_path: str) -> None:
-        bucket_client.download_folder(
+    def get_split(self, sample_key: str) -> str:
+        """
+        Selects the split of a sample based on the specified distribution weights.
+
+        With the hash strategy, the split is derived from a hash of the sample's key and the
+        dataset's seed, so a sample lands in the same split whatever the order the samples are
+        prepared in and however many other samples the dataset has. With the stratified
+        strategy, it is the split assigned by `assign_stratified_splits`, and samples that were
+        not assigned one are split by hash. With the sequential strategy, it is the next split
+        drawn by `get_next_split`.
+
+        Args:
+            sample_key (str): Identifies the sample, e.g. its image's path in the data source.
+
+        Returns:
+            str: The name of the selected folder.
+        """
+        if self.split_strategy == SplitStrategy.SEQUENTIAL:
+            return self.get_next_split()
+        if self.split_strategy == SplitStrategy.STRATIFIED:
+            split_name = self.split_assignments.get_split_name(sample_key)
+            if split_name is not None:
+                return split_name
+
+        digest = hashlib.sha256(f"{self.seed}/{sample_key}".encode()).digest()
+        cumulative_weights = list(itertools.accumulate(self.distribution_weights))
+        # Uniform in [0, total weight), from the digest's first 64 bits
+        position = int.from_bytes(digest[:8], "big") / 2**64 * cumulative_weights[-1]
+        return self.split_names[
+            min(
+                bisect.bisect_right(cumulative_weights, position),
+                len(self.split_names) - 1,
+            )
+        ]
+
+    def assign_stratified_splits(
+        self, sample_keys: List[str], labels: List[List[int]]
+    ) -> None:
+        """
+        Assigns the splits of samples, stratified by label, in a single vectorized pass. Each
+        sample is stratified by its rarest label, and each stratum is divided between the splits
+        according to the distribution weights, so that rare classes are represented in every
+        split. The assignments are recorded in `split_assignments`, returned by `get_split`.
+
+        Args:
+            sample_keys (List[str]): Identifies each sample, as passed to `get_split`.
+            labels (List[List[int]]): The labels of each sample's annotation.
+        """
+        strata = get_label_strata(labels)
+        split_indices = get_stratified_splits(
+            strata=strata,
+            sample_hashes=hash_sample_keys(sample_keys, self.seed),
+            weights=self.distribution_weights,
+        )
+        self.split_assignments.add_assignments(
+            sample_keys=sample_keys,
+            strata=strata.tolist(),
+            split_names=[self.split_names[i] for i in split_indices.tolist()],
+        )
+
+    def download(
+        self,
+        bucket_client: BucketClient,
+        destination_root_path: str,
+        on_object_downloaded: Optional[Callable[[str], None]] = None,
+    ) -> TransferStats:
+        """
+        Downloads the dataset under `destination_root_path`. A sharded dataset is downloaded as
+        its tar shards and their index only, i.e. a few large sequential transfers. A virtual
+        dataset is resolved from its manifest, laid out as a dataset of objects.
+
+        Args:
+            bucket_client (BucketClient): The bucket client to download the dataset with.
+            destination_root_path (str): The local folder to download the dataset into.
+            on_object_downloaded (Optional[Callable[[str], None]]): Called with the object name
+                of each downloaded file, relative to `destination_root_path`, as it lands.
+
+        Returns:
+            TransferStats: The throughput of the download.
+        """
+        if self.dataset_format == DatasetFormat.VIRTUAL:
+            return self._download_references(
+                bucket_client=bucket_client,
+                destination_root_path=destination_root_path,
+                on_object_downloaded=on_object_downloaded,
+            )
+
+        folder_name = (
+            f"{self.get_shards_folder_path()}/"
+            if self.dataset_format == DatasetFormat.SHARDS
+            else f"{self.uuid}/"
+        )
+        return bucket_client.download_folder(
             bucket_name=self.bucket_name,
-            folder_name=self.uuid,
+            folder_name=folder_name,
             destination_path=destination_root_path,
+            on_object_downloaded=on_object_downloaded,
+        )
+
+    def _download_references(
+        self,
+        bucket_client: BucketClient,
+        destination_root_path: str,
+        on_object_downloaded: Optional[Callable[[str], None]] = None,
+    ) -> TransferStats:
+        """
+        Downloads a virtual dataset: each sample's image is downloaded from its data source, at
+        the version the manifest references, and its annotation written from the manifest.
+        Images already downloaded with the referenced size are skipped.
+        """
+        manifest = DatasetManifest.download(
+            bucket_client=bucket_client,
+            bucket_name=self.bucket_name,
+            dataset_uuid=self.uuid,
+        )
+        if manifest is None:
+            raise FileNotFoundError(f"The virtual dataset {self.uuid} has no manifest.")
+
+        transfer_stats = TransferStats()
+
+        def _download(entry: DatasetManifestEntry) -> None:
+            self._download_reference(
+                bucket_client=bucket_client,
+                entry=entry,
+                destination_root_path=destination_root_path,
+                transfer_stats=transfer_stats,
+            )
+            if on_object_downloaded is not None:
+                on_object_downloaded(
+                    self.format_bucket_annotation_path(
+                        annotation_file_path=entry.annotation_file_path,
+                        split_name=entry.split_name,
+                    )
+                )
+
+        with ThreadPoolExecutor(max_workers=bucket_client.max_workers) as executor:
+            for future in iter_completed(
+                executor,
+                _download,
+                manifest,
+                max_in_flight=bucket_client.max_workers * 4,
+            ):
+                future.result()
+
+        with open(
+            os.path.join(destination_root_path, self.get_manifest_path()), "wb"
+        ) as f:
+            f.write(manifest.to_bytes())
+
+        return transfer_stats.stop()
+
+    def _download_reference(
+        self,
+        bucket_client: BucketClient,
+        entry: DatasetManifestEntry,
+        destination_root_path: str,
+        transfer_stats: TransferStats,
+    ) -> None:
+        annotation_file_path = os.path.join(
+            destination_root_path,
+            self.format_bucket_annotation_path(
+                annotation_file_path=entry.annotation_file_path,
+                split_name=entry.split_name,
+            ),
+        )
+        image_file_path = os.path.join(
+            destination_root_path,
+            self.format_bucket_image_path(
+                image_file_path=entry.image_file_path,
+                split_name=entry.split_name,
+                image_format=entry.image_format,
+            ),
         )
+        os.makedirs(os.path.dirname(annotation_file_path), exist_ok=True)
+        os.makedirs(os.path.dirname(image_file_path), exist_ok=True)
+
+        with open(annotation_file_path, "w") as f:
+            json.dump(entry.annotation, f)
+
+        if (
+            entry.image_size is not None
+            and os.path.exists(image_file_path)
+            and os.path.getsize(image_file_path) == entry.image_size
+        ):
+            transfer_stats.add_skipped(entry.image_size)
+            return
+
+        # The entries of a virtual dataset reference their data source's bucket
+        assert entry.source_bucket_name is not None
+        image_bucket_response = bucket_client.get_object(
+            bucket_name=entry.source_bucket_name,
+            object_name=entry.image_file_path,
+            version_id=entry.image_version_id,
+        )
+        try:
+            image_data = image_bucket_response.data
+        finally:
+            image_bucket_response.close()
+            image_bucket_response.release_conn()
+
+        # Written aside first, so that an interrupted download is never taken as complete
+        partial_file_path = f"{image_file_path}.part"
+        with open(partial_file_path, "wb") as f:
+            f.write(image_data)
+        os.replace(partial_file_path, image_file_path)
+        transfer_stats.add_transferred(len(image_data))
+
+    def unpack_shards(self, destination_root_path: str) -> int:
+        """
+        Unpacks the downloaded shards of the dataset into one image file and one annotation
+        file per sample, laid out as the dataset's objects are in the bucket.
+
+        Args:
+            destination_root_path (str): The folder the dataset was downloaded into.
+
+        Returns:
+            int: The number of unpacked samples.
+        """
+        with open(
+            os.path.join(destination_root_path, self.get_shard_index_path()), "rb"
+        ) as f:
+            shard_index = ShardIndex.from_bytes(f.read())
+
+        number_of_samples = 0
+        for split_name, shards in shard_index.splits.items():
+            annotations_folder_path = os.path.join(
+                destination_root_path, self.uuid, split_name, self.annotations_path
+            )
+            images_folder_path = os.path.join(
+                destination_root_path, self.uuid, split_name, self.images_path
+            )
+            os.makedirs(annotations_folder_path, exist_ok=True)
+            os.makedirs(images_folder_path, exist_ok=True)
+
+            for shard_info in shards:
+                for key, members in iter_shard_samples(
+                    os.path.join(destination_root_path, shard_info.object_name)
+                ):
+                    annotation_data = members.pop("json")
+                    # The image's member is named after the format it was stored in
+                    ((image_extension, image_data),) = members.items()
+                    image_file_name = json.loads(annotation_data)["image_path"].split(
+                        "/"
+                    )[-1]
+                    image_name = image_file_name.rpartition(".")[0] or image_file_name
+
+                    with open(
+                        os.path.join(annotations_folder_path, f"{key}.json"), "wb"
+                    ) as f:
+                        f.write(annotation_data)
+                    with open(
+                        os.path.join(
+                            images_folder_path, f"{image_name}.{image_extension}"
+                        ),
+                        "wb",
+                    ) as f:
+                        f.write(image_data)
+                    number_of_samples += 1
+
+        return number_of_samples
+
+    def unpack_annotation_batches(self, destination_root_path: str) -> int:
+        """
+        Unpacks the downloaded annotation batches of the dataset into one annotation file per
+        sample, laid out as the annotations of a dataset in the objects layout. The batches and
+        their index are removed once unpacked.
+
+        Args:
+            destination_root_path (str): The folder the dataset was downloaded into.
+
+        Returns:
+            int: The number of unpacked annotations.
+        """
+        number_of_annotations = 0
+        for split_name in self.split_names:
+            index_file_path = os.path.join(
+                destination_root_path, self.get_annotation_index_path(split_name)
+            )
+            if not os.path.exists(index_file_path):
+                continue
+            with open(index_file_path, "rb") as f:
+                annotation_index = AnnotationBatchIndex.from_bytes(f.read())
+
+            annotations_folder_path = os.path.join(
+                destination_root_path, self.uuid, split_name, self.annotations_path
+            )
+            batch_data: dict[str, bytes] = {}
+            for batched_annotation in annotation_index:
+                batch_file_path = os.path.join(
+                    destination_root_path, batched_annotation.batch_object_name
+                )
+                if batch_file_path not in batch_data:
+                    # Batches are read one after the other, as the index lists them in order
+                    batch_data.clear()
+                    with open(batch_file_path, "rb") as f:
+                        batch_data[batch_file_path] = f.read()
+
+                annotation_file_name = batched_annotation.annotation_path.split("/")[-1]
+                with open(
+                    os.path.join(annotations_folder_path, annotation_file_name), "wb"
+                ) as f:
+                    f.write(
+                        batched_annotation.read_from_batch(batch_data[batch_file_path])
+                    )
+                number_of_annotations += 1
+
+            # The split is left as it would have been downloaded in the objects layout
+            for batch_object_name in annotation_index.get_batch_object_names():
+                os.remove(os.path.join(destination_root_path, batch_object_name))
+            os.remove(index_file_path)
+
+        return number_of_annotations
@@ -0,0 +1,193 @@
+import json
+import threading
+from typing import Iterator, List, Optional
+
+from src.models.model_bucket_client import BucketClient
+
+DATASET_MANIFEST_FILE_NAME = "dataset_manifest.jsonl"
+
+
+class DatasetManifestEntry:
+    def __init__(
+        self,
+        annotation_file_path: str,
+        image_file_path: str,
+        split_name: str,
+        annotation_sha256: Optional[str] = None,
+        image_sha256: Optional[str] = None,
+        image_format: Optional[str] = None,
+        source_bucket_name: Optional[str] = None,
+        image_version_id: Optional[str] = None,
+        image_size: Optional[int] = None,
+        annotation: Optional[dict] = None,
+        image_width: Optional[int] = None,
+        image_height: Optional[int] = None,
+    ):
+        """
+        Initialize a DatasetManifestEntry, describing a sample of a dataset and the data source
+        objects it was prepared from.
+
+        The entries of a virtual dataset are the dataset itself: they reference the image in
+        its data source's bucket, at the version it was validated at, and carry the annotation.
+
+        Args:
+            annotation_file_path (str): The annotation's object name in the data sources' bucket.
+            image_file_path (str): The image's object name in the data sources' bucket.
+            split_name (str): The split the sample was assigned to.
+            annotation_sha256 (Optional[str]): SHA-256 of the annotation's content, when known
+                from the data source's manifest.
+            image_sha256 (Optional[str]): SHA-256 of the image's content, when known from the
+                data source's manifest.
+            image_format (Optional[str]): Format the image is stored in, when known.
+            source_bucket_name (Optional[str]): Name of the bucket holding the data source, in a
+                virtual dataset.
+            image_version_id (Optional[str]): Version of the referenced image, in a virtual
+                dataset, None if the bucket is not versioned.
+            image_size (Optional[int]): Size of the image, in bytes, when known, that of the
+                referenced image in a virtual dataset.
+            annotation (Optional[dict]): The sample's annotation, in a virtual dataset.
+            image_width (Optional[int]): Width of the image, in pixels, when known.
+            image_height (Optional[int]): Height of the image, in pixels, when known.
+        """
+        self.annotation_file_path = annotation_file_path
+        self.image_file_path = image_file_path
+        self.split_name = split_name
+        self.annotation_sha256 = annotation_sha256
+        self.image_sha256 = image_sha256
+        self.image_format = image_format
+        self.source_bucket_name = source_bucket_name
+        self.image_version_id = image_version_id
+        self.image_size = image_size
+        self.annotation = annotation
+        self.image_width = image_width
+        self.image_height = image_height
+
+    def has_same_content(
+        self, annotation_sha256: Optional[str], image_sha256: Optional[str]
+    ) -> bool:
+        """
+        Checks if the sample's annotation and image still have the given contents. Samples
+        whose hashes are unknown are never considered unchanged.
+        """
+        return (
+            self.annotation_sha256 is not None
+            and self.image_sha256 is not None
+            and self.annotation_sha256 == annotation_sha256
+            and self.image_sha256 == image_sha256
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "annotation_file_path": self.annotation_file_path,
+            "image_file_path": self.image_file_path,
+            "split_name": self.split_name,
+            "annotation_sha256": self.annotation_sha256,
+            "image_sha256": self.image_sha256,
+            "image_format": self.image_format,
+            "source_bucket_name": self.source_bucket_name,
+            "image_version_id": self.image_version_id,
+            "image_size": self.image_size,
+            "annotation": self.annotation,
+            "image_width": self.image_width,
+            "image_height": self.image_height,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "DatasetManifestEntry":
+        return DatasetManifestEntry(
+            annotation_file_path=data["annotation_file_path"],
+            image_file_path=data["image_file_path"],
+            split_name=data["split_name"],
+            annotation_sha256=data.get("annotation_sha256"),
+            image_sha256=data.get("image_sha256"),
+            image_format=data.get("image_format"),
+            source_bucket_name=data.get("source_bucket_name"),
+            image_version_id=data.get("image_version_id"),
+            image_size=data.get("image_size"),
+            annotation=data.get("annotation"),
+            image_width=data.get("image_width"),
+            image_height=data.get("image_height"),
+        )
+
+
+class DatasetManifest:
+    def __init__(self, entries: Optional[List[DatasetManifestEntry]] = None):
+        """
+        Initialize a DatasetManifest, the index of a dataset's samples written alongside its
+        objects at preparation time.
+
+        The manifest is stored as a JSON lines object, one entry per sample sorted by
+        annotation path. It records where each sample came from, with the hashes of its
+        contents, and the split it was assigned to, so that a dataset can be prepared
+        incrementally from it.
+
+        Args:
+            entries (Optional[List[DatasetManifestEntry]]): The manifest's initial entries.
+        """
+        self._entries: dict[str, DatasetManifestEntry] = {
+            entry.annotation_file_path: entry for entry in entries or []
+        }
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[DatasetManifestEntry]:
+        """
+        Iterates over the entries, sorted by annotation path.
+        """
+        for annotation_file_path in sorted(self._entries):
+            yield self._entries[annotation_file_path]
+
+    def get(self, annotation_file_path: str) -> Optional[DatasetManifestEntry]:
+        return self._entries.get(annotation_file_path)
+
+    def add_entry(self, entry: DatasetManifestEntry) -> None:
+        """
+        Adds or replaces the entry of a sample. Safe to call from several threads.
+        """
+        with self._lock:
+            self._entries[entry.annotation_file_path] = entry
+
+    def to_bytes(self) -> bytes:
+        with self._lock:
+            entries = list(self)
+        return "".join(json.dumps(entry.to_dict()) + "\n" for entry in entries).encode()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "DatasetManifest":
+        return DatasetManifest(
+            entries=[
+                DatasetManifestEntry.from_dict(json.loads(line))
+                for line in data.decode("utf-8").splitlines()
+                if line.strip()
+            ]
+        )
+
+    @staticmethod
+    def get_manifest_object_name(dataset_uuid: str) -> str:
+        return f"{dataset_uuid}/{DATASET_MANIFEST_FILE_NAME}"
+
+    @staticmethod
+    def download(
+        bucket_client: BucketClient, bucket_name: str, dataset_uuid: str
+    ) -> Optional["DatasetManifest"]:
+        """
+        Downloads the manifest of a dataset.
+
+        Args:
+            bucket_client (BucketClient): The bucket client to download the manifest with.
+            bucket_name (str): Name of the bucket holding the dataset.
+            dataset_uuid (str): UUID of the dataset.
+
+        Returns:
+            Optional[DatasetManifest]: The dataset's manifest, or None if it has none.
+        """
+        manifest_data = bucket_client.get_object_data_or_none(
+            bucket_name=bucket_name,
+            object_name=DatasetManifest.get_manifest_object_name(dataset_uuid),
+        )
+        if manifest_data is None:
+            return None
+
+        return DatasetManifest.from_bytes(manifest_data)
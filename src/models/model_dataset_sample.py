@@ -0,0 +1,47 @@
+from typing import Optional
+
+from src.models.model_annotation_batch import BatchedAnnotation
+
+
+class DatasetSample:
+    def __init__(
+        self,
+        annotation_file_path: str,
+        image_file_path: str,
+        annotation: dict,
+        image_data: Optional[bytes] = None,
+        image_size: Optional[int] = None,
+        image_etag: Optional[str] = None,
+        batched_annotation: Optional[BatchedAnnotation] = None,
+        image_format: Optional[str] = None,
+        annotation_sha256: Optional[str] = None,
+        image_sha256: Optional[str] = None,
+        image_version_id: Optional[str] = None,
+        image_width: Optional[int] = None,
+        image_height: Optional[int] = None,
+        is_carried: bool = False,
+    ):
+        """
+        Initialize a DatasetSample, an annotation/image pair flowing through the dataset preparation.
+        """
+        self.annotation_file_path = annotation_file_path
+        self.image_file_path = image_file_path
+        self.annotation = annotation
+        self.image_data = image_data
+        self.image_size = image_size
+        self.image_etag = image_etag
+        # Set when the annotation is packed in a batch rather than stored as its own object
+        self.batched_annotation = batched_annotation
+        # The format the image was stored in, when known from the data source's manifest
+        self.image_format = image_format
+        # The contents' hashes, when known from the data source's manifest
+        self.annotation_sha256 = annotation_sha256
+        self.image_sha256 = image_sha256
+        # The image's version, from the data source's manifest or the image's read
+        self.image_version_id = image_version_id
+        # The image's dimensions, read at validation or carried from the parent dataset
+        self.image_width = image_width
+        self.image_height = image_height
+        # Set when the sample is carried over, unchanged, from the parent dataset
+        self.is_carried = is_carried
+        self.split_name: Optional[str] = None
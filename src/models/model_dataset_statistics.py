@@ -0,0 +1,284 @@
+import itertools
+import json
+from typing import List, Optional
+
+import numpy as np
+
+from src.models.model_bucket_client import BucketClient
+from src.models.model_data_source import DataSource
+from src.models.model_dataset_sample import DatasetSample
+
+DATASET_STATISTICS_FILE_NAME = "dataset_statistics.json"
+# Bounding boxes are normalized, so their sizes are binned over [0, 1]
+BBOX_SIZE_BIN_EDGES = np.linspace(0.0, 1.0, 21)
+# Larger images are counted in the last bin
+IMAGE_SIDE_BIN_EDGES = np.array([0, 128, 256, 512, 1024, 2048, 4096, 65536])
+
+
+class RunningDistribution:
+    def __init__(self, bin_edges: np.ndarray):
+        """
+        Initialize a RunningDistribution, the summary of a stream of values aggregated chunk
+        by chunk: their count, extrema, mean, standard deviation and histogram.
+
+        Args:
+            bin_edges (np.ndarray): Edges of the histogram's bins. Values outside of them are
+                counted in the first or last bin.
+        """
+        self.bin_edges = bin_edges
+        self.histogram = np.zeros(len(bin_edges) - 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.squared_total = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def add_values(self, values: np.ndarray) -> None:
+        if values.size == 0:
+            return
+
+        self.count += values.size
+        self.total += float(values.sum())
+        self.squared_total += float(np.square(values).sum())
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self.histogram += np.histogram(
+            np.clip(values, self.bin_edges[0], self.bin_edges[-1]), bins=self.bin_edges
+        )[0]
+
+    def to_dict(self) -> dict:
+        if self.count == 0:
+            return {"count": 0}
+
+        mean = self.total / self.count
+        return {
+            "count": self.count,
+            "min": self.minimum,
+            "max": self.maximum,
+            "mean": mean,
+            "std": max(self.squared_total / self.count - mean**2, 0.0) ** 0.5,
+            "histogram": {
+                "bin_edges": [float(edge) for edge in self.bin_edges],
+                "counts": self.histogram.tolist(),
+            },
+        }
+
+
+class DatasetStatistics:
+    def __init__(self, split_names: List[str], chunk_size: int = 65536):
+        """
+        Initialize a DatasetStatistics, the statistics of a dataset computed while its samples
+        are prepared: the number of samples and boxes per split, the class histogram, the
+        distribution of the boxes' sizes and of the images' resolutions and sizes.
+
+        The samples are buffered as they are added and aggregated with NumPy every `chunk_size`
+        samples, so that the statistics cost a few vectorized passes rather than a pass over
+        the annotations after the preparation. They are stored as a JSON sidecar alongside the
+        dataset's objects.
+
+        Args:
+            split_names (List[str]): The dataset's splits.
+            chunk_size (int): Number of samples buffered between two aggregations.
+        """
+        self.split_names = split_names
+        self.chunk_size = max(1, chunk_size)
+
+        self.number_of_samples = 0
+        self.number_of_boxes = 0
+        self.image_bytes = 0
+        self.split_samples = np.zeros(len(split_names), dtype=np.int64)
+        self.split_boxes = np.zeros(len(split_names), dtype=np.int64)
+        # Number of boxes and of samples of each label, per split
+        self.label_boxes: dict[int, np.ndarray] = {}
+        self.label_samples: dict[int, np.ndarray] = {}
+        self.bbox_width = RunningDistribution(BBOX_SIZE_BIN_EDGES)
+        self.bbox_height = RunningDistribution(BBOX_SIZE_BIN_EDGES)
+        self.bbox_area = RunningDistribution(BBOX_SIZE_BIN_EDGES)
+        self.image_width = RunningDistribution(IMAGE_SIDE_BIN_EDGES)
+        self.image_height = RunningDistribution(IMAGE_SIDE_BIN_EDGES)
+        self.data_sources: dict[str, dict] = {}
+
+        self._buffered_splits: List[int] = []
+        self._buffered_labels: List[List[int]] = []
+        self._buffered_bboxes: List[List[List[float]]] = []
+        self._buffered_resolutions: List[tuple] = []
+        self._buffered_image_sizes: List[int] = []
+
+    def add_sample(self, sample: DatasetSample) -> None:
+        """
+        Buffers a sample assigned to its split, aggregating the buffer once full.
+        """
+        assert sample.split_name is not None
+        self._buffered_splits.append(self.split_names.index(sample.split_name))
+        self._buffered_labels.append(sample.annotation["label"])
+        self._buffered_bboxes.append(sample.annotation["bbox"])
+        if sample.image_width is not None and sample.image_height is not None:
+            self._buffered_resolutions.append((sample.image_width, sample.image_height))
+        if sample.image_size is not None:
+            self._buffered_image_sizes.append(sample.image_size)
+
+        if len(self._buffered_splits) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Aggregates the buffered samples.
+        """
+        if not self._buffered_splits:
+            return
+
+        splits = np.array(self._buffered_splits, dtype=np.int64)
+        self.number_of_samples += len(splits)
+        self.split_samples += np.bincount(splits, minlength=len(self.split_names))
+        self._add_labels(splits)
+        self._add_bboxes(splits)
+
+        if self._buffered_resolutions:
+            resolutions = np.array(self._buffered_resolutions, dtype=np.float64)
+            self.image_width.add_values(resolutions[:, 0])
+            self.image_height.add_values(resolutions[:, 1])
+        self.image_bytes += int(np.sum(self._buffered_image_sizes, dtype=np.int64))
+
+        self._buffered_splits = []
+        self._buffered_labels = []
+        self._buffered_bboxes = []
+        self._buffered_resolutions = []
+        self._buffered_image_sizes = []
+
+    def _add_labels(self, splits: np.ndarray) -> None:
+        lengths = np.fromiter(map(len, self._buffered_labels), dtype=np.int64)
+        labels = np.fromiter(
+            (
+                label
+                for sample_labels in self._buffered_labels
+                for label in sample_labels
+            ),
+            dtype=np.int64,
+            count=lengths.sum(),
+        )
+        if labels.size == 0:
+            return
+
+        label_splits = np.repeat(splits, lengths)
+        sample_ids = np.repeat(np.arange(len(splits)), lengths)
+        unique_labels, label_codes = np.unique(labels, return_inverse=True)
+        number_of_splits = len(self.split_names)
+
+        box_counts = np.bincount(
+            label_codes * number_of_splits + label_splits,
+            minlength=len(unique_labels) * number_of_splits,
+        ).reshape(len(unique_labels), number_of_splits)
+        # A sample counts once per label, however many boxes it has
+        sample_label_keys = np.unique(sample_ids * len(unique_labels) + label_codes)
+        sample_label_codes = sample_label_keys % len(unique_labels)
+        sample_counts = np.bincount(
+            sample_label_codes * number_of_splits
+            + splits[sample_label_keys // len(unique_labels)],
+            minlength=len(unique_labels) * number_of_splits,
+        ).reshape(len(unique_labels), number_of_splits)
+
+        for label, label_box_counts, label_sample_counts in zip(
+            unique_labels.tolist(), box_counts, sample_counts
+        ):
+            self.label_boxes.setdefault(
+                label, np.zeros(number_of_splits, dtype=np.int64)
+            )
+            self.label_samples.setdefault(
+                label, np.zeros(number_of_splits, dtype=np.int64)
+            )
+            self.label_boxes[label] += label_box_counts
+            self.label_samples[label] += label_sample_counts
+
+    def _add_bboxes(self, splits: np.ndarray) -> None:
+        lengths = np.fromiter(map(len, self._buffered_bboxes), dtype=np.int64)
+        bboxes = np.fromiter(
+            itertools.chain.from_iterable(
+                itertools.chain.from_iterable(self._buffered_bboxes)
+            ),
+            dtype=np.float64,
+            count=4 * lengths.sum(),
+        ).reshape(-1, 4)
+
+        self.number_of_boxes += len(bboxes)
+        self.split_boxes += np.bincount(
+            np.repeat(splits, lengths), minlength=len(self.split_names)
+        )
+        # Boxes are [x_center, y_center, width, height]
+        self.bbox_width.add_values(bboxes[:, 2])
+        self.bbox_height.add_values(bboxes[:, 3])
+        self.bbox_area.add_values(bboxes[:, 2] * bboxes[:, 3])
+
+    def add_data_source(
+        self, data_source: DataSource, number_of_records: int, size: int
+    ) -> None:
+        """
+        Records the metadata of a data source prepared into the dataset, with the number of
+        its samples the dataset holds and the size of their images.
+        """
+        data_source_metadata = data_source.get_metadata()
+        data_source_metadata.number_of_records = number_of_records
+        data_source_metadata.size = size
+        self.data_sources[data_source.name] = data_source_metadata.to_dict()
+
+    def to_dict(self) -> dict:
+        self.flush()
+        return {
+            "number_of_samples": self.number_of_samples,
+            "number_of_boxes": self.number_of_boxes,
+            "image_bytes": self.image_bytes,
+            "splits": {
+                split_name: {
+                    "number_of_samples": int(self.split_samples[split_index]),
+                    "number_of_boxes": int(self.split_boxes[split_index]),
+                }
+                for split_index, split_name in enumerate(self.split_names)
+            },
+            "classes": {
+                str(label): {
+                    "number_of_boxes": dict(
+                        zip(self.split_names, self.label_boxes[label].tolist())
+                    ),
+                    "number_of_samples": dict(
+                        zip(self.split_names, self.label_samples[label].tolist())
+                    ),
+                }
+                for label in sorted(self.label_boxes)
+            },
+            "bbox_width": self.bbox_width.to_dict(),
+            "bbox_height": self.bbox_height.to_dict(),
+            "bbox_area": self.bbox_area.to_dict(),
+            "image_width": self.image_width.to_dict(),
+            "image_height": self.image_height.to_dict(),
+            "data_sources": self.data_sources,
+        }
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(self.to_dict(), indent=2).encode()
+
+    @staticmethod
+    def get_statistics_object_name(dataset_uuid: str) -> str:
+        return f"{dataset_uuid}/{DATASET_STATISTICS_FILE_NAME}"
+
+    @staticmethod
+    def download(
+        bucket_client: BucketClient, bucket_name: str, dataset_uuid: str
+    ) -> Optional[dict]:
+        """
+        Downloads the statistics sidecar of a dataset.
+
+        Args:
+            bucket_client (BucketClient): The bucket client to download the statistics with.
+            bucket_name (str): Name of the bucket holding the dataset.
+            dataset_uuid (str): UUID of the dataset.
+
+        Returns:
+            Optional[dict]: The dataset's statistics, or None if it has none.
+        """
+        statistics_data = bucket_client.get_object_data_or_none(
+            bucket_name=bucket_name,
+            object_name=DatasetStatistics.get_statistics_object_name(dataset_uuid),
+        )
+        if statistics_data is None:
+            return None
+
+        return json.loads(statistics_data)
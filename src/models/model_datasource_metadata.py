@@ -49,7 +49,13 @@ class DataSourceMetadata:
         """
         # Using vars(self) or self.__dict__ here to convert object attributes to a dictionary
         return {
-            k: (v.isoformat() if isinstance(v, datetime) else v)
+            k: (
+                v.isoformat()
+                if isinstance(v, datetime)
+                else v.value
+                if isinstance(v, Enum)
+                else v
+            )
             for k, v in vars(self).items()
         }
 
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import threading
+
+DOWNLOAD_STATE_FILE_NAME = ".download_state.jsonl"
+
+
+class DownloadState:
+    def __init__(self, destination_path: str):
+        """
+        Initialize the DownloadState, a journal of the objects completely downloaded into a folder.
+
+        The journal is an append-only JSON lines file, so an interrupted download loses at most
+        the entry being written and can be resumed from the objects already recorded.
+
+        Args:
+            destination_path (str): The local folder objects are downloaded into.
+        """
+        self.file_path = os.path.join(destination_path, DOWNLOAD_STATE_FILE_NAME)
+        self._entries: dict[tuple[str, str], dict] = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.file_path):
+            with open(self.file_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Partially written last line of an interrupted download
+                        continue
+                    self._entries[(entry["bucket_name"], entry["object_name"])] = entry
+
+    def is_complete(
+        self,
+        bucket_name: str,
+        object_name: str,
+        etag: str,
+        size: int,
+        local_file_path: str,
+    ) -> bool:
+        """
+        Checks if an object is already present locally with a matching size and ETag.
+
+        Objects missing from the journal are still recognized when their ETag is the MD5 of
+        their content, i.e. when they were not uploaded in multiple parts.
+
+        Returns:
+            bool: True if the local file is up to date, False otherwise.
+        """
+        try:
+            if os.path.getsize(local_file_path) != size:
+                return False
+        except OSError:
+            return False
+
+        entry = self._entries.get((bucket_name, object_name))
+        if entry is not None:
+            return entry["etag"] == etag and entry["size"] == size
+
+        if etag and "-" not in etag and self._md5(local_file_path) == etag:
+            self.mark_complete(bucket_name, object_name, etag, size)
+            return True
+
+        return False
+
+    def mark_complete(
+        self, bucket_name: str, object_name: str, etag: str, size: int
+    ) -> None:
+        """
+        Records an object as completely downloaded.
+        """
+        entry = {
+            "bucket_name": bucket_name,
+            "object_name": object_name,
+            "etag": etag,
+            "size": size,
+        }
+        with self._lock:
+            self._entries[(bucket_name, object_name)] = entry
+            with open(self.file_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    @staticmethod
+    def _md5(file_path: str) -> str:
+        hasher = hashlib.md5()
+        with open(file_path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                hasher.update(chunk)
+        return hasher.hexdigest()
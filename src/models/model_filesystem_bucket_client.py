@@ -0,0 +1,496 @@
+import json
+import mmap
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Callable, Generator, Iterable, Iterator
+
+import tqdm
+from minio import S3Error
+from minio.datatypes import Object
+from minio.helpers import ObjectWriteResult
+
+from src.models.model_bucket_client import (
+    DEFAULT_MAX_WORKERS,
+    BucketClient,
+    ChecksumReader,
+)
+from src.models.model_download_state import DownloadState
+from src.models.model_transfer_stats import TransferStats
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+# ioctl request cloning a file's extents into another file (Linux, on Btrfs/XFS/...)
+FICLONE = 0x40049409
+
+METADATA_FOLDER_NAME = ".metadata"
+TEMPORARY_FOLDER_NAME = ".tmp"
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class FilesystemObjectResponse:
+    def __init__(self, file_path: str, url: str, offset: int = 0, length: int = 0):
+        """
+        Memory-mapped read of a stored object, exposing the subset of urllib3's HTTPResponse
+        interface used by the bucket client's callers (`data`, `headers`, `read`, `stream`,
+        `geturl`, `close` and `release_conn`).
+
+        Args:
+            file_path (str): Path of the object's file on disk.
+            url (str): URL identifying the object, returned by `geturl`.
+            offset (int): Start byte position of the read.
+            length (int): Number of bytes to read from the offset, 0 reading until the end.
+        """
+        self.url = url
+
+        with open(file_path, "rb") as f:
+            stat_result = os.fstat(f.fileno())
+            self.size = stat_result.st_size
+            # Empty files cannot be memory-mapped
+            self._mmap = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+            )
+
+        self._start = min(offset, self.size)
+        self._end = min(offset + length, self.size) if length else self.size
+        self._position = self._start
+
+        self.headers = {
+            "content-length": str(self._end - self._start),
+            "ETag": f'"{FilesystemBucketClient._get_etag(stat_result)}"',
+        }
+
+    @property
+    def data(self) -> bytes:
+        return self._mmap[self._start : self._end] if self._mmap is not None else b""
+
+    def getbuffer(self) -> memoryview:
+        """
+        Returns a zero-copy view of the object. The view must be released before closing.
+        """
+        if self._mmap is None:
+            return memoryview(b"")
+        return memoryview(self._mmap)[self._start : self._end]
+
+    def read(self, amt: int | None = None) -> bytes:
+        if self._mmap is None:
+            return b""
+
+        end = self._end if amt is None else min(self._position + amt, self._end)
+        chunk = self._mmap[self._position : end]
+        self._position = end
+        return chunk
+
+    def stream(self, amt: int = COPY_CHUNK_SIZE) -> Iterator[bytes]:
+        while chunk := self.read(amt):
+            yield chunk
+
+    def geturl(self) -> str:
+        return self.url
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def release_conn(self) -> None:
+        pass
+
+
+class FilesystemBucketClient(BucketClient):
+    def __init__(self, root_path: str, max_workers: int = DEFAULT_MAX_WORKERS):
+        """
+        Bucket client storing buckets as folders of a local directory tree.
+
+        Object copies are made with reflinks when the filesystem supports them, falling back to
+        hardlinks then to plain copies. Every write goes through a temporary file atomically
+        renamed over its destination, so a linked object is never modified in place. Folder
+        downloads are reflinked or copied, never hardlinked, as their owner may modify them.
+        Missing objects raise the same S3Error as MinIO does.
+
+        Args:
+            root_path (str): The folder holding the buckets.
+            max_workers (int): Concurrency used by the bulk operations.
+        """
+        self.root_path = os.path.abspath(root_path)
+        self.max_workers = max_workers
+
+    def check_connection(self) -> None:
+        if not os.path.isdir(self.root_path):
+            raise ConnectionError(
+                f"The buckets' root folder '{self.root_path}' does not exist"
+            )
+
+    def bucket_exists(self, bucket_name: str) -> bool:
+        return os.path.isdir(self._get_bucket_path(bucket_name))
+
+    def folder_exists(self, bucket_name: str, folder_name: str) -> bool:
+        if not folder_name.endswith("/"):
+            folder_name += "/"
+
+        for _ in self.list_objects(bucket_name=bucket_name, prefix=folder_name):
+            return True
+        return False
+
+    def make_bucket(self, bucket_name: str, enable_versioning: bool):
+        """
+        Creates the bucket's folder. Versioning is not supported and objects are overwritten.
+        """
+        os.makedirs(self._get_bucket_path(bucket_name), exist_ok=True)
+
+    def upload_file(
+        self,
+        bucket_name: str,
+        object_name: str,
+        file_path: str,
+        metadata: dict | None = None,
+    ) -> tuple[str, str | None]:
+        # Source files are copied rather than linked, as their owner may still modify them
+        temporary_file_path = self._get_temporary_file_path()
+        try:
+            with open(file_path, "rb") as source, open(
+                temporary_file_path, "wb"
+            ) as destination:
+                checksum_reader = ChecksumReader(source)
+                shutil.copyfileobj(checksum_reader, destination, COPY_CHUNK_SIZE)
+            self._commit_object(bucket_name, object_name, temporary_file_path, metadata)
+        finally:
+            self._remove_if_exists(temporary_file_path)
+
+        # Versioning is not supported, objects have no version
+        return checksum_reader.sha256.hexdigest(), None
+
+    def upload_data(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data: BinaryIO,
+        length: int,
+        metadata: dict | None = None,
+    ) -> ObjectWriteResult:
+        temporary_file_path = self._get_temporary_file_path()
+        try:
+            with open(temporary_file_path, "wb") as f:
+                remaining = length
+                while remaining > 0 and (
+                    chunk := data.read(min(remaining, COPY_CHUNK_SIZE))
+                ):
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            self._commit_object(bucket_name, object_name, temporary_file_path, metadata)
+        finally:
+            self._remove_if_exists(temporary_file_path)
+
+        return self._get_write_result(bucket_name, object_name)
+
+    def list_objects(
+        self, bucket_name: str, prefix: str | None = None, recursive: bool = False
+    ) -> Generator[Object, Any, None]:
+        """
+        Lists the objects of a bucket in lexicographic order, like S3 does. Without `recursive`,
+        objects nested under a sub-folder of the prefix are rolled up into a folder entry.
+        """
+        bucket_path = self._get_bucket_path(bucket_name)
+        if not os.path.isdir(bucket_path):
+            raise FileNotFoundError(f"The bucket '{bucket_name}' does not exist")
+
+        prefix = prefix or ""
+        folder_name, _, name_prefix = prefix.rpartition("/")
+        folder_path = self._get_object_path(bucket_name, folder_name)
+        object_prefix = f"{folder_name}/" if folder_name else ""
+
+        yield from self._list_folder(
+            bucket_name, folder_path, object_prefix, name_prefix, recursive
+        )
+
+    def get_object(
+        self,
+        bucket_name: str,
+        object_name: str,
+        offset: int = 0,
+        length: int = 0,
+        version_id: str | None = None,
+    ) -> FilesystemObjectResponse:
+        # Versioning is not supported, the current content is always read
+        object_path = self._get_object_path(bucket_name, object_name)
+        try:
+            return FilesystemObjectResponse(
+                file_path=object_path,
+                url=f"file://{object_path}",
+                offset=offset,
+                length=length,
+            )
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            raise self._get_not_found_error(bucket_name, object_name) from None
+
+    def stat_object(self, bucket_name: str, object_name: str) -> Object:
+        object_path = self._get_object_path(bucket_name, object_name)
+        if not os.path.isfile(object_path):
+            raise self._get_not_found_error(bucket_name, object_name)
+        return self._get_object_info(bucket_name, object_name, os.stat(object_path))
+
+    def copy_object(
+        self,
+        source_bucket_name: str,
+        source_object_name: str,
+        destination_bucket_name: str,
+        destination_object_name: str,
+    ) -> ObjectWriteResult:
+        temporary_file_path = self._get_temporary_file_path()
+        try:
+            self._link_file(
+                self._get_object_path(source_bucket_name, source_object_name),
+                temporary_file_path,
+            )
+            self._commit_object(
+                destination_bucket_name,
+                destination_object_name,
+                temporary_file_path,
+                self._read_metadata(source_bucket_name, source_object_name),
+            )
+        finally:
+            self._remove_if_exists(temporary_file_path)
+
+        return self._get_write_result(destination_bucket_name, destination_object_name)
+
+    def remove_objects(self, bucket_name: str, object_names: Iterable[str]) -> None:
+        for object_name in object_names:
+            self._remove_if_exists(self._get_object_path(bucket_name, object_name))
+            self._remove_if_exists(self._get_metadata_path(bucket_name, object_name))
+
+    def download_folder(
+        self,
+        bucket_name: str,
+        folder_name: str,
+        destination_path: str,
+        on_object_downloaded: Callable[[str], None] | None = None,
+    ) -> TransferStats:
+        """
+        Copies every object under a folder into the destination, skipping up-to-date files.
+        `on_object_downloaded` is called with the name of each object once copied or skipped.
+        """
+        os.makedirs(destination_path, exist_ok=True)
+
+        download_state = DownloadState(destination_path)
+        transfer_stats = TransferStats()
+
+        for obj in tqdm.tqdm(
+            self.list_objects(
+                bucket_name=bucket_name, prefix=folder_name, recursive=True
+            ),
+            unit="objects",
+        ):
+            local_file_path = os.path.join(destination_path, obj.object_name)
+
+            if download_state.is_complete(
+                bucket_name=bucket_name,
+                object_name=obj.object_name,
+                etag=obj.etag,
+                size=obj.size,
+                local_file_path=local_file_path,
+            ):
+                transfer_stats.add_skipped(obj.size)
+            else:
+                os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+                self._remove_if_exists(local_file_path)
+                # A hardlink would let writes to the downloaded file modify the stored object
+                self._clone_file(
+                    self._get_object_path(bucket_name, obj.object_name),
+                    local_file_path,
+                )
+                download_state.mark_complete(
+                    bucket_name=bucket_name,
+                    object_name=obj.object_name,
+                    etag=obj.etag,
+                    size=obj.size,
+                )
+                transfer_stats.add_transferred(obj.size)
+
+            if on_object_downloaded is not None:
+                on_object_downloaded(obj.object_name)
+
+        return transfer_stats.stop()
+
+    def _list_folder(
+        self,
+        bucket_name: str,
+        folder_path: str,
+        object_prefix: str,
+        name_prefix: str,
+        recursive: bool,
+    ) -> Iterator[Object]:
+        try:
+            entries = [
+                entry
+                for entry in os.scandir(folder_path)
+                if entry.name.startswith(name_prefix)
+            ]
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        # Sorting folders as "name/" keeps the listing in the objects' lexicographic order
+        for entry in sorted(
+            entries, key=lambda e: e.name + "/" if e.is_dir() else e.name
+        ):
+            object_name = object_prefix + entry.name
+            if entry.is_dir():
+                if recursive:
+                    yield from self._list_folder(
+                        bucket_name, entry.path, object_name + "/", "", recursive
+                    )
+                else:
+                    yield Object(bucket_name=bucket_name, object_name=object_name + "/")
+            else:
+                yield self._get_object_info(bucket_name, object_name, entry.stat())
+
+    def _get_object_info(
+        self, bucket_name: str, object_name: str, stat_result: os.stat_result
+    ) -> Object:
+        metadata = self._read_metadata(bucket_name, object_name) or {}
+        return Object(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            last_modified=datetime.fromtimestamp(stat_result.st_mtime, tz=timezone.utc),
+            etag=self._get_etag(stat_result),
+            size=stat_result.st_size,
+            metadata={f"x-amz-meta-{key}": value for key, value in metadata.items()},
+        )
+
+    def _get_write_result(
+        self, bucket_name: str, object_name: str
+    ) -> ObjectWriteResult:
+        return ObjectWriteResult(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            version_id=None,
+            etag=self._get_etag(
+                os.stat(self._get_object_path(bucket_name, object_name))
+            ),
+            http_headers={},
+        )
+
+    def _get_not_found_error(self, bucket_name: str, object_name: str) -> S3Error:
+        bucket_exists = self.bucket_exists(bucket_name)
+        return S3Error(
+            code="NoSuchKey" if bucket_exists else "NoSuchBucket",
+            message=(
+                "The specified key does not exist."
+                if bucket_exists
+                else "The specified bucket does not exist"
+            ),
+            resource=f"/{bucket_name}/{object_name}",
+            request_id=None,
+            host_id=None,
+            response=None,
+            bucket_name=bucket_name,
+            object_name=object_name,
+        )
+
+    @staticmethod
+    def _get_etag(stat_result: os.stat_result) -> str:
+        # Not an MD5: computing one would mean reading every object on each listing
+        return f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"
+
+    def _get_bucket_path(self, bucket_name: str) -> str:
+        if not bucket_name or "/" in bucket_name or bucket_name.startswith("."):
+            raise ValueError(f"Invalid bucket name '{bucket_name}'")
+        return os.path.join(self.root_path, bucket_name)
+
+    def _get_object_path(self, bucket_name: str, object_name: str) -> str:
+        bucket_path = self._get_bucket_path(bucket_name)
+        object_path = os.path.normpath(os.path.join(bucket_path, object_name))
+        if os.path.commonpath([bucket_path, object_path]) != bucket_path:
+            raise ValueError(f"Invalid object name '{object_name}'")
+        return object_path
+
+    def _get_metadata_path(self, bucket_name: str, object_name: str) -> str:
+        return os.path.join(
+            self.root_path, METADATA_FOLDER_NAME, bucket_name, object_name + ".json"
+        )
+
+    def _read_metadata(self, bucket_name: str, object_name: str) -> dict | None:
+        try:
+            with open(self._get_metadata_path(bucket_name, object_name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _get_temporary_file_path(self) -> str:
+        # Temporary files live on the buckets' filesystem so that renaming them is atomic
+        temporary_folder_path = os.path.join(self.root_path, TEMPORARY_FOLDER_NAME)
+        os.makedirs(temporary_folder_path, exist_ok=True)
+        file_descriptor, temporary_file_path = tempfile.mkstemp(
+            dir=temporary_folder_path
+        )
+        os.close(file_descriptor)
+        os.remove(temporary_file_path)
+        return temporary_file_path
+
+    def _commit_object(
+        self,
+        bucket_name: str,
+        object_name: str,
+        temporary_file_path: str,
+        metadata: dict | None,
+    ) -> None:
+        if not self.bucket_exists(bucket_name):
+            raise FileNotFoundError(f"The bucket '{bucket_name}' does not exist")
+
+        object_path = self._get_object_path(bucket_name, object_name)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+
+        metadata_path = self._get_metadata_path(bucket_name, object_name)
+        if metadata:
+            os.makedirs(os.path.dirname(metadata_path), exist_ok=True)
+            with open(metadata_path, "w") as f:
+                json.dump(metadata, f, default=str)
+        else:
+            self._remove_if_exists(metadata_path)
+
+        os.replace(temporary_file_path, object_path)
+
+    @staticmethod
+    def _clone_file(source_path: str, destination_path: str) -> None:
+        """
+        Copies a file, sharing its extents through a reflink when the filesystem allows it.
+        """
+        with open(source_path, "rb") as source, open(destination_path, "wb") as dest:
+            if fcntl is not None:
+                try:
+                    fcntl.ioctl(dest.fileno(), FICLONE, source.fileno())
+                    return
+                except OSError:
+                    pass
+            shutil.copyfileobj(source, dest, COPY_CHUNK_SIZE)
+
+    @classmethod
+    def _link_file(cls, source_path: str, destination_path: str) -> None:
+        """
+        Makes a file available at a new path without copying its content when possible:
+        through a reflink, then a hardlink, then a plain copy.
+        """
+        if fcntl is not None:
+            try:
+                with open(source_path, "rb") as source, open(
+                    destination_path, "wb"
+                ) as dest:
+                    fcntl.ioctl(dest.fileno(), FICLONE, source.fileno())
+                return
+            except OSError:
+                cls._remove_if_exists(destination_path)
+
+        try:
+            os.link(source_path, destination_path)
+        except OSError:
+            cls._clone_file(source_path, destination_path)
+
+    @staticmethod
+    def _remove_if_exists(file_path: str) -> None:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
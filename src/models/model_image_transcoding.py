@@ -0,0 +1,160 @@
+import io
+from enum import Enum
+from typing import Optional, Tuple
+
+import PIL.Image
+
+from src.utils.shared_memory_helper import open_buffer
+
+# File extensions of the image formats, by PIL format name, when not the lowercased name
+IMAGE_FORMAT_EXTENSIONS = {"JPEG": "jpg", "TIFF": "tif"}
+
+
+class ImageFormat(str, Enum):
+    # Keep the source's bytes as they are
+    ORIGINAL = "original"
+    PNG = "png"
+    WEBP = "webp"
+    JPEG = "jpeg"
+
+
+def get_image_format_extension(image_format: str) -> str:
+    """
+    Gets the file extension of an image format, e.g. "jpg" for "jpeg".
+
+    Args:
+        image_format (str): The image format's name, as PIL or `ImageFormat` names it.
+
+    Returns:
+        str: The format's file extension.
+    """
+    return IMAGE_FORMAT_EXTENSIONS.get(image_format.upper(), image_format.lower())
+
+
+class ImageTranscodingPolicy:
+    def __init__(
+        self,
+        image_format: ImageFormat = ImageFormat.ORIGINAL,
+        quality: int = 90,
+        max_side: Optional[int] = None,
+    ):
+        """
+        Initialize an ImageTranscodingPolicy, how the images of a data source are stored.
+
+        Images are kept as they are when they already comply with the policy: in the target
+        format, or any format for `ImageFormat.ORIGINAL`, and no larger than `max_side`. The
+        others are decoded, downscaled to fit `max_side` and encoded in the target format, or
+        for `ImageFormat.ORIGINAL` in their source's format. Images decoded by the data
+        source's loader, which have no source bytes, are encoded to PNG for
+        `ImageFormat.ORIGINAL`.
+
+        Args:
+            image_format (ImageFormat): The format the images are stored in.
+            quality (int): Quality of the lossy encodings, from 1 to 100.
+            max_side (Optional[int]): Maximum width and height of the stored images, in
+                pixels, None to keep their size.
+        """
+        self.image_format = ImageFormat(image_format)
+        self.quality = quality
+        self.max_side = max_side or None
+
+    def __str__(self):
+        policy = self.image_format.value
+        if self.image_format in (ImageFormat.WEBP, ImageFormat.JPEG):
+            policy += f", quality {self.quality}"
+        if self.max_side is not None:
+            policy += f", max side {self.max_side}px"
+        return policy
+
+    def to_dict(self) -> dict:
+        return {
+            "image_format": self.image_format.value,
+            "quality": self.quality,
+            "max_side": self.max_side,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "ImageTranscodingPolicy":
+        return ImageTranscodingPolicy(
+            image_format=ImageFormat(data.get("image_format", ImageFormat.ORIGINAL)),
+            quality=data.get("quality", 90),
+            max_side=data.get("max_side"),
+        )
+
+    def transcode(
+        self, image_data: bytes | memoryview
+    ) -> Tuple[bytes | memoryview, Optional[str]]:
+        """
+        Applies the policy to an encoded image, read in place.
+
+        Images that cannot be identified are returned untouched, to be rejected by the
+        dataset's validation. Images that comply are returned as the same object.
+
+        Args:
+            image_data (bytes | memoryview): The source's bytes.
+
+        Returns:
+            Tuple[bytes | memoryview, Optional[str]]: The bytes to store, and their format's
+                PIL name, None if the image could not be identified.
+        """
+        try:
+            with open_buffer(image_data) as image_file, PIL.Image.open(
+                image_file
+            ) as image:
+                source_format = image.format
+                if self._complies(source_format, image.size):
+                    return image_data, source_format
+                return self._encode(image, source_format)
+        except (OSError, ValueError):
+            return image_data, None
+
+    def transcode_image(self, image: PIL.Image.Image) -> Tuple[bytes, str]:
+        """
+        Applies the policy to a decoded image.
+
+        Args:
+            image (PIL.Image.Image): The decoded image.
+
+        Returns:
+            Tuple[bytes, str]: The bytes to store, and their format's PIL name.
+        """
+        return self._encode(image, source_format="PNG")
+
+    def _complies(self, source_format: Optional[str], size: Tuple[int, int]) -> bool:
+        if self.max_side is not None and max(size) > self.max_side:
+            return False
+        return (
+            self.image_format == ImageFormat.ORIGINAL
+            or (source_format or "").upper() == self.image_format.value.upper()
+        )
+
+    def _encode(
+        self, image: PIL.Image.Image, source_format: Optional[str]
+    ) -> Tuple[bytes, str]:
+        target_format = (
+            (source_format or "PNG")
+            if self.image_format == ImageFormat.ORIGINAL
+            else self.image_format.value
+        ).upper()
+        PIL.Image.init()
+        if target_format not in PIL.Image.SAVE:
+            # e.g. formats PIL can only read
+            target_format = "PNG"
+
+        if self.max_side is not None and max(image.size) > self.max_side:
+            image = image.copy()
+            image.thumbnail(
+                (self.max_side, self.max_side), PIL.Image.Resampling.LANCZOS
+            )
+
+        if target_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif target_format == "WEBP" and image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        image_buffer = io.BytesIO()
+        if target_format in ("JPEG", "WEBP"):
+            image.save(image_buffer, format=target_format, quality=self.quality)
+        else:
+            image.save(image_buffer, format=target_format)
+        return image_buffer.getvalue(), target_format
@@ -0,0 +1,96 @@
+import json
+from typing import Dict, List, Optional
+
+SHARD_INDEX_FILE_NAME = "index.json"
+
+
+class ShardInfo:
+    def __init__(
+        self,
+        object_name: str,
+        size: int,
+        number_of_samples: int,
+        sha256: Optional[str] = None,
+    ):
+        """
+        Initialize a ShardInfo, describing a tar shard of a dataset's split.
+
+        Args:
+            object_name (str): The shard's object name in the bucket.
+            size (int): Size of the shard, in bytes.
+            number_of_samples (int): Number of samples packed into the shard.
+            sha256 (Optional[str]): SHA-256 of the shard's content.
+        """
+        self.object_name = object_name
+        self.size = size
+        self.number_of_samples = number_of_samples
+        self.sha256 = sha256
+
+    def to_dict(self) -> dict:
+        return {
+            "object_name": self.object_name,
+            "size": self.size,
+            "number_of_samples": self.number_of_samples,
+            "sha256": self.sha256,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "ShardInfo":
+        return ShardInfo(
+            object_name=data["object_name"],
+            size=data["size"],
+            number_of_samples=data["number_of_samples"],
+            sha256=data.get("sha256"),
+        )
+
+
+class ShardIndex:
+    def __init__(
+        self, shard_size: int, splits: Optional[Dict[str, List[ShardInfo]]] = None
+    ):
+        """
+        Initialize a ShardIndex, the list of the tar shards a dataset's splits are packed into.
+
+        Args:
+            shard_size (int): Size from which a shard is closed and the next one started.
+            splits (Optional[Dict[str, List[ShardInfo]]]): The shards of each split, in order.
+        """
+        self.shard_size = shard_size
+        self.splits = splits or {}
+
+    def add_shard(self, split_name: str, shard_info: ShardInfo) -> None:
+        self.splits.setdefault(split_name, []).append(shard_info)
+
+    def get_number_of_samples(self, split_name: Optional[str] = None) -> int:
+        """
+        Counts the samples of a split, or of every split if none is given.
+        """
+        split_names = [split_name] if split_name is not None else self.splits.keys()
+        return sum(
+            shard_info.number_of_samples
+            for name in split_names
+            for shard_info in self.splits.get(name, [])
+        )
+
+    def to_bytes(self) -> bytes:
+        return json.dumps(
+            {
+                "shard_size": self.shard_size,
+                "splits": {
+                    split_name: [shard_info.to_dict() for shard_info in shards]
+                    for split_name, shards in self.splits.items()
+                },
+            },
+            indent=2,
+        ).encode()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "ShardIndex":
+        serialized_index = json.loads(data.decode("utf-8"))
+        return ShardIndex(
+            shard_size=serialized_index["shard_size"],
+            splits={
+                split_name: [ShardInfo.from_dict(shard_info) for shard_info in shards]
+                for split_name, shards in serialized_index["splits"].items()
+            },
+        )
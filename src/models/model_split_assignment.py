@@ -0,0 +1,66 @@
+import csv
+import io
+from typing import Iterable, Optional, Tuple
+
+SPLIT_ASSIGNMENTS_FILE_NAME = "split_assignments.csv"
+
+
+class SplitAssignmentTable:
+    def __init__(self):
+        """
+        Initialize a SplitAssignmentTable, the split of each sample of a stratified dataset,
+        with the stratum, i.e. the label, it was assigned in.
+
+        The table is stored as a CSV object alongside the dataset's objects, one row per sample
+        sorted by sample key, so that the splits' class balance can be audited without reading
+        the annotations.
+        """
+        self._assignments: dict[str, Tuple[int, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._assignments)
+
+    def get_split_name(self, sample_key: str) -> Optional[str]:
+        assignment = self._assignments.get(sample_key)
+        return assignment[1] if assignment is not None else None
+
+    def add_assignments(
+        self,
+        sample_keys: Iterable[str],
+        strata: Iterable[int],
+        split_names: Iterable[str],
+    ) -> None:
+        """
+        Adds or replaces the assignments of samples.
+
+        Args:
+            sample_keys (Iterable[str]): The samples' keys, e.g. their images' paths.
+            strata (Iterable[int]): The stratum of each sample.
+            split_names (Iterable[str]): The split each sample was assigned to.
+        """
+        self._assignments.update(zip(sample_keys, zip(strata, split_names)))
+
+    def to_bytes(self) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(("sample_key", "stratum", "split_name"))
+        writer.writerows(
+            (sample_key, *self._assignments[sample_key])
+            for sample_key in sorted(self._assignments)
+        )
+        return buffer.getvalue().encode()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "SplitAssignmentTable":
+        split_assignment_table = SplitAssignmentTable()
+        rows = list(csv.DictReader(io.StringIO(data.decode("utf-8"))))
+        split_assignment_table.add_assignments(
+            sample_keys=(row["sample_key"] for row in rows),
+            strata=(int(row["stratum"]) for row in rows),
+            split_names=(row["split_name"] for row in rows),
+        )
+        return split_assignment_table
+
+    @staticmethod
+    def get_split_assignments_object_name(dataset_uuid: str) -> str:
+        return f"{dataset_uuid}/{SPLIT_ASSIGNMENTS_FILE_NAME}"
@@ -0,0 +1,116 @@
+import json
+from typing import Iterator, List, Optional
+
+from src.models.model_bucket_client import BucketClient
+
+SYNC_STATE_FILE_NAME = "sync_state.jsonl"
+
+
+class FileState:
+    def __init__(self, object_name: str, size: int, mtime_ns: int, sha256: str):
+        """
+        Initialize a FileState, the state of a local file when it was last synced.
+
+        Args:
+            object_name (str): Name of the file's object in the bucket.
+            size (int): Size of the file, in bytes.
+            mtime_ns (int): Modification time of the file, in nanoseconds.
+            sha256 (str): SHA-256 of the file's content.
+        """
+        self.object_name = object_name
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.sha256 = sha256
+
+    def to_dict(self) -> dict:
+        return {
+            "object_name": self.object_name,
+            "size": self.size,
+            "mtime_ns": self.mtime_ns,
+            "sha256": self.sha256,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "FileState":
+        return FileState(
+            object_name=data["object_name"],
+            size=data["size"],
+            mtime_ns=data["mtime_ns"],
+            sha256=data["sha256"],
+        )
+
+
+class SyncState:
+    def __init__(
+        self, data_source_name: str, file_states: Optional[List[FileState]] = None
+    ):
+        """
+        Initialize a SyncState, the size, modification time and content hash of a local data
+        source's files as of its last upload.
+
+        Like the manifest, the state is stored as a JSON lines object next to the data source's
+        objects. A file whose size and modification time did not change since is not read
+        again on the next upload.
+
+        Args:
+            data_source_name (str): Name of the data source the state describes.
+            file_states (Optional[List[FileState]]): The states of the data source's files.
+        """
+        self.data_source_name = data_source_name
+        self.file_states = file_states or []
+
+    def __len__(self) -> int:
+        return len(self.file_states)
+
+    def __iter__(self) -> Iterator[FileState]:
+        return iter(self.file_states)
+
+    def get_object_name(self) -> str:
+        return SyncState.get_sync_state_object_name(self.data_source_name)
+
+    def to_bytes(self) -> bytes:
+        return "".join(
+            json.dumps(file_state.to_dict()) + "\n"
+            for file_state in sorted(self.file_states, key=lambda f: f.object_name)
+        ).encode()
+
+    @staticmethod
+    def from_bytes(data_source_name: str, data: bytes) -> "SyncState":
+        return SyncState(
+            data_source_name=data_source_name,
+            file_states=[
+                FileState.from_dict(json.loads(line))
+                for line in data.decode("utf-8").splitlines()
+                if line.strip()
+            ],
+        )
+
+    @staticmethod
+    def get_sync_state_object_name(data_source_name: str) -> str:
+        return f"{data_source_name}/{SYNC_STATE_FILE_NAME}"
+
+    @staticmethod
+    def download(
+        bucket_client: BucketClient, bucket_name: str, data_source_name: str
+    ) -> Optional["SyncState"]:
+        """
+        Downloads the sync state of a data source.
+
+        Args:
+            bucket_client (BucketClient): The bucket client to download the state with.
+            bucket_name (str): Name of the bucket holding the data source.
+            data_source_name (str): Name of the data source.
+
+        Returns:
+            Optional[SyncState]: The data source's sync state, or None if it has none.
+        """
+        sync_state_data = bucket_client.get_object_data_or_none(
+            bucket_name=bucket_name,
+            object_name=SyncState.get_sync_state_object_name(data_source_name),
+        )
+        if sync_state_data is None:
+            return None
+
+        return SyncState.from_bytes(
+            data_source_name=data_source_name, data=sync_state_data
+        )
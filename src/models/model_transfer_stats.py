@@ -0,0 +1,100 @@
+import threading
+import time
+
+
+class TransferStats:
+    def __init__(self):
+        """
+        Initialize the TransferStats object, aggregating the throughput of a bulk transfer.
+        """
+        self.transferred_objects = 0
+        self.transferred_bytes = 0
+        self.skipped_objects = 0
+        self.skipped_bytes = 0
+        self.deleted_objects = 0
+        self.start_time = time.monotonic()
+        self.end_time: float | None = None
+        self._lock = threading.Lock()
+
+    def add_transferred(self, number_of_bytes: int) -> None:
+        """
+        Records an object transferred over the network.
+
+        Args:
+            number_of_bytes (int): Number of bytes transferred for the object.
+        """
+        with self._lock:
+            self.transferred_objects += 1
+            self.transferred_bytes += number_of_bytes
+
+    def add_skipped(self, number_of_bytes: int) -> None:
+        """
+        Records an object skipped because it was already up to date.
+
+        Args:
+            number_of_bytes (int): Size of the skipped object.
+        """
+        with self._lock:
+            self.skipped_objects += 1
+            self.skipped_bytes += number_of_bytes
+
+    def add_deleted(self, number_of_objects: int = 1) -> None:
+        """
+        Records objects deleted because their source no longer exists.
+
+        Args:
+            number_of_objects (int): Number of deleted objects.
+        """
+        with self._lock:
+            self.deleted_objects += number_of_objects
+
+    def stop(self) -> "TransferStats":
+        """
+        Freezes the elapsed time of the transfer.
+        """
+        self.end_time = time.monotonic()
+        return self
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.transferred_bytes / max(self.elapsed_seconds, 1e-9)
+
+    @property
+    def objects_per_second(self) -> float:
+        return self.transferred_objects / max(self.elapsed_seconds, 1e-9)
+
+    def to_dict(self) -> dict:
+        """
+        Convert the transfer statistics to a dictionary.
+
+        Returns:
+            dict: Dictionary representation of the transfer statistics.
+        """
+        return {
+            "transferred_objects": self.transferred_objects,
+            "transferred_bytes": self.transferred_bytes,
+            "skipped_objects": self.skipped_objects,
+            "skipped_bytes": self.skipped_bytes,
+            "deleted_objects": self.deleted_objects,
+            "elapsed_seconds": self.elapsed_seconds,
+            "bytes_per_second": self.bytes_per_second,
+            "objects_per_second": self.objects_per_second,
+        }
+
+    def __str__(self):
+        """
+        String representation of the TransferStats object.
+        """
+        deleted = (
+            f", {self.deleted_objects} objects deleted" if self.deleted_objects else ""
+        )
+        return (
+            f"{self.transferred_objects} objects ({self.transferred_bytes} bytes) transferred"
+            f" and {self.skipped_objects} objects ({self.skipped_bytes} bytes) skipped"
+            f"{deleted} in {self.elapsed_seconds:.1f}s: {self.bytes_per_second / 1e6:.2f} MB/s,"
+            f" {self.objects_per_second:.1f} objects/s"
+        )
@@ -0,0 +1,201 @@
+import threading
+from typing import Callable, Optional
+
+from src.models.model_transfer_stats import TransferStats
+
+
+class StoredObject:
+    def __init__(
+        self,
+        size: int,
+        etag: Optional[str],
+        sha256: Optional[str] = None,
+        mtime_ns: Optional[int] = None,
+        version_id: Optional[str] = None,
+    ):
+        """
+        Initialize a StoredObject, the known state of an object already in the bucket.
+
+        Args:
+            size (int): Size of the object, in bytes.
+            etag (Optional[str]): ETag of the object, as listed by the bucket.
+            sha256 (Optional[str]): SHA-256 of the object's content, when known from a manifest.
+            mtime_ns (Optional[int]): Modification time of the local file the object was
+                uploaded from, when known from a sync state.
+            version_id (Optional[str]): Version of the object, when known from its upload or a
+                manifest.
+        """
+        self.size = size
+        self.etag = etag
+        self.sha256 = sha256
+        self.mtime_ns = mtime_ns
+        self.version_id = version_id
+
+
+class UploadIndex:
+    def __init__(self):
+        """
+        Initialize the UploadIndex, an in-memory index of the content already stored under a
+        data source's prefix, used to skip the uploads of identical content.
+
+        The index is filled once from a listing of the bucket, completed with the content
+        hashes of the data source's manifest, and kept up to date with the objects uploaded
+        afterwards. Skipped and uploaded objects are accounted for in `stats`.
+        """
+        self.stats = TransferStats()
+        self._objects: dict[str, StoredObject] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def get_object_names(self) -> list[str]:
+        with self._lock:
+            return list(self._objects)
+
+    def add_object(
+        self,
+        object_name: str,
+        size: int,
+        etag: Optional[str] = None,
+        sha256: Optional[str] = None,
+    ) -> None:
+        """
+        Records an object as stored in the bucket.
+        """
+        with self._lock:
+            self._objects[object_name] = StoredObject(
+                size=size, etag=etag, sha256=sha256
+            )
+
+    def set_sha256(
+        self,
+        object_name: str,
+        size: int,
+        sha256: str,
+        version_id: Optional[str] = None,
+    ) -> None:
+        """
+        Attaches the content hash and version of a stored object, if the object's size still
+        matches.
+        """
+        with self._lock:
+            stored_object = self._objects.get(object_name)
+            if stored_object is not None and stored_object.size == size:
+                stored_object.sha256 = sha256
+                stored_object.version_id = version_id
+
+    def set_file_state(
+        self, object_name: str, size: int, mtime_ns: int, sha256: str
+    ) -> None:
+        """
+        Attaches the state of the local file a stored object was uploaded from, if the
+        object's size still matches.
+        """
+        with self._lock:
+            stored_object = self._objects.get(object_name)
+            if stored_object is not None and stored_object.size == size:
+                stored_object.sha256 = sha256
+                stored_object.mtime_ns = mtime_ns
+
+    def get_unchanged_sha256(
+        self, object_name: str, size: int, mtime_ns: int
+    ) -> Optional[str]:
+        """
+        Gets the content hash of a stored object uploaded from a local file of the same size
+        and modification time, i.e. a file most likely unchanged since, without reading it.
+
+        Returns:
+            Optional[str]: The stored content's SHA-256, None if the file may have changed.
+        """
+        stored_object = self._objects.get(object_name)
+        if (
+            stored_object is None
+            or stored_object.size != size
+            or stored_object.mtime_ns != mtime_ns
+        ):
+            return None
+        return stored_object.sha256
+
+    def get_version_id(self, object_name: str) -> Optional[str]:
+        """
+        Gets the version of a stored object, None if it is unknown or the bucket is not versioned.
+        """
+        stored_object = self._objects.get(object_name)
+        return stored_object.version_id if stored_object is not None else None
+
+    def has_object(self, object_name: str, size: int) -> bool:
+        """
+        Checks if an object of the given size is stored, without comparing its content.
+        """
+        stored_object = self._objects.get(object_name)
+        return stored_object is not None and stored_object.size == size
+
+    def is_stored(
+        self,
+        object_name: str,
+        size: int,
+        sha256: str,
+        md5: Optional[Callable[[], str]] = None,
+    ) -> bool:
+        """
+        Checks if an object is already stored with the given content.
+
+        The content is identified by its SHA-256 when the index knows the stored one. Otherwise,
+        it is compared with the stored object's ETag when that ETag is the MD5 of the content,
+        i.e. when the object was not uploaded in multiple parts.
+
+        Args:
+            object_name (str): Name of the object to upload.
+            size (int): Size of the content to upload.
+            sha256 (str): SHA-256 of the content to upload.
+            md5 (Optional[Callable[[], str]]): Computes the MD5 of the content, only if needed.
+
+        Returns:
+            bool: True if the upload can be skipped, False otherwise.
+        """
+        stored_object = self._objects.get(object_name)
+        if stored_object is None or stored_object.size != size:
+            return False
+
+        if stored_object.sha256 is not None:
+            return stored_object.sha256 == sha256
+
+        etag = stored_object.etag or ""
+        return md5 is not None and etag != "" and "-" not in etag and md5() == etag
+
+    def record_uploaded(
+        self,
+        object_name: str,
+        size: int,
+        sha256: str,
+        mtime_ns: Optional[int] = None,
+        version_id: Optional[str] = None,
+    ) -> None:
+        """
+        Records an uploaded object, so that identical content uploaded later is skipped.
+        """
+        with self._lock:
+            self._objects[object_name] = StoredObject(
+                size=size,
+                etag=None,
+                sha256=sha256,
+                mtime_ns=mtime_ns,
+                version_id=version_id,
+            )
+        self.stats.add_transferred(size)
+
+    def record_skipped(self, size: int) -> None:
+        """
+        Records an upload skipped because its content was already stored.
+        """
+        self.stats.add_skipped(size)
+
+    def record_deleted(self, object_names: list[str]) -> None:
+        """
+        Records removed objects.
+        """
+        with self._lock:
+            for object_name in object_names:
+                self._objects.pop(object_name, None)
+        self.stats.add_deleted(len(object_names))
@@ -0,0 +1,236 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data_source_name TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    completed_items INTEGER NOT NULL DEFAULT 0,
+    completed_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS completed_items (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    item_key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT,
+    mtime_ns INTEGER,
+    manifest_entry TEXT,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, item_key)
+);
+"""
+
+
+class CompletedItem:
+    def __init__(
+        self,
+        item_key: str,
+        size: int,
+        sha256: Optional[str] = None,
+        mtime_ns: Optional[int] = None,
+        manifest_entry: Optional[dict] = None,
+    ):
+        """
+        Initialize a CompletedItem, a unit of upload work recorded as done in the journal.
+
+        Args:
+            item_key (str): Identifies the item within its data source: the object name of a
+                local file, or the split and index of a HuggingFace row.
+            size (int): Number of bytes the item accounts for.
+            sha256 (Optional[str]): SHA-256 of the item's content.
+            mtime_ns (Optional[int]): Modification time of a local file, in nanoseconds.
+            manifest_entry (Optional[dict]): The manifest entry of a HuggingFace row.
+        """
+        self.item_key = item_key
+        self.size = size
+        self.sha256 = sha256
+        self.mtime_ns = mtime_ns
+        self.manifest_entry = manifest_entry
+
+
+class UploadRun:
+    def __init__(
+        self,
+        run_id: int,
+        data_source_name: str,
+        started_at: str,
+        finished_at: Optional[str],
+        completed_items: int,
+        completed_bytes: int,
+    ):
+        """
+        Initialize an UploadRun, the progress of an upload of a data source.
+        """
+        self.run_id = run_id
+        self.data_source_name = data_source_name
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.completed_items = completed_items
+        self.completed_bytes = completed_bytes
+
+    @property
+    def is_finished(self) -> bool:
+        return self.finished_at is not None
+
+    def to_dict(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "data_source_name": self.data_source_name,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "completed_items": self.completed_items,
+            "completed_bytes": self.completed_bytes,
+        }
+
+    def __str__(self):
+        status = (
+            f"finished at {self.finished_at}" if self.is_finished else "in progress"
+        )
+        return (
+            f"Run {self.run_id} of {self.data_source_name}, started at {self.started_at},"
+            f" {status}: {self.completed_items} items ({self.completed_bytes} bytes)"
+            " completed"
+        )
+
+
+class UploadJournal:
+    def __init__(self, database_path: str):
+        """
+        Initialize an UploadJournal, a local SQLite database of the upload runs of the data
+        sources and of the items each run completed.
+
+        An upload that stops before the end, e.g. when its pod is evicted, leaves its run
+        unfinished. The next upload of the same data source resumes that run and skips the
+        items it already completed, without reading, hashing or uploading them again. The
+        journal is written in WAL mode, so that each recorded item survives a crash of the
+        process. Safe to use from several threads.
+
+        Args:
+            database_path (str): Path of the SQLite database, created if it does not exist.
+        """
+        self.database_path = database_path
+        database_folder_path = os.path.dirname(os.path.abspath(database_path))
+        os.makedirs(database_folder_path, exist_ok=True)
+
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(JOURNAL_SCHEMA)
+        self._lock = threading.Lock()
+
+    def start_run(self, data_source_name: str) -> UploadRun:
+        """
+        Resumes the unfinished run of a data source, or else starts a new one.
+
+        Args:
+            data_source_name (str): Name of the data source to upload.
+
+        Returns:
+            UploadRun: The run, with the progress it already made.
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT run_id FROM runs WHERE data_source_name = ? AND finished_at IS NULL"
+                " ORDER BY run_id DESC LIMIT 1",
+                (data_source_name,),
+            ).fetchone()
+            if row is None:
+                self._connection.execute(
+                    "INSERT INTO runs (data_source_name, started_at) VALUES (?, ?)",
+                    (data_source_name, datetime.now().isoformat()),
+                )
+
+        return self.get_runs(data_source_name)[0]
+
+    def get_completed_items(self, run_id: int) -> Iterator[CompletedItem]:
+        """
+        Iterates over the items a run completed.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT item_key, size, sha256, mtime_ns, manifest_entry"
+                " FROM completed_items WHERE run_id = ?",
+                (run_id,),
+            ).fetchall()
+
+        for item_key, size, sha256, mtime_ns, manifest_entry in rows:
+            yield CompletedItem(
+                item_key=item_key,
+                size=size,
+                sha256=sha256,
+                mtime_ns=mtime_ns,
+                manifest_entry=json.loads(manifest_entry) if manifest_entry else None,
+            )
+
+    def record_completed(self, run_id: int, completed_item: CompletedItem) -> None:
+        """
+        Records an item as completed by a run.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO completed_items (run_id, item_key, size, sha256,"
+                " mtime_ns, manifest_entry, completed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    completed_item.item_key,
+                    completed_item.size,
+                    completed_item.sha256,
+                    completed_item.mtime_ns,
+                    json.dumps(completed_item.manifest_entry)
+                    if completed_item.manifest_entry is not None
+                    else None,
+                    datetime.now().isoformat(),
+                ),
+            )
+
+    def finish_run(self, run_id: int) -> None:
+        """
+        Marks a run as finished, keeping its totals but dropping its completed items, which
+        the data source's sync state and manifest now describe.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE runs SET finished_at = ?,"
+                " completed_items = (SELECT COUNT(*) FROM completed_items WHERE run_id = ?),"
+                " completed_bytes = (SELECT COALESCE(SUM(size), 0) FROM completed_items"
+                " WHERE run_id = ?) WHERE run_id = ?",
+                (datetime.now().isoformat(), run_id, run_id, run_id),
+            )
+            self._connection.execute(
+                "DELETE FROM completed_items WHERE run_id = ?", (run_id,)
+            )
+
+    def get_runs(self, data_source_name: Optional[str] = None) -> List[UploadRun]:
+        """
+        Gets the runs of a data source, or of every data source, most recent first, with the
+        progress of the unfinished ones counted from their completed items.
+
+        Args:
+            data_source_name (Optional[str]): Name of the data source, None for all of them.
+
+        Returns:
+            List[UploadRun]: The runs.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT runs.run_id, data_source_name, started_at, finished_at,"
+                " completed_items + COUNT(completed_items.item_key),"
+                " completed_bytes + COALESCE(SUM(completed_items.size), 0)"
+                " FROM runs LEFT JOIN completed_items"
+                " ON completed_items.run_id = runs.run_id"
+                " WHERE ? IS NULL OR data_source_name = ?"
+                " GROUP BY runs.run_id ORDER BY runs.run_id DESC",
+                (data_source_name, data_source_name),
+            ).fetchall()
+
+        return [UploadRun(*row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
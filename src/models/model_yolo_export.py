@@ -0,0 +1,173 @@
+import gzip
+import json
+import os
+import threading
+from typing import List, Optional, Tuple
+
+from src.models.model_dataset import Dataset, DatasetFormat
+from src.utils.shard_helper import iter_shard_samples
+from src.utils.yolo_helper import format_yolo_labels
+
+YOLO_DATA_FILE_NAME = "data.yaml"
+YOLO_LABELS_FOLDER_NAME = "labels"
+# YOLO's name of the validation split
+YOLO_SPLIT_KEYS = {"train": "train", "validation": "val", "test": "test"}
+
+
+class YoloLabelWriter:
+    def __init__(
+        self, dataset: Dataset, destination_root_path: str, batch_size: int = 4096
+    ):
+        """
+        Initialize a YoloLabelWriter, converting the annotations of a dataset into YOLO label
+        files as the dataset is downloaded.
+
+        The writer is given each downloaded object's name: annotation files, batches of
+        annotations and tar shards are read as soon as they land, and their annotations are
+        converted `batch_size` at a time. Each split's labels are written in a `labels` folder
+        next to its images, one file per image with the image's name, where YOLO looks for them.
+
+        Args:
+            dataset (Dataset): The dataset being downloaded.
+            destination_root_path (str): The folder the dataset is downloaded into.
+            batch_size (int): Number of annotations converted at once.
+        """
+        self.dataset = dataset
+        self.destination_root_path = destination_root_path
+        self.batch_size = max(1, batch_size)
+
+        self.number_of_label_files = 0
+        self.number_of_classes = 0
+        self._buffered_annotations: List[Tuple[str, dict]] = []
+        self._lock = threading.Lock()
+
+    def add_downloaded_object(self, object_name: str) -> None:
+        """
+        Reads the annotations of a downloaded object, if it holds any. Safe to call from
+        several threads.
+        """
+        split_name = self._get_split_name(object_name)
+        if split_name is None:
+            return
+
+        file_path = os.path.join(self.destination_root_path, object_name)
+        if object_name.endswith(".tar"):
+            annotations = [
+                json.loads(members["json"])
+                for _, members in iter_shard_samples(file_path)
+                if "json" in members
+            ]
+        elif object_name.endswith((".jsonl", ".jsonl.gz")):
+            with open(file_path, "rb") as f:
+                batch_data = f.read()
+            if object_name.endswith(".gz"):
+                # The compressed records are gzip members, which decompress as a whole
+                batch_data = gzip.decompress(batch_data)
+            annotations = [
+                json.loads(line) for line in batch_data.splitlines() if line.strip()
+            ]
+        elif object_name.endswith(".json"):
+            with open(file_path, "rb") as f:
+                annotations = [json.load(f)]
+        else:
+            return
+
+        with self._lock:
+            self._buffered_annotations.extend(
+                (split_name, annotation) for annotation in annotations
+            )
+            if len(self._buffered_annotations) < self.batch_size:
+                return
+            buffered_annotations = self._buffered_annotations
+            self._buffered_annotations = []
+
+        self._write_label_files(buffered_annotations)
+
+    def close(self) -> str:
+        """
+        Converts the annotations left and writes the dataset's `data.yaml`, describing its
+        splits and classes to YOLO.
+
+        Returns:
+            str: The path of the `data.yaml` file.
+        """
+        with self._lock:
+            buffered_annotations = self._buffered_annotations
+            self._buffered_annotations = []
+        self._write_label_files(buffered_annotations)
+
+        dataset_folder_path = os.path.abspath(
+            os.path.join(self.destination_root_path, self.dataset.uuid)
+        )
+        # JSON strings are valid YAML scalars
+        lines = [f"path: {json.dumps(dataset_folder_path)}"]
+        lines.extend(
+            f"{YOLO_SPLIT_KEYS.get(split_name, split_name)}:"
+            f" {json.dumps(f'{split_name}/{self.dataset.images_path}')}"
+            for split_name in self.dataset.split_names
+        )
+        lines.append("names:")
+        lines.extend(
+            f"  {label}: {json.dumps(str(label))}"
+            for label in range(self.number_of_classes)
+        )
+
+        data_file_path = os.path.join(dataset_folder_path, YOLO_DATA_FILE_NAME)
+        os.makedirs(dataset_folder_path, exist_ok=True)
+        with open(data_file_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+        return data_file_path
+
+    def _get_split_name(self, object_name: str) -> Optional[str]:
+        """
+        Gets the split of an object of the dataset holding annotations, None for the others.
+        """
+        parts = object_name.split("/")
+        if self.dataset.dataset_format == DatasetFormat.SHARDS:
+            # {uuid}/{shards_path}/{split_name}/{split_name}-{number}.tar
+            if (
+                len(parts) == 4
+                and parts[0] == self.dataset.uuid
+                and parts[1] == self.dataset.shards_path
+            ):
+                return parts[2]
+            return None
+
+        # {uuid}/{split_name}/{annotations_path}/{annotation_file_name}
+        if (
+            len(parts) == 4
+            and parts[0] == self.dataset.uuid
+            and parts[2] == self.dataset.annotations_path
+        ):
+            return parts[1]
+        return None
+
+    def _write_label_files(self, annotations: List[Tuple[str, dict]]) -> None:
+        if not annotations:
+            return
+
+        label_files = format_yolo_labels(
+            labels=[annotation["label"] for _, annotation in annotations],
+            bboxes=[annotation["bbox"] for _, annotation in annotations],
+        )
+        for (split_name, annotation), label_file in zip(annotations, label_files):
+            labels_folder_path = os.path.join(
+                self.destination_root_path,
+                self.dataset.uuid,
+                split_name,
+                YOLO_LABELS_FOLDER_NAME,
+            )
+            os.makedirs(labels_folder_path, exist_ok=True)
+            image_file_name = annotation["image_path"].split("/")[-1]
+            image_name = image_file_name.rpartition(".")[0] or image_file_name
+            with open(os.path.join(labels_folder_path, f"{image_name}.txt"), "w") as f:
+                f.write(label_file)
+
+        number_of_classes = max(
+            (max(annotation["label"], default=-1) + 1 for _, annotation in annotations),
+            default=0,
+        )
+        with self._lock:
+            self.number_of_label_files += len(annotations)
+            self.number_of_classes = max(self.number_of_classes, number_of_classes)
@@ -2,10 +2,10 @@ from zenml import pipeline
 
 from src.steps.data.data_sources_uploaders import data_sources_uploader
 from src.steps.data.datalake_initializers import (
-    datalake_initializer,
-    minio_client_initializer,
     bucket_name_list_initializer,
     data_source_list_initializer,
+    datalake_initializer,
+    minio_client_initializer,
 )
 
 
@@ -1,162 +1,1184 @@
+import asyncio
 import hashlib
 import io
 import json
+import multiprocessing
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import AsyncIterator, Awaitable, Callable, Iterator
 
 import PIL.Image
 import tqdm
-from datasets import load_dataset
+from datasets import (
+    DatasetDict,
+    Image,
+    IterableDataset,
+    IterableDatasetDict,
+    load_dataset,
+)
+from datasets.download.streaming_download_manager import xopen
 
+from src.models.model_annotation_batch import (
+    AnnotationBatchIndex,
+    AnnotationBatchWriter,
+    AnnotationLayout,
+)
+from src.models.model_async_bucket_client import AsyncBucketClient
 from src.models.model_bucket_client import BucketClient
 from src.models.model_data_source import (
-    LocalDataSource,
-    HuggingFaceDataSource,
     DataSource,
+    HuggingFaceDataSource,
+    LocalDataSource,
+)
+from src.models.model_data_source_manifest import DataSourceManifest, ManifestEntry
+from src.models.model_image_transcoding import (
+    ImageTranscodingPolicy,
+    get_image_format_extension,
+)
+from src.models.model_sync_state import FileState, SyncState
+from src.models.model_transfer_stats import TransferStats
+from src.models.model_upload_index import UploadIndex
+from src.models.model_upload_journal import CompletedItem, UploadJournal
+from src.utils.concurrency_helper import iter_completed
+from src.utils.file_helper import scan_files
+from src.utils.shared_memory_helper import (
+    SharedBuffer,
+    open_buffer,
+    release_unread_result,
 )
 
 
 class DataUploaderService:
-    def __init__(self, bucket_client: BucketClient):
+    def __init__(
+        self,
+        bucket_client: BucketClient,
+        async_bucket_client: AsyncBucketClient | None = None,
+        max_in_flight: int = 256,
+        encode_workers: int = 0,
+        scan_workers: int = 16,
+        delete_removed: bool = False,
+        verify_checksums: bool = False,
+        upload_journal: UploadJournal | None = None,
+        annotation_layout: AnnotationLayout = AnnotationLayout.OBJECTS,
+        annotation_batch_size: int = 4 * 1024 * 1024,
+        compress_annotations: bool = False,
+    ):
+        """
+        Uploads data sources to a bucket.
+
+        Args:
+            bucket_client (BucketClient): The bucket client used for bucket operations.
+            async_bucket_client (AsyncBucketClient | None): When set, HuggingFace data sources
+                are uploaded from a single event loop instead of a thread pool.
+            max_in_flight (int): Maximum number of HuggingFace rows read ahead of the uploads.
+            encode_workers (int): Number of processes encoding and hashing HuggingFace images,
+                0 to do it in the uploading threads.
+            scan_workers (int): Number of threads listing the folders of local data sources.
+            delete_removed (bool): Whether the objects of a local data source's files that no
+                longer exist are removed from the bucket.
+            verify_checksums (bool): Whether the local files are hashed even when their size
+                and modification time did not change since their last upload.
+            upload_journal (UploadJournal | None): When set, the completed items of each upload
+                are journaled, and an interrupted upload resumes where it stopped.
+            annotation_layout (AnnotationLayout): Whether each annotation is uploaded as its own
+                object, or the annotations are packed into batches with an offset index.
+            annotation_batch_size (int): Size from which an annotation batch is closed.
+            compress_annotations (bool): Whether the annotation batches are gzip-compressed.
+        """
         self.bucket_client = bucket_client
+        self.async_bucket_client = async_bucket_client
+        self.max_in_flight = max_in_flight
+        self.encode_workers = encode_workers
+        self.scan_workers = scan_workers
+        self.delete_removed = delete_removed
+        self.verify_checksums = verify_checksums
+        self.upload_journal = upload_journal
+        self.annotation_layout = AnnotationLayout(annotation_layout)
+        self.annotation_batch_size = annotation_batch_size
+        self.compress_annotations = compress_annotations
 
-    def upload_data(self, bucket_name: str, data_source: DataSource) -> None:
+    def upload_data(self, bucket_name: str, data_source: DataSource) -> TransferStats:
         """
         Uploads data from the given dataset to a specified bucket using the bucket client.
         The upload method varies depending on the dataset type.
 
+        Objects are content-addressed, so the uploads of content already stored under the data
+        source's prefix, e.g. when the pipeline is run again, are skipped. With an upload
+        journal, the items completed by an interrupted upload are not even read again.
+
         Args:
             bucket_name (str): Name of the bucket where the dataset will be uploaded.
             data_source (DataSource): Dataset object to be uploaded.
+
+        Returns:
+            TransferStats: The number and size of the uploaded and skipped objects.
         """
-        if isinstance(data_source, LocalDataSource):
-            self._upload_imported_data_source(bucket_name, data_source)
-        elif isinstance(data_source, HuggingFaceDataSource):
-            self._upload_huggingface_data_source(bucket_name, data_source)
-        else:
+        if not isinstance(data_source, (LocalDataSource, HuggingFaceDataSource)):
             raise TypeError(
                 f"Unsupported data source's type: {type(data_source).__name__}"
             )
 
+        manifest = DataSourceManifest.download(
+            bucket_client=self.bucket_client,
+            bucket_name=bucket_name,
+            data_source_name=data_source.name,
+        )
+        upload_index = self._build_upload_index(bucket_name, data_source, manifest)
+        upload_run_id = (
+            self.upload_journal.start_run(data_source.name).run_id
+            if self.upload_journal is not None
+            else None
+        )
+
+        if isinstance(data_source, LocalDataSource):
+            self._upload_imported_data_source(
+                bucket_name, data_source, upload_index, manifest, upload_run_id
+            )
+        elif self.async_bucket_client is not None:
+            asyncio.run(
+                self._upload_huggingface_data_source_async(
+                    bucket_name, data_source, upload_index, upload_run_id
+                )
+            )
+        else:
+            self._upload_huggingface_data_source(
+                bucket_name, data_source, upload_index, upload_run_id
+            )
+
+        if upload_run_id is not None:
+            assert self.upload_journal is not None
+            self.upload_journal.finish_run(upload_run_id)
+
+        return upload_index.stats.stop()
+
+    def _build_upload_index(
+        self,
+        bucket_name: str,
+        data_source: DataSource,
+        manifest: DataSourceManifest | None = None,
+    ) -> UploadIndex:
+        """
+        Indexes the objects already stored under a data source's prefix, with the content
+        hashes recorded in its manifest and, for local data sources, the files' states recorded
+        in its sync state.
+
+        Args:
+            bucket_name (str): Name of the bucket where the dataset will be uploaded.
+            data_source (DataSource): Dataset object to be uploaded.
+            manifest (DataSourceManifest | None): The data source's current manifest, if any.
+
+        Returns:
+            UploadIndex: The index of the data source's stored objects.
+        """
+        upload_index = UploadIndex()
+
+        for bucket_object in self.bucket_client.list_objects(
+            bucket_name=bucket_name, prefix=f"{data_source.name}/", recursive=True
+        ):
+            upload_index.add_object(
+                object_name=bucket_object.object_name,
+                size=bucket_object.size,
+                etag=(bucket_object.etag or "").strip('"'),
+            )
+
+        for manifest_entry in manifest or []:
+            if (
+                manifest_entry.annotation_sha256 is not None
+                and manifest_entry.annotation_size is not None
+            ):
+                upload_index.set_sha256(
+                    object_name=manifest_entry.annotation_path,
+                    size=manifest_entry.annotation_size,
+                    sha256=manifest_entry.annotation_sha256,
+                )
+            if (
+                manifest_entry.image_sha256 is not None
+                and manifest_entry.image_path is not None
+                and manifest_entry.image_size is not None
+            ):
+                upload_index.set_sha256(
+                    object_name=manifest_entry.image_path,
+                    size=manifest_entry.image_size,
+                    sha256=manifest_entry.image_sha256,
+                    version_id=manifest_entry.image_version_id,
+                )
+
+        if isinstance(data_source, LocalDataSource):
+            sync_state = SyncState.download(
+                bucket_client=self.bucket_client,
+                bucket_name=bucket_name,
+                data_source_name=data_source.name,
+            )
+            for file_state in sync_state or []:
+                upload_index.set_file_state(
+                    object_name=file_state.object_name,
+                    size=file_state.size,
+                    mtime_ns=file_state.mtime_ns,
+                    sha256=file_state.sha256,
+                )
+
+        return upload_index
+
     def _upload_imported_data_source(
-        self, bucket_name: str, data_source: LocalDataSource
+        self,
+        bucket_name: str,
+        data_source: LocalDataSource,
+        upload_index: UploadIndex | None = None,
+        previous_manifest: DataSourceManifest | None = None,
+        upload_run_id: int | None = None,
     ) -> None:
         """
-        Uploads a local dataset to a specified bucket.
+        Syncs a local dataset to a specified bucket, followed by its manifest and sync state.
+
+        The data source's folder is scanned and its files uploaded concurrently, each file only
+        if new or changed: a file whose size and modification time match its last upload is
+        skipped without being read, and the others are hashed and compared with the stored
+        objects. With `delete_removed`, the objects whose local file is gone are removed. In the
+        batched annotation layout, the annotation files are packed into batches instead of
+        being uploaded one by one.
 
         Args:
             bucket_name (str): Name of the bucket where the dataset will be uploaded.
             data_source (LocalDataSource): A LocalDataset object to upload.
+            upload_index (UploadIndex | None): The index of the content already stored.
+            previous_manifest (DataSourceManifest | None): The data source's current manifest,
+                whose annotations are reused for the unchanged annotation files.
+            upload_run_id (int | None): The journal's run, whose completed files are skipped
+                as unchanged ones are.
         """
-        for current_directory, _, file_list in os.walk(data_source.root_folder_path):
-            for file_name in file_list:
-                file_path_on_disk = os.path.join(current_directory, file_name)
-                relative_path = os.path.relpath(
-                    file_path_on_disk, start=data_source.root_folder_path
+        metadata = data_source.get_metadata().to_dict()
+        self._add_completed_files(upload_run_id, upload_index)
+
+        def _sync_file(
+            scanned_file: tuple[str, os.stat_result],
+        ) -> tuple[FileState, str]:
+            file_path_on_disk, file_stat = scanned_file
+            relative_path = os.path.relpath(
+                file_path_on_disk, start=data_source.root_folder_path
+            )
+            bucket_object_path = os.path.join(data_source.name, relative_path)
+            if self._is_packed_annotation(data_source.name, bucket_object_path):
+                sha256 = self._hash_file(file_path_on_disk, hashlib.sha256)
+                size = file_stat.st_size
+            else:
+                sha256, size = self._upload_file(
+                    bucket_name=bucket_name,
+                    object_name=bucket_object_path,
+                    file_path=file_path_on_disk,
+                    metadata=metadata,
+                    upload_index=upload_index,
+                    file_stat=file_stat,
                 )
-                bucket_object_path = os.path.join(data_source.name, relative_path)
-                self.bucket_client.upload_file(
-                    bucket_name,
-                    bucket_object_path,
-                    file_path_on_disk,
-                    data_source.get_metadata().to_dict(),
+            return (
+                FileState(
+                    object_name=bucket_object_path,
+                    size=size,
+                    mtime_ns=file_stat.st_mtime_ns,
+                    sha256=sha256,
+                ),
+                file_path_on_disk,
+            )
+
+        file_states: dict[str, FileState] = {}
+        annotation_file_paths: dict[str, str] = {}
+
+        with ThreadPoolExecutor(max_workers=self.bucket_client.max_workers) as executor:
+            for future in tqdm.tqdm(
+                iter_completed(
+                    executor,
+                    _sync_file,
+                    scan_files(
+                        data_source.root_folder_path, max_workers=self.scan_workers
+                    ),
+                    max_in_flight=self.bucket_client.max_workers * 4,
+                ),
+                desc="Syncing files",
+            ):
+                file_state, file_path_on_disk = future.result()
+                file_states[file_state.object_name] = file_state
+                self._record_completed(
+                    upload_run_id,
+                    CompletedItem(
+                        item_key=file_state.object_name,
+                        size=file_state.size,
+                        sha256=file_state.sha256,
+                        mtime_ns=file_state.mtime_ns,
+                    ),
                 )
+                if self._is_annotation_file(data_source.name, file_state.object_name):
+                    annotation_file_paths[file_state.object_name] = file_path_on_disk
+
+        manifest = self._build_imported_manifest(
+            data_source_name=data_source.name,
+            file_states=file_states,
+            annotation_file_paths=annotation_file_paths,
+            previous_manifest=previous_manifest,
+            upload_index=upload_index,
+        )
+        sync_state = SyncState(
+            data_source_name=data_source.name, file_states=list(file_states.values())
+        )
+        annotation_index = self._upload_annotation_batches(
+            bucket_name=bucket_name,
+            data_source_name=data_source.name,
+            manifest=manifest,
+            metadata=metadata,
+            upload_index=upload_index,
+        )
+
+        if self.delete_removed and upload_index is not None:
+            self._delete_removed_objects(
+                bucket_name=bucket_name,
+                data_source_name=data_source.name,
+                upload_index=upload_index,
+                file_states=file_states,
+                manifest=manifest,
+                sync_state=sync_state,
+                annotation_index=annotation_index,
+            )
+
+        self._upload_manifest(
+            bucket_name=bucket_name,
+            manifest=manifest,
+            metadata=metadata,
+        )
+        self._upload_sync_state(
+            bucket_name=bucket_name,
+            sync_state=sync_state,
+            metadata=metadata,
+        )
+
+    def _add_completed_files(
+        self, upload_run_id: int | None, upload_index: UploadIndex | None
+    ) -> None:
+        """
+        Indexes the files the journal's run already completed, so that they are skipped as
+        unchanged ones are.
+        """
+        if upload_run_id is None or upload_index is None:
+            return
+
+        assert self.upload_journal is not None
+        for completed_item in self.upload_journal.get_completed_items(upload_run_id):
+            # Files recorded without their state are checked again
+            if completed_item.mtime_ns is None or completed_item.sha256 is None:
+                continue
+            upload_index.set_file_state(
+                object_name=completed_item.item_key,
+                size=completed_item.size,
+                mtime_ns=completed_item.mtime_ns,
+                sha256=completed_item.sha256,
+            )
+
+    @staticmethod
+    def _is_annotation_file(data_source_name: str, object_name: str) -> bool:
+        return object_name.startswith(
+            f"{data_source_name}/annotations/"
+        ) and object_name.lower().endswith(".json")
+
+    def _is_packed_annotation(self, data_source_name: str, object_name: str) -> bool:
+        """
+        Checks if an annotation file is packed into a batch rather than uploaded on its own.
+        """
+        return self.annotation_layout == AnnotationLayout.BATCHED and (
+            self._is_annotation_file(data_source_name, object_name)
+        )
+
+    def _build_imported_manifest(
+        self,
+        data_source_name: str,
+        file_states: dict[str, FileState],
+        annotation_file_paths: dict[str, str],
+        previous_manifest: DataSourceManifest | None = None,
+        upload_index: UploadIndex | None = None,
+    ) -> DataSourceManifest:
+        """
+        Builds the manifest of a synced local dataset, from its files' states. The annotations
+        of the files unchanged since the previous manifest are taken from it, and the others
+        are read from the disk. The images' versions are taken from the upload index.
+
+        Args:
+            data_source_name (str): Name of the data source.
+            file_states (dict[str, FileState]): The synced files' states, by object name.
+            annotation_file_paths (dict[str, str]): The annotation files' paths on the disk, by
+                object name.
+            previous_manifest (DataSourceManifest | None): The data source's current manifest.
+            upload_index (UploadIndex | None): The index of the stored objects.
+
+        Returns:
+            DataSourceManifest: The data source's new manifest.
+        """
+        previous_manifest_entries = {
+            manifest_entry.annotation_path: manifest_entry
+            for manifest_entry in previous_manifest or []
+        }
+        manifest = DataSourceManifest(data_source_name=data_source_name)
+        for annotation_path, file_path_on_disk in sorted(annotation_file_paths.items()):
+            annotation_state = file_states[annotation_path]
+            previous_manifest_entry = previous_manifest_entries.get(annotation_path)
+            if (
+                previous_manifest_entry is not None
+                and previous_manifest_entry.annotation_sha256 == annotation_state.sha256
+            ):
+                annotation = previous_manifest_entry.annotation
+            else:
+                annotation = self._read_annotation_file(file_path_on_disk)
+
+            image_path = annotation.get("image_path") if annotation else None
+            image_state = file_states.get(image_path) if image_path else None
+
+            manifest.add_entry(
+                ManifestEntry(
+                    annotation_path=annotation_path,
+                    image_path=image_path,
+                    annotation=annotation,
+                    annotation_sha256=annotation_state.sha256,
+                    annotation_size=annotation_state.size,
+                    image_sha256=image_state.sha256 if image_state else None,
+                    image_size=image_state.size if image_state else None,
+                    image_version_id=self._get_version_id(upload_index, image_path),
+                )
+            )
+        return manifest
+
+    def _delete_removed_objects(
+        self,
+        bucket_name: str,
+        data_source_name: str,
+        upload_index: UploadIndex,
+        file_states: dict[str, FileState],
+        manifest: DataSourceManifest,
+        sync_state: SyncState,
+        annotation_index: AnnotationBatchIndex | None = None,
+    ) -> None:
+        """
+        Removes the objects of a synced local dataset whose file is gone, keeping its synced
+        files, manifest, sync state and annotation batches.
+        """
+        kept_object_names = {
+            object_name
+            for object_name in file_states
+            if not self._is_packed_annotation(data_source_name, object_name)
+        } | {
+            manifest.get_object_name(),
+            sync_state.get_object_name(),
+        }
+        if annotation_index is not None:
+            kept_object_names.update(annotation_index.get_batch_object_names())
+            kept_object_names.add(
+                AnnotationBatchIndex.get_index_object_name(data_source_name)
+            )
+        removed_object_names = [
+            object_name
+            for object_name in upload_index.get_object_names()
+            if object_name not in kept_object_names
+        ]
+        if removed_object_names:
+            self.bucket_client.remove_objects(
+                bucket_name=bucket_name, object_names=removed_object_names
+            )
+            upload_index.record_deleted(removed_object_names)
+
+    def _upload_sync_state(
+        self, bucket_name: str, sync_state: SyncState, metadata: dict | None = None
+    ) -> None:
+        """
+        Uploads a local data source's sync state next to its objects.
+        """
+        sync_state_data = sync_state.to_bytes()
+        self.bucket_client.upload_data(
+            bucket_name=bucket_name,
+            object_name=sync_state.get_object_name(),
+            data=io.BytesIO(sync_state_data),
+            length=len(sync_state_data),
+            metadata=metadata,
+        )
 
     def _upload_huggingface_data_source(
-        self, bucket_name: str, data_source: HuggingFaceDataSource
+        self,
+        bucket_name: str,
+        data_source: HuggingFaceDataSource,
+        upload_index: UploadIndex | None = None,
+        upload_run_id: int | None = None,
     ) -> None:
         """
-        Uploads a HuggingFace dataset to a specified bucket.
+        Uploads a HuggingFace dataset to a specified bucket, followed by its manifest.
+
+        Rows are read as the uploads complete, with at most `max_in_flight` of them decoded and
+        waiting for or being uploaded, so that memory use does not depend on the dataset's size.
 
         Args:
             bucket_name (str): Name of the bucket where the dataset will be uploaded.
             data_source (HuggingFaceDataSource): HuggingFaceDataSource object to be uploaded.
+            upload_index (UploadIndex | None): The index of the content already stored.
+            upload_run_id (int | None): The journal's run, whose completed rows are skipped.
         """
-        hf_data_source = load_dataset(data_source.dataset_name)
-
-        max_workers = 10
+        hf_data_source = self._load_huggingface_dataset(data_source)
+        metadata = data_source.get_metadata().to_dict()
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = []
+        total_items = self._get_number_of_rows(hf_data_source)
+        manifest = DataSourceManifest(data_source_name=data_source.name)
+        completed_row_keys = self._add_completed_rows(upload_run_id, manifest)
 
-            total_items = sum(
-                len(hf_data_source[split]) for split in hf_data_source.keys()
-            )
-            with tqdm.tqdm(
-                total=total_items, desc="Scheduling uploads"
-            ) as schedule_bar:
-                for split in hf_data_source.keys():
-                    for item in hf_data_source[split]:
-                        future = executor.submit(
-                            self._upload_task,
+        # The bucket client's concurrency controller decides how many uploads are in flight
+        encode_executor = self._create_encode_executor()
+        with ThreadPoolExecutor(
+            max_workers=self.bucket_client.max_workers
+        ) as executor, encode_executor or nullcontext():
+            for future in tqdm.tqdm(
+                iter_completed(
+                    executor,
+                    lambda keyed_item: (
+                        keyed_item[0],
+                        self._upload_task(
                             bucket_name,
                             data_source.name,
-                            item,
-                            data_source.get_metadata().to_dict(),
+                            keyed_item[1],
+                            metadata,
+                            upload_index,
+                            encode_executor,
+                            data_source.image_transcoding,
+                        ),
+                    ),
+                    self._iter_huggingface_rows(hf_data_source, completed_row_keys),
+                    max_in_flight=max(
+                        self.max_in_flight, self.bucket_client.max_workers
+                    ),
+                ),
+                initial=len(completed_row_keys),
+                total=total_items,
+                desc="Uploading files",
+            ):
+                self._add_completed_row(upload_run_id, manifest, *future.result())
+
+        self._upload_annotation_batches(
+            bucket_name=bucket_name,
+            data_source_name=data_source.name,
+            manifest=manifest,
+            metadata=metadata,
+            upload_index=upload_index,
+        )
+        self._upload_manifest(
+            bucket_name=bucket_name,
+            manifest=manifest,
+            metadata=data_source.get_metadata().to_dict(),
+        )
+
+    async def _upload_huggingface_data_source_async(
+        self,
+        bucket_name: str,
+        data_source: HuggingFaceDataSource,
+        upload_index: UploadIndex | None = None,
+        upload_run_id: int | None = None,
+    ) -> None:
+        """
+        Uploads a HuggingFace dataset to a specified bucket with the async bucket client.
+
+        Up to `max_in_flight` rows are uploaded concurrently. Images are encoded on the encoding
+        processes, or else on the event loop's default executor, so that the loop keeps serving
+        the requests meanwhile. The manifest is uploaded once every row has been.
+
+        Args:
+            bucket_name (str): Name of the bucket where the dataset will be uploaded.
+            data_source (HuggingFaceDataSource): HuggingFaceDataSource object to be uploaded.
+            upload_index (UploadIndex | None): The index of the content already stored.
+            upload_run_id (int | None): The journal's run, whose completed rows are skipped.
+        """
+        hf_data_source = self._load_huggingface_dataset(data_source)
+        metadata = data_source.get_metadata().to_dict()
+
+        total_items = self._get_number_of_rows(hf_data_source)
+        manifest = DataSourceManifest(data_source_name=data_source.name)
+        completed_row_keys = self._add_completed_rows(upload_run_id, manifest)
+
+        assert self.async_bucket_client is not None
+        async with self.async_bucket_client as async_bucket_client:
+            encode_executor = self._create_encode_executor()
+            pending: set[asyncio.Task] = set()
+            try:
+                with tqdm.tqdm(
+                    initial=len(completed_row_keys),
+                    total=total_items,
+                    desc="Uploading files",
+                ) as upload_bar:
+                    for item_key, item in self._iter_huggingface_rows(
+                        hf_data_source, completed_row_keys
+                    ):
+                        pending.add(
+                            asyncio.create_task(
+                                self._with_key_async(
+                                    item_key,
+                                    self._upload_task_async(
+                                        async_bucket_client,
+                                        bucket_name,
+                                        data_source.name,
+                                        item,
+                                        metadata,
+                                        upload_index,
+                                        encode_executor,
+                                        data_source.image_transcoding,
+                                    ),
+                                )
+                            )
                         )
-                        futures.append(future)
 
-                        schedule_bar.update(1)
+                        if len(pending) >= self.max_in_flight:
+                            done, pending = await asyncio.wait(
+                                pending, return_when=asyncio.FIRST_COMPLETED
+                            )
+                            for task in done:
+                                self._add_completed_row(
+                                    upload_run_id, manifest, *task.result()
+                                )
+                            upload_bar.update(len(done))
 
-            for _ in tqdm.tqdm(
-                as_completed(futures), total=len(futures), desc="Uploading files"
-            ):
-                pass
+                    while pending:
+                        done, pending = await asyncio.wait(
+                            pending, return_when=asyncio.FIRST_COMPLETED
+                        )
+                        for task in done:
+                            self._add_completed_row(
+                                upload_run_id, manifest, *task.result()
+                            )
+                        upload_bar.update(len(done))
+            finally:
+                for task in pending:
+                    task.cancel()
+                if encode_executor is not None:
+                    encode_executor.shutdown(cancel_futures=True)
 
-    def _upload_task(
+            # The few batches are uploaded by the bucket client, before the manifest
+            self._upload_annotation_batches(
+                bucket_name=bucket_name,
+                data_source_name=data_source.name,
+                manifest=manifest,
+                metadata=metadata,
+                upload_index=upload_index,
+            )
+            manifest_data = manifest.to_bytes()
+            await async_bucket_client.upload_data(
+                bucket_name=bucket_name,
+                object_name=manifest.get_object_name(),
+                data=manifest_data,
+                metadata=metadata,
+            )
+
+    async def _upload_task_async(
         self,
+        async_bucket_client: AsyncBucketClient,
         bucket_name: str,
         dataset_name: str,
         item: dict,
         metadata: dict | None = None,
-    ):
+        upload_index: UploadIndex | None = None,
+        encode_executor: Executor | None = None,
+        transcoding_policy: ImageTranscodingPolicy | None = None,
+    ) -> ManifestEntry:
         """
-        Task to upload an image and its corresponding JSON to the bucket.
+        Asynchronous counterpart of `_upload_task`.
 
         Args:
+            async_bucket_client (AsyncBucketClient): The async bucket client to upload with.
             bucket_name (str): Name of the bucket.
             dataset_name (str): Name of the dataset.
             item (dict): An item from the dataset containing image and metadata.
             metadata (metadata: dict | None): The file's metadata.
+            upload_index (UploadIndex | None): The index of the content already stored.
+            encode_executor (Executor | None): The encoding processes, if any.
+            transcoding_policy (ImageTranscodingPolicy | None): How the image is stored.
+
+        Returns:
+            ManifestEntry: The manifest entry of the uploaded annotation.
         """
-        unique_id = self._hash_image(item["image"])
+        async with self._encode_image_async(
+            encode_executor, item["image"], transcoding_policy
+        ) as (unique_id, image_data, image_extension, image_format):
+            image_path = f"{dataset_name}/images/{unique_id}.{image_extension}"
+            # The annotation is uploaded last, so that it never references a missing image
+            image_sha256, image_size = await self._upload_content_async(
+                async_bucket_client=async_bucket_client,
+                bucket_name=bucket_name,
+                object_name=image_path,
+                data=image_data,
+                metadata=self._get_image_metadata(
+                    metadata, image_format, transcoding_policy
+                ),
+                upload_index=upload_index,
+                sha256=unique_id,
+            )
 
-        image_path = f"{dataset_name}/images/{unique_id}.png"
-        self._upload_image(
-            bucket_name=bucket_name,
+        json_path = f"{dataset_name}/annotations/{unique_id}.json"
+        item["litter"]["image_path"] = image_path
+
+        json_data = json.dumps(item["litter"]).encode()
+        if self.annotation_layout == AnnotationLayout.BATCHED:
+            # The annotation is packed into a batch once every row is uploaded
+            annotation_sha256 = hashlib.sha256(json_data).hexdigest()
+            annotation_size = len(json_data)
+        else:
+            annotation_sha256, annotation_size = await self._upload_content_async(
+                async_bucket_client=async_bucket_client,
+                bucket_name=bucket_name,
+                object_name=json_path,
+                data=json_data,
+                metadata=metadata,
+                upload_index=upload_index,
+            )
+
+        return ManifestEntry(
+            annotation_path=json_path,
             image_path=image_path,
-            image=item["image"],
+            annotation=item["litter"],
+            annotation_sha256=annotation_sha256,
+            annotation_size=annotation_size,
+            image_sha256=image_sha256,
+            image_size=image_size,
+            image_format=image_format,
+            image_version_id=self._get_version_id(upload_index, image_path),
+        )
+
+    @staticmethod
+    async def _upload_content_async(
+        async_bucket_client: AsyncBucketClient,
+        bucket_name: str,
+        object_name: str,
+        data: bytes,
+        metadata: dict | None = None,
+        upload_index: UploadIndex | None = None,
+        sha256: str | None = None,
+    ) -> tuple[str, int]:
+        """
+        Asynchronous counterpart of `_upload_content`.
+        """
+        sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        if upload_index is not None and upload_index.is_stored(
+            object_name=object_name,
+            size=len(data),
+            sha256=sha256,
+            md5=lambda: hashlib.md5(data).hexdigest(),
+        ):
+            upload_index.record_skipped(len(data))
+            return sha256, len(data)
+
+        result = await async_bucket_client.upload_data(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            data=data,
             metadata=metadata,
         )
+        if upload_index is not None:
+            upload_index.record_uploaded(
+                object_name, len(data), sha256, version_id=result.version_id
+            )
+        return sha256, len(data)
+
+    def _upload_task(
+        self,
+        bucket_name: str,
+        dataset_name: str,
+        item: dict,
+        metadata: dict | None = None,
+        upload_index: UploadIndex | None = None,
+        encode_executor: Executor | None = None,
+        transcoding_policy: ImageTranscodingPolicy | None = None,
+    ) -> ManifestEntry:
+        """
+        Task to upload an image and its corresponding JSON to the bucket. The image is stored
+        as the data source's transcoding policy requires, and its format recorded in the
+        image's metadata and manifest entry.
+
+        Args:
+            bucket_name (str): Name of the bucket.
+            dataset_name (str): Name of the dataset.
+            item (dict): An item from the dataset containing image and metadata.
+            metadata (metadata: dict | None): The file's metadata.
+            upload_index (UploadIndex | None): The index of the content already stored.
+            encode_executor (Executor | None): The encoding processes, if any.
+            transcoding_policy (ImageTranscodingPolicy | None): How the image is stored.
+
+        Returns:
+            ManifestEntry: The manifest entry of the uploaded annotation.
+        """
+        with self._encode_image_in_pool(
+            encode_executor, item["image"], transcoding_policy
+        ) as (unique_id, image_data, image_extension, image_format):
+            image_path = f"{dataset_name}/images/{unique_id}.{image_extension}"
+            image_sha256, image_size = self._upload_content(
+                bucket_name=bucket_name,
+                object_name=image_path,
+                data=image_data,
+                metadata=self._get_image_metadata(
+                    metadata, image_format, transcoding_policy
+                ),
+                upload_index=upload_index,
+                sha256=unique_id,
+            )
 
         json_path = f"{dataset_name}/annotations/{unique_id}.json"
         item["litter"]["image_path"] = image_path
 
-        self._upload_json(
-            bucket_name=bucket_name,
-            json_path=json_path,
-            data=item["litter"],
-            metadata=metadata,
+        if self.annotation_layout == AnnotationLayout.BATCHED:
+            # The annotation is packed into a batch once every row is uploaded
+            json_data = json.dumps(item["litter"]).encode()
+            annotation_sha256 = hashlib.sha256(json_data).hexdigest()
+            annotation_size = len(json_data)
+        else:
+            annotation_sha256, annotation_size = self._upload_json(
+                bucket_name=bucket_name,
+                json_path=json_path,
+                data=item["litter"],
+                metadata=metadata,
+                upload_index=upload_index,
+            )
+
+        return ManifestEntry(
+            annotation_path=json_path,
+            image_path=image_path,
+            annotation=item["litter"],
+            annotation_sha256=annotation_sha256,
+            annotation_size=annotation_size,
+            image_sha256=image_sha256,
+            image_size=image_size,
+            image_format=image_format,
+            image_version_id=self._get_version_id(upload_index, image_path),
+        )
+
+    @staticmethod
+    def _iter_huggingface_rows(
+        hf_data_source: DatasetDict | IterableDatasetDict,
+        skipped_row_keys: set[str] | None = None,
+    ) -> Iterator[tuple[str, dict]]:
+        """
+        Iterates over the rows of every split of a HuggingFace dataset, keyed by their split and
+        index, e.g. `train/42`.
+        """
+        for split in hf_data_source.keys():
+            for row_index, item in enumerate(hf_data_source[split]):
+                item_key = f"{split}/{row_index}"
+                if not skipped_row_keys or item_key not in skipped_row_keys:
+                    yield item_key, item
+
+    @staticmethod
+    async def _with_key_async(
+        item_key: str, upload_task: Awaitable[ManifestEntry]
+    ) -> tuple[str, ManifestEntry]:
+        return item_key, await upload_task
+
+    def _record_completed(
+        self, upload_run_id: int | None, completed_item: CompletedItem
+    ) -> None:
+        if upload_run_id is not None:
+            assert self.upload_journal is not None
+            self.upload_journal.record_completed(upload_run_id, completed_item)
+
+    def _add_completed_rows(
+        self, upload_run_id: int | None, manifest: DataSourceManifest
+    ) -> set[str]:
+        """
+        Adds the manifest entries of the HuggingFace rows the journal's run already completed.
+
+        Returns:
+            set[str]: The keys of the completed rows.
+        """
+        if upload_run_id is None:
+            return set()
+
+        assert self.upload_journal is not None
+        completed_row_keys = set()
+        for completed_item in self.upload_journal.get_completed_items(upload_run_id):
+            # Rows recorded without their manifest entry are uploaded again
+            if completed_item.manifest_entry is None:
+                continue
+            manifest.add_entry(ManifestEntry.from_dict(completed_item.manifest_entry))
+            completed_row_keys.add(completed_item.item_key)
+        return completed_row_keys
+
+    def _add_completed_row(
+        self,
+        upload_run_id: int | None,
+        manifest: DataSourceManifest,
+        item_key: str,
+        manifest_entry: ManifestEntry,
+    ) -> None:
+        """
+        Adds the manifest entry of an uploaded HuggingFace row, and journals the row.
+        """
+        manifest.add_entry(manifest_entry)
+        self._record_completed(
+            upload_run_id,
+            CompletedItem(
+                item_key=item_key,
+                size=(manifest_entry.annotation_size or 0)
+                + (manifest_entry.image_size or 0),
+                sha256=manifest_entry.image_sha256,
+                manifest_entry=manifest_entry.to_dict(),
+            ),
+        )
+
+    def _create_encode_executor(self) -> ProcessPoolExecutor | None:
+        """
+        Creates the pool of processes encoding and hashing images, None if images are encoded
+        in the uploading threads.
+
+        Processes are spawned rather than forked, as the uploader runs threads meanwhile.
+        """
+        if self.encode_workers <= 0:
+            return None
+        return ProcessPoolExecutor(
+            max_workers=self.encode_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    @staticmethod
+    def _load_huggingface_dataset(
+        data_source: HuggingFaceDataSource,
+    ) -> DatasetDict | IterableDatasetDict:
+        """
+        Loads a HuggingFace dataset, from its local copy if it has one, with its images left
+        undecoded so that their source bytes can be uploaded as they are.
+
+        Streamed datasets are read lazily as their rows are iterated, without being downloaded
+        to the local cache first.
+        """
+        hf_data_source = load_dataset(
+            data_source.local_path or data_source.dataset_name,
+            streaming=data_source.streaming,
+            token=data_source.api_token,
+        )
+        if any(
+            split.features is not None and "image" in split.features
+            for split in hf_data_source.values()
+        ):
+            hf_data_source = hf_data_source.cast_column("image", Image(decode=False))
+        return hf_data_source
+
+    @staticmethod
+    def _get_number_of_rows(
+        hf_data_source: DatasetDict | IterableDatasetDict,
+    ) -> int | None:
+        """
+        Gets the number of rows of a HuggingFace dataset, from its metadata when it is streamed.
+
+        Returns:
+            int | None: The number of rows, None if a streamed split does not declare it.
+        """
+        number_of_rows = 0
+        for split_name, split in hf_data_source.items():
+            if isinstance(split, IterableDataset):
+                split_info = (split.info.splits or {}).get(split_name)
+                if split_info is None or not split_info.num_examples:
+                    return None
+                number_of_rows += split_info.num_examples
+            else:
+                number_of_rows += len(split)
+        return number_of_rows
+
+    @staticmethod
+    @contextmanager
+    def _encode_image_in_pool(
+        encode_executor: Executor | None,
+        image: dict | PIL.Image.Image,
+        transcoding_policy: ImageTranscodingPolicy | None = None,
+    ) -> Iterator[tuple[str, bytes | memoryview, str, str | None]]:
+        """
+        Encodes and hashes an image as `_encode_image` does, on the encoding processes if any.
+
+        The image's source bytes are handed over to the encoding process through shared memory
+        rather than pickled, and its content is read in place from the shared buffer it is
+        handed back in, for as long as the context lasts. The buffers are freed on exit, and
+        so are those of an encoding given up on, whenever it completes.
+
+        Returns:
+            Iterator[tuple[str, bytes | memoryview, str, str | None]]: The SHA-256 of the
+                content, the content, its extension and its format.
+        """
+        if encode_executor is None:
+            yield DataUploaderService._encode_image(image, transcoding_policy)
+            return
+
+        future, source_buffer = DataUploaderService._submit_encoding(
+            encode_executor, image, transcoding_policy
+        )
+        try:
+            try:
+                sha256, image_buffer, image_extension, image_format = future.result()
+            except BaseException:
+                future.add_done_callback(release_unread_result)
+                raise
+
+            try:
+                with image_buffer.open() as image_data:
+                    yield sha256, image_data, image_extension, image_format
+            finally:
+                image_buffer.unlink()
+        finally:
+            if source_buffer is not None:
+                source_buffer.unlink()
+
+    @staticmethod
+    @asynccontextmanager
+    async def _encode_image_async(
+        encode_executor: Executor | None,
+        image: dict | PIL.Image.Image,
+        transcoding_policy: ImageTranscodingPolicy | None = None,
+    ) -> AsyncIterator[tuple[str, bytes | memoryview, str, str | None]]:
+        """
+        Asynchronous counterpart of `_encode_image_in_pool`. Without encoding processes, the
+        image is encoded on the event loop's default executor.
+        """
+        if encode_executor is None:
+            yield await asyncio.get_running_loop().run_in_executor(
+                None, DataUploaderService._encode_image, image, transcoding_policy
+            )
+            return
+
+        future, source_buffer = DataUploaderService._submit_encoding(
+            encode_executor, image, transcoding_policy
         )
+        try:
+            try:
+                (
+                    sha256,
+                    image_buffer,
+                    image_extension,
+                    image_format,
+                ) = await asyncio.wrap_future(future)
+            except BaseException:
+                future.add_done_callback(release_unread_result)
+                raise
+
+            try:
+                with image_buffer.open() as image_data:
+                    yield sha256, image_data, image_extension, image_format
+            finally:
+                image_buffer.unlink()
+        finally:
+            if source_buffer is not None:
+                source_buffer.unlink()
 
     @staticmethod
-    def _hash_image(image: PIL.Image) -> str:
+    def _submit_encoding(
+        encode_executor: Executor,
+        image: dict | PIL.Image.Image,
+        transcoding_policy: ImageTranscodingPolicy | None = None,
+    ) -> tuple[Future, SharedBuffer | None]:
+        """
+        Submits an image's encoding to the encoding processes. Source bytes are copied once
+        into shared memory, and images stored as files are passed by path, to be read by the
+        encoding process itself.
+
+        Returns:
+            tuple[Future, SharedBuffer | None]: The encoding's future, and the shared buffer
+                holding the image's source bytes, to be freed by the caller.
         """
-        Generates a SHA-256 hash for a given image.
+        source_buffer = None
+        if isinstance(image, dict) and image.get("bytes") is not None:
+            source_buffer = SharedBuffer.from_bytes(image["bytes"])
+            image = {"path": image.get("path"), "shared_buffer": source_buffer}
+
+        try:
+            future = encode_executor.submit(
+                encode_image_to_shared_buffer, image, transcoding_policy
+            )
+        except BaseException:
+            if source_buffer is not None:
+                source_buffer.unlink()
+            raise
+        return future, source_buffer
+
+    @staticmethod
+    def _encode_image(
+        image: dict | PIL.Image.Image,
+        transcoding_policy: ImageTranscodingPolicy | None = None,
+    ) -> tuple[str, bytes | memoryview, str, str | None]:
+        """
+        Gets the content to upload for an image, and hashes it.
+
+        Undecoded images, i.e. dictionaries holding the source's bytes or path, are passed
+        through untouched unless the transcoding policy requires them to be re-encoded. Decoded
+        images are encoded to PNG, or to the policy's format. Either way the image is encoded at
+        most once, and its hash is the SHA-256 of the uploaded bytes.
 
         Args:
-            image (PIL.Image): Image object to be hashed.
+            image (dict | PIL.Image.Image): The image, as found in a HuggingFace row.
+            transcoding_policy (ImageTranscodingPolicy | None): How the image is stored, its
+                original bytes being kept if None.
 
         Returns:
-            str: Hexadecimal hash of the image.
+            tuple[str, bytes | memoryview, str, str | None]: The SHA-256 of the content, the
+                content, its extension and its format, None if it could not be identified.
         """
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format=image.format)
-        img_byte_arr = img_byte_arr.getvalue()
+        transcoding_policy = transcoding_policy or ImageTranscodingPolicy()
+        image_path = None
 
-        hasher = hashlib.sha256()
-        hasher.update(img_byte_arr)
-        return hasher.hexdigest()
+        if isinstance(image, dict):
+            image_data = image.get("bytes")
+            image_path = image.get("path")
+            if image_data is None:
+                assert image_path is not None
+                # Streamed rows reference remote files, e.g. `hf://` or `zip://...::https://`
+                # URLs, which are read as `datasets` reads them when decoding an image
+                with xopen(image_path, "rb") as f:
+                    image_data = f.read()
+            image_data, image_format = transcoding_policy.transcode(image_data)
+        else:
+            image_data, image_format = transcoding_policy.transcode_image(image)
+
+        return (
+            hashlib.sha256(image_data).hexdigest(),
+            image_data,
+            DataUploaderService._get_image_extension(image_format, image_path),
+            image_format.lower() if image_format is not None else None,
+        )
+
+    @staticmethod
+    def _get_image_extension(
+        image_format: str | None, image_path: str | None = None
+    ) -> str:
+        """
+        Gets the file extension of an encoded image from its format, or else from its source path.
+        """
+        if image_format is not None:
+            return get_image_format_extension(image_format)
+        # The first hop of a chained URL, e.g. `zip://image.png::https://...`, is the image's
+        image_path = image_path.split("::")[0] if image_path else None
+        if image_path and os.path.splitext(image_path)[1]:
+            return os.path.splitext(image_path)[1][1:].lower()
+        return "png"
+
+    @staticmethod
+    def _get_image_metadata(
+        metadata: dict | None,
+        image_format: str | None,
+        transcoding_policy: ImageTranscodingPolicy | None = None,
+    ) -> dict:
+        """
+        Adds the stored format of an image, and the policy it was stored with, to the data
+        source's metadata.
+        """
+        return {
+            **(metadata or {}),
+            "image_format": image_format,
+            "image_transcoding": str(transcoding_policy or ImageTranscodingPolicy()),
+        }
+
+    @staticmethod
+    def _get_version_id(
+        upload_index: UploadIndex | None, object_name: str | None
+    ) -> str | None:
+        """
+        Gets the version of an uploaded or skipped object, for its manifest entry, so that
+        virtual datasets reference it without a stat.
+        """
+        if upload_index is None or object_name is None:
+            return None
+        return upload_index.get_version_id(object_name)
 
     def _upload_file(
         self,
@@ -164,68 +1186,337 @@ class DataUploaderService:
         object_name: str,
         file_path: str,
         metadata: dict | None = None,
-    ) -> None:
+        upload_index: UploadIndex | None = None,
+        file_stat: os.stat_result | None = None,
+    ) -> tuple[str, int]:
         """
-        Uploads a file to a specified bucket.
+        Uploads a file to a specified bucket, unless its content is already stored.
 
         Args:
-            bucket_name (str): Name of the bucket where the image will be uploaded.
-            object_name (str): Name of the bucket where the image will be uploaded.
-            file_path (str): Path within the bucket where the image will be stored.
-            metadata (PIL.Image): Image object to be uploaded.
+            bucket_name (str): Name of the bucket where the file will be uploaded.
+            object_name (str): Path within the bucket where the file will be stored.
+            file_path (str): Path of the file on disk.
+            metadata (metadata: dict | None): The file's metadata.
+            upload_index (UploadIndex | None): The index of the content already stored.
+            file_stat (os.stat_result | None): The file's stat, if already known.
+
+        Returns:
+            tuple[str, int]: The SHA-256 and the size of the file's content.
         """
-        self.bucket_client.upload_file(
+        file_stat = file_stat or os.stat(file_path)
+        file_size = file_stat.st_size
+
+        if upload_index is not None and not self.verify_checksums:
+            sha256 = upload_index.get_unchanged_sha256(
+                object_name, file_size, file_stat.st_mtime_ns
+            )
+            if sha256 is not None:
+                upload_index.record_skipped(file_size)
+                return sha256, file_size
+
+        # Files are only hashed before the upload when an object of the same size is stored
+        if upload_index is not None and upload_index.has_object(object_name, file_size):
+            sha256 = self._hash_file(file_path, hashlib.sha256)
+            if upload_index.is_stored(
+                object_name=object_name,
+                size=file_size,
+                sha256=sha256,
+                md5=lambda: self._hash_file(file_path, hashlib.md5),
+            ):
+                upload_index.record_skipped(file_size)
+                return sha256, file_size
+
+        sha256, version_id = self.bucket_client.upload_file(
             bucket_name=bucket_name,
             object_name=object_name,
             file_path=file_path,
             metadata=metadata,
         )
+        if upload_index is not None:
+            upload_index.record_uploaded(
+                object_name, file_size, sha256, version_id=version_id
+            )
+        return sha256, file_size
 
-    def _upload_image(
+    def _upload_json(
         self,
         bucket_name: str,
-        image_path: str,
-        image: PIL.Image,
+        json_path: str,
+        data: dict,
         metadata: dict | None = None,
-    ) -> None:
+        upload_index: UploadIndex | None = None,
+    ) -> tuple[str, int]:
         """
-        Uploads an image to a specified bucket.
+        Uploads a JSON file to a specified bucket.
 
         Args:
-            bucket_name (str): Name of the bucket where the image will be uploaded.
-            image_path (str): Path within the bucket where the image will be stored.
-            image (PIL.Image): Image object to be uploaded.
-            metadata (metadata: dict | None): The image's metadata.
+            bucket_name (str): Name of the bucket where the JSON file will be uploaded.
+            json_path (str): Path within the bucket where the JSON file will be stored.
+            data (dict): Data to be serialized to JSON and uploaded.
+            metadata (metadata: dict | None): The json's metadata.
+            upload_index (UploadIndex | None): The index of the content already stored.
+
+        Returns:
+            tuple[str, int]: The SHA-256 and the size of the JSON content.
         """
-        image_buffer = io.BytesIO()
-        image.save(image_buffer, format="PNG")
-        image_buffer.seek(0)
-        self.bucket_client.upload_data(
+        return self._upload_content(
             bucket_name=bucket_name,
-            object_name=image_path,
-            data=image_buffer,
-            length=image_buffer.getbuffer().nbytes,
+            object_name=json_path,
+            data=json.dumps(data).encode(),
             metadata=metadata,
+            upload_index=upload_index,
         )
 
-    def _upload_json(
-        self, bucket_name: str, json_path: str, data: dict, metadata: dict | None = None
+    def _upload_content(
+        self,
+        bucket_name: str,
+        object_name: str,
+        data: bytes,
+        metadata: dict | None = None,
+        upload_index: UploadIndex | None = None,
+        sha256: str | None = None,
+    ) -> tuple[str, int]:
+        """
+        Uploads content to a specified bucket, unless the index knows it is already stored.
+
+        Args:
+            bucket_name (str): Name of the bucket where the content will be uploaded.
+            object_name (str): Path within the bucket where the content will be stored.
+            data (bytes): The content to upload.
+            metadata (metadata: dict | None): The content's metadata.
+            upload_index (UploadIndex | None): The index of the content already stored.
+            sha256 (str | None): SHA-256 of the content, if already computed.
+
+        Returns:
+            tuple[str, int]: The SHA-256 and the size of the content.
+        """
+        sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        if upload_index is not None and upload_index.is_stored(
+            object_name=object_name,
+            size=len(data),
+            sha256=sha256,
+            md5=lambda: hashlib.md5(data).hexdigest(),
+        ):
+            upload_index.record_skipped(len(data))
+            return sha256, len(data)
+
+        # Read in place, where a BytesIO would copy a shared buffer's content
+        with open_buffer(data) as data_reader:
+            result = self.bucket_client.upload_data(
+                bucket_name=bucket_name,
+                object_name=object_name,
+                data=data_reader,
+                length=len(data),
+                metadata=metadata,
+            )
+        if upload_index is not None:
+            upload_index.record_uploaded(
+                object_name, len(data), sha256, version_id=result.version_id
+            )
+        return sha256, len(data)
+
+    def _upload_annotation_batches(
+        self,
+        bucket_name: str,
+        data_source_name: str,
+        manifest: DataSourceManifest,
+        metadata: dict | None = None,
+        upload_index: UploadIndex | None = None,
+    ) -> AnnotationBatchIndex | None:
+        """
+        Packs the annotations of a data source's manifest into batches, in the batched
+        annotation layout, and uploads them followed by their offset index.
+
+        Annotations are packed in the manifest's order, so that the batches of an unchanged
+        data source are identical from one upload to the next and their uploads are skipped.
+        The batches left over from a previous upload are removed once the index is replaced.
+
+        Args:
+            bucket_name (str): Name of the bucket where the batches will be uploaded.
+            data_source_name (str): Name of the data source.
+            manifest (DataSourceManifest): The manifest of the uploaded data source.
+            metadata (metadata: dict | None): The batches' metadata.
+            upload_index (UploadIndex | None): The index of the content already stored.
+
+        Returns:
+            AnnotationBatchIndex | None: The annotations' index, None in the objects layout.
+        """
+        if self.annotation_layout != AnnotationLayout.BATCHED:
+            return None
+
+        annotation_batch_writer = AnnotationBatchWriter(
+            format_batch_path=lambda batch_number, extension: (
+                f"{data_source_name}/annotations/batch-{batch_number:06d}.{extension}"
+            ),
+            batch_size=self.annotation_batch_size,
+            compress=self.compress_annotations,
+        )
+
+        def _iter_batches() -> Iterator[tuple[str, bytes]]:
+            for manifest_entry in manifest:
+                if manifest_entry.annotation is None:
+                    continue
+                closed_batch = annotation_batch_writer.add(
+                    annotation_path=manifest_entry.annotation_path,
+                    annotation=manifest_entry.annotation,
+                )
+                if closed_batch is not None:
+                    yield closed_batch
+            open_batch = annotation_batch_writer.get_open_batch()
+            if open_batch is not None:
+                yield open_batch
+
+        with ThreadPoolExecutor(max_workers=self.bucket_client.max_workers) as executor:
+            for future in iter_completed(
+                executor,
+                lambda batch: self._upload_content(
+                    bucket_name=bucket_name,
+                    object_name=batch[0],
+                    data=batch[1],
+                    metadata=metadata,
+                    upload_index=upload_index,
+                ),
+                _iter_batches(),
+                max_in_flight=self.bucket_client.max_workers,
+            ):
+                future.result()
+
+        annotation_index = annotation_batch_writer.index
+        self._upload_content(
+            bucket_name=bucket_name,
+            object_name=AnnotationBatchIndex.get_index_object_name(data_source_name),
+            data=annotation_index.to_bytes(),
+            metadata=metadata,
+            upload_index=upload_index,
+        )
+
+        if upload_index is not None:
+            batch_object_names = set(annotation_index.get_batch_object_names())
+            stale_batch_object_names = [
+                object_name
+                for object_name in upload_index.get_object_names()
+                if object_name.startswith(f"{data_source_name}/annotations/batch-")
+                and object_name not in batch_object_names
+            ]
+            if stale_batch_object_names:
+                self.bucket_client.remove_objects(
+                    bucket_name=bucket_name, object_names=stale_batch_object_names
+                )
+                upload_index.record_deleted(stale_batch_object_names)
+
+        return annotation_index
+
+    def _upload_manifest(
+        self,
+        bucket_name: str,
+        manifest: DataSourceManifest,
+        metadata: dict | None = None,
     ) -> None:
         """
-        Uploads a JSON file to a specified bucket.
+        Uploads a data source's manifest next to its objects.
 
         Args:
-            bucket_name (str): Name of the bucket where the JSON file will be uploaded.
-            json_path (str): Path within the bucket where the JSON file will be stored.
-            data (dict): Data to be serialized to JSON and uploaded.
-            metadata (metadata: dict | None): The json's metadata.
+            bucket_name (str): Name of the bucket where the manifest will be uploaded.
+            manifest (DataSourceManifest): The manifest of the uploaded data source.
+            metadata (metadata: dict | None): The manifest's metadata.
         """
-        json_data = json.dumps(data)
-        json_buffer = io.BytesIO(json_data.encode())
+        manifest_data = manifest.to_bytes()
         self.bucket_client.upload_data(
             bucket_name=bucket_name,
-            object_name=json_path,
-            data=json_buffer,
-            length=len(json_data),
+            object_name=manifest.get_object_name(),
+            data=io.BytesIO(manifest_data),
+            length=len(manifest_data),
             metadata=metadata,
         )
+
+    @staticmethod
+    def _hash_file(file_path: str, hash_constructor: Callable) -> str:
+        """
+        Hashes a file on disk by chunks.
+
+        Args:
+            file_path (str): Path of the file on disk.
+            hash_constructor (Callable): The hashlib constructor of the algorithm to use.
+
+        Returns:
+            str: Hexadecimal digest of the file's content.
+        """
+        hasher = hash_constructor()
+        with open(file_path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _read_annotation_file(file_path: str) -> dict | None:
+        """
+        Reads a local annotation file.
+
+        Args:
+            file_path (str): Path of the annotation file on disk.
+
+        Returns:
+            dict | None: The annotation's content, or None if it is not a JSON object.
+        """
+        try:
+            with open(file_path, "rb") as f:
+                annotation = json.loads(f.read().decode("utf-8"))
+        except ValueError:
+            return None
+
+        return annotation if isinstance(annotation, dict) else None
+
+
+def encode_image_to_shared_buffer(
+    image: dict | PIL.Image.Image,
+    transcoding_policy: ImageTranscodingPolicy | None = None,
+) -> tuple[str, SharedBuffer, str, str | None]:
+    """
+    Encodes and hashes an image in an encoding process, as `DataUploaderService._encode_image`
+    does, and hands its content over to the uploader through shared memory.
+
+    Source bytes handed over in shared memory, under the image's `shared_buffer` key, are read
+    in place, and when they are kept as they are, their buffer is handed back as is, so that
+    the image is never copied between the processes.
+
+    Args:
+        image (dict | PIL.Image.Image): The image, as found in a HuggingFace row, or with its
+            source bytes in shared memory.
+        transcoding_policy (ImageTranscodingPolicy | None): How the image is stored.
+
+    Returns:
+        tuple[str, SharedBuffer, str, str | None]: The SHA-256 of the content, the content's
+            shared buffer, its extension and its format.
+    """
+    if not isinstance(image, dict) or image.get("shared_buffer") is None:
+        (
+            sha256,
+            image_data,
+            image_extension,
+            image_format,
+        ) = DataUploaderService._encode_image(image, transcoding_policy)
+        return (
+            sha256,
+            SharedBuffer.from_bytes(image_data),
+            image_extension,
+            image_format,
+        )
+
+    source_buffer = image["shared_buffer"]
+    with source_buffer.open() as source_data:
+        (
+            sha256,
+            image_data,
+            image_extension,
+            image_format,
+        ) = DataUploaderService._encode_image(
+            {"bytes": source_data, "path": image.get("path")}, transcoding_policy
+        )
+        if image_data is source_data:
+            return sha256, source_buffer, image_extension, image_format
+        return (
+            sha256,
+            SharedBuffer.from_bytes(image_data),
+            image_extension,
+            image_format,
+        )
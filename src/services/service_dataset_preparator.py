@@ -0,0 +1,1399 @@
+import asyncio
+import io
+import itertools
+import json
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterator,
+    Deque,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import tqdm
+
+from src.models.model_annotation_batch import (
+    AnnotationBatchIndex,
+    AnnotationLayout,
+    BatchedAnnotation,
+)
+from src.models.model_async_bucket_client import AsyncBucketClient
+from src.models.model_bucket_client import (
+    BucketClient,
+    CopyRequest,
+    GetRequest,
+    StatRequest,
+    UploadRequest,
+)
+from src.models.model_data_source import DataSource
+from src.models.model_data_source_manifest import DataSourceManifest, ManifestEntry
+from src.models.model_dataset import Dataset, DatasetFormat, SplitStrategy
+from src.models.model_dataset_manifest import DatasetManifest, DatasetManifestEntry
+from src.models.model_dataset_sample import DatasetSample
+from src.steps.data.data_validators import (
+    ImageValidationLevel,
+    get_image_dimensions,
+    get_json_data_from_bytes_if_valid,
+    is_annotation_file_valid,
+    is_image_data_valid,
+    is_image_header_valid,
+)
+
+logger = logging.getLogger(__name__)
+
+_END_OF_LISTING = object()
+
+
+class DatasetPreparatorService:
+    def __init__(
+        self,
+        bucket_client: BucketClient,
+        fetch_workers: int = 16,
+        validate_workers: int = 4,
+        copy_workers: int = 16,
+        max_in_flight: int = 256,
+        listing_buffer_size: int = 1000,
+        async_bucket_client: Optional[AsyncBucketClient] = None,
+        image_validation_level: ImageValidationLevel = ImageValidationLevel.FULL,
+        image_header_size: int = 64 * 1024,
+    ):
+        """
+        Prepares datasets from the data sources stored in a bucket.
+
+        The preparation runs as a pipeline of bounded stages: listing, fetching, validating and
+        server-side copying. Each stage owns its worker pool, and at most `max_in_flight` samples
+        are held between the listing and the copy stage at any time.
+
+        Args:
+            bucket_client (BucketClient): The bucket client used for bucket operations.
+            fetch_workers (int): Number of concurrent annotation/image downloads.
+            validate_workers (int): Number of concurrent image validations.
+            copy_workers (int): Number of concurrent server-side copies.
+            max_in_flight (int): Maximum number of samples between listing and copying.
+            listing_buffer_size (int): Maximum number of listed object names buffered ahead.
+            async_bucket_client (Optional[AsyncBucketClient]): When set, the samples are fetched
+                and copied from a single event loop instead of the fetch and copy pools.
+            image_validation_level (ImageValidationLevel): Whether images are validated from
+                their header only, or downloaded and verified in full.
+            image_header_size (int): Number of bytes read for a header validation.
+        """
+        self.bucket_client = bucket_client
+        self.fetch_workers = max(1, fetch_workers)
+        self.validate_workers = max(1, validate_workers)
+        self.copy_workers = max(1, copy_workers)
+        self.max_in_flight = max(1, max_in_flight)
+        self.listing_buffer_size = max(1, listing_buffer_size)
+        self.async_bucket_client = async_bucket_client
+        self.image_validation_level = ImageValidationLevel(image_validation_level)
+        self.image_header_size = image_header_size
+
+    def prepare_dataset(
+        self,
+        source_bucket_name: str,
+        dataset: Dataset,
+        data_source: DataSource,
+        parent_manifest: Optional[DatasetManifest] = None,
+    ) -> int:
+        """
+        Copies every valid annotation/image pair of a data source into the dataset.
+
+        Samples are sequenced in listing order before being assigned a split, so the split
+        assignment is identical to a serial run whatever the stages' concurrency. With the
+        dataset's hash split strategy, a sample's split only depends on its image's path, so it
+        also stays the same when samples are added to or removed from the data source. When the data
+        source has a manifest, the annotations are read from it instead of being listed and
+        downloaded one by one. Annotations packed in batches by the uploader are read from
+        their batch with a ranged request.
+
+        In the batched annotation layout, the dataset's annotations are packed per split into
+        batches, uploaded as they fill up, followed by the splits' indexes once the data source
+        is prepared. The dataset's manifest, recording each sample's origin and split, is
+        uploaded last, with the splits' assignment table for the stratified strategy, whose
+        splits are assigned from the data source's manifest before the preparation starts, and
+        the dataset's statistics, aggregated as the samples are assigned their split. A
+        virtual dataset is only that manifest: the images are referenced at
+        their current version instead of being copied, and the annotations are inlined.
+
+        When the dataset is prepared from a parent dataset, samples the parent already had keep
+        their split. Those whose annotation and image hashes, as recorded in the data source's
+        manifest, did not change since are copied without being fetched and validated again.
+
+        Args:
+            source_bucket_name (str): Name of the bucket holding the data source.
+            dataset (Dataset): The dataset to fill.
+            data_source (DataSource): The data source to read the samples from.
+            parent_manifest (Optional[DatasetManifest]): The manifest of the parent dataset,
+                for an incremental preparation.
+
+        Returns:
+            int: The number of samples copied into the dataset.
+        """
+        if self.async_bucket_client is not None:
+            return asyncio.run(
+                self.prepare_dataset_async(
+                    source_bucket_name=source_bucket_name,
+                    dataset=dataset,
+                    data_source=data_source,
+                    parent_manifest=parent_manifest,
+                )
+            )
+
+        annotation_index = self._get_annotation_index(
+            source_bucket_name=source_bucket_name, data_source=data_source
+        )
+        manifest = self._get_manifest(
+            source_bucket_name=source_bucket_name, data_source=data_source
+        )
+        self._assign_stratified_splits(dataset, data_source, manifest)
+        pending_samples: Deque[Tuple[str, Future]] = deque()
+        pending_copies: Deque[Future] = deque()
+        carried_samples: List[DatasetSample] = []
+        number_of_samples = 0
+        image_bytes = dataset.statistics.image_bytes
+
+        with ThreadPoolExecutor(
+            max_workers=self.fetch_workers, thread_name_prefix="fetch"
+        ) as fetch_executor, ThreadPoolExecutor(
+            max_workers=self.validate_workers, thread_name_prefix="validate"
+        ) as validate_executor, ThreadPoolExecutor(
+            max_workers=self.copy_workers, thread_name_prefix="copy"
+        ) as copy_executor:
+            try:
+                for annotation_file_path, manifest_entry in tqdm.tqdm(
+                    self._prefetch(
+                        self._list_samples(
+                            source_bucket_name=source_bucket_name,
+                            data_source=data_source,
+                            manifest=manifest,
+                            annotation_index=annotation_index,
+                        )
+                    ),
+                    desc=f"Preparing {data_source.name}",
+                ):
+                    batched_annotation = self._get_batched_annotation(
+                        annotation_index, annotation_file_path
+                    )
+                    carried_sample = self._get_carried_sample(
+                        parent_manifest,
+                        annotation_file_path,
+                        manifest_entry,
+                        batched_annotation,
+                    )
+                    pending_samples.append(
+                        (
+                            annotation_file_path,
+                            self._get_fetched_future(carried_sample)
+                            if carried_sample is not None
+                            else fetch_executor.submit(
+                                self._fetch_sample,
+                                validate_executor,
+                                source_bucket_name,
+                                annotation_file_path,
+                                manifest_entry,
+                                batched_annotation,
+                            ),
+                        )
+                    )
+
+                    if len(pending_samples) >= self.max_in_flight:
+                        number_of_samples += self._dispatch_sample(
+                            copy_executor,
+                            pending_samples,
+                            pending_copies,
+                            carried_samples,
+                            source_bucket_name,
+                            dataset,
+                            parent_manifest,
+                        )
+
+                while pending_samples:
+                    number_of_samples += self._dispatch_sample(
+                        copy_executor,
+                        pending_samples,
+                        pending_copies,
+                        carried_samples,
+                        source_bucket_name,
+                        dataset,
+                        parent_manifest,
+                    )
+                self._schedule_carried_copies(
+                    copy_executor,
+                    pending_copies,
+                    carried_samples,
+                    source_bucket_name,
+                    dataset,
+                    parent_manifest,
+                )
+
+                while pending_copies:
+                    pending_copies.popleft().result()
+
+                self._upload_annotation_batches(dataset)
+                self._upload_dataset_object(
+                    dataset, dataset.get_manifest_path(), dataset.manifest.to_bytes()
+                )
+                if len(dataset.split_assignments):
+                    self._upload_dataset_object(
+                        dataset,
+                        dataset.get_split_assignments_path(),
+                        dataset.split_assignments.to_bytes(),
+                    )
+                self._add_data_source_statistics(
+                    dataset, data_source, number_of_samples, image_bytes
+                )
+                self._upload_dataset_object(
+                    dataset,
+                    dataset.get_statistics_path(),
+                    dataset.statistics.to_bytes(),
+                )
+            except BaseException:
+                for _, future in pending_samples:
+                    future.cancel()
+                for future in pending_copies:
+                    future.cancel()
+                raise
+
+        return number_of_samples
+
+    async def prepare_dataset_async(
+        self,
+        source_bucket_name: str,
+        dataset: Dataset,
+        data_source: DataSource,
+        parent_manifest: Optional[DatasetManifest] = None,
+    ) -> int:
+        """
+        Asynchronous counterpart of `prepare_dataset`, using the async bucket client.
+
+        Up to `max_in_flight` samples are fetched and copied concurrently on the event loop,
+        bounded by the client's connection limit, while the image validations run on the
+        validation pool. Splits are assigned in listing order, as in `prepare_dataset`.
+
+        Returns:
+            int: The number of samples copied into the dataset.
+        """
+        pending_samples: Deque[Tuple[str, asyncio.Future]] = deque()
+        pending_copies: Deque[asyncio.Task] = deque()
+        number_of_samples = 0
+        image_bytes = dataset.statistics.image_bytes
+
+        assert self.async_bucket_client is not None
+        async with self.async_bucket_client as async_bucket_client:
+            annotation_index = await self._get_annotation_index_async(
+                async_bucket_client=async_bucket_client,
+                source_bucket_name=source_bucket_name,
+                data_source=data_source,
+            )
+            manifest = await self._get_manifest_async(
+                async_bucket_client=async_bucket_client,
+                source_bucket_name=source_bucket_name,
+                data_source=data_source,
+            )
+            self._assign_stratified_splits(dataset, data_source, manifest)
+            with ThreadPoolExecutor(
+                max_workers=self.validate_workers, thread_name_prefix="validate"
+            ) as validate_executor:
+                try:
+                    with tqdm.tqdm(
+                        desc=f"Preparing {data_source.name}"
+                    ) as progress_bar:
+                        async for (
+                            annotation_file_path,
+                            manifest_entry,
+                        ) in self._list_samples_async(
+                            async_bucket_client=async_bucket_client,
+                            source_bucket_name=source_bucket_name,
+                            data_source=data_source,
+                            manifest=manifest,
+                            annotation_index=annotation_index,
+                        ):
+                            batched_annotation = self._get_batched_annotation(
+                                annotation_index, annotation_file_path
+                            )
+                            carried_sample = self._get_carried_sample(
+                                parent_manifest,
+                                annotation_file_path,
+                                manifest_entry,
+                                batched_annotation,
+                            )
+                            pending_samples.append(
+                                (
+                                    annotation_file_path,
+                                    self._get_fetched_future_async(carried_sample)
+                                    if carried_sample is not None
+                                    else asyncio.create_task(
+                                        self._fetch_sample_async(
+                                            async_bucket_client,
+                                            validate_executor,
+                                            source_bucket_name,
+                                            annotation_file_path,
+                                            manifest_entry,
+                                            batched_annotation,
+                                        )
+                                    ),
+                                )
+                            )
+                            progress_bar.update(1)
+
+                            if len(pending_samples) >= self.max_in_flight:
+                                number_of_samples += await self._dispatch_sample_async(
+                                    async_bucket_client,
+                                    pending_samples,
+                                    pending_copies,
+                                    source_bucket_name,
+                                    dataset,
+                                    parent_manifest,
+                                )
+
+                    while pending_samples:
+                        number_of_samples += await self._dispatch_sample_async(
+                            async_bucket_client,
+                            pending_samples,
+                            pending_copies,
+                            source_bucket_name,
+                            dataset,
+                            parent_manifest,
+                        )
+
+                    while pending_copies:
+                        await pending_copies.popleft()
+
+                    await self._upload_annotation_batches_async(
+                        async_bucket_client, dataset
+                    )
+                    await async_bucket_client.upload_data(
+                        bucket_name=dataset.bucket_name,
+                        object_name=dataset.get_manifest_path(),
+                        data=dataset.manifest.to_bytes(),
+                    )
+                    if len(dataset.split_assignments):
+                        await async_bucket_client.upload_data(
+                            bucket_name=dataset.bucket_name,
+                            object_name=dataset.get_split_assignments_path(),
+                            data=dataset.split_assignments.to_bytes(),
+                        )
+                    self._add_data_source_statistics(
+                        dataset, data_source, number_of_samples, image_bytes
+                    )
+                    await async_bucket_client.upload_data(
+                        bucket_name=dataset.bucket_name,
+                        object_name=dataset.get_statistics_path(),
+                        data=dataset.statistics.to_bytes(),
+                    )
+                except BaseException:
+                    for _, task in pending_samples:
+                        task.cancel()
+                    for task in pending_copies:
+                        task.cancel()
+                    raise
+
+        return number_of_samples
+
+    async def _dispatch_sample_async(
+        self,
+        async_bucket_client: AsyncBucketClient,
+        pending_samples: Deque[Tuple[str, asyncio.Future]],
+        pending_copies: Deque[asyncio.Task],
+        source_bucket_name: str,
+        dataset: Dataset,
+        parent_manifest: Optional[DatasetManifest] = None,
+    ) -> int:
+        """
+        Asynchronous counterpart of `_dispatch_sample`.
+        """
+        annotation_file_path, task = pending_samples.popleft()
+
+        try:
+            sample = await task
+        except Exception as e:
+            e.add_note(f"While preparing the bucket object {annotation_file_path}")
+            raise
+
+        if sample is None:
+            return 0
+
+        sample.split_name = self._get_split_name(dataset, sample, parent_manifest)
+        dataset.statistics.add_sample(sample)
+        closed_batch = self._add_to_annotation_batch(dataset, sample)
+        if closed_batch is not None:
+            pending_copies.append(
+                asyncio.create_task(
+                    async_bucket_client.upload_data(
+                        bucket_name=dataset.bucket_name,
+                        object_name=closed_batch[0],
+                        data=closed_batch[1],
+                    )
+                )
+            )
+        pending_copies.append(
+            asyncio.create_task(
+                self._copy_sample_async(
+                    async_bucket_client, source_bucket_name, dataset, sample
+                )
+            )
+        )
+
+        if len(pending_copies) >= self.max_in_flight:
+            await pending_copies.popleft()
+
+        return 1
+
+    def _dispatch_sample(
+        self,
+        copy_executor: ThreadPoolExecutor,
+        pending_samples: Deque[Tuple[str, Future]],
+        pending_copies: Deque[Future],
+        carried_samples: List[DatasetSample],
+        source_bucket_name: str,
+        dataset: Dataset,
+        parent_manifest: Optional[DatasetManifest] = None,
+    ) -> int:
+        """
+        Waits for the oldest pending sample, assigns its split and schedules its copy. Samples
+        carried over from the parent dataset are buffered, to be copied `max_in_flight` at a
+        time in bulk.
+
+        Returns:
+            int: 1 if the sample was valid and scheduled for copy, 0 otherwise.
+        """
+        annotation_file_path, future = pending_samples.popleft()
+
+        try:
+            validation = future.result()
+            sample = validation.result() if validation is not None else None
+        except Exception as e:
+            e.add_note(f"While preparing the bucket object {annotation_file_path}")
+            raise
+
+        if sample is None:
+            return 0
+
+        sample.split_name = self._get_split_name(dataset, sample, parent_manifest)
+        dataset.statistics.add_sample(sample)
+        closed_batch = self._add_to_annotation_batch(dataset, sample)
+        if closed_batch is not None:
+            pending_copies.append(
+                copy_executor.submit(
+                    self._upload_dataset_object, dataset, *closed_batch
+                )
+            )
+        if sample.is_carried:
+            carried_samples.append(sample)
+            if len(carried_samples) >= self.max_in_flight:
+                self._schedule_carried_copies(
+                    copy_executor,
+                    pending_copies,
+                    carried_samples,
+                    source_bucket_name,
+                    dataset,
+                    parent_manifest,
+                )
+        else:
+            pending_copies.append(
+                copy_executor.submit(
+                    self._copy_sample, source_bucket_name, dataset, sample
+                )
+            )
+
+        if len(pending_copies) >= self.max_in_flight:
+            pending_copies.popleft().result()
+
+        return 1
+
+    def _schedule_carried_copies(
+        self,
+        copy_executor: ThreadPoolExecutor,
+        pending_copies: Deque[Future],
+        carried_samples: List[DatasetSample],
+        source_bucket_name: str,
+        dataset: Dataset,
+        parent_manifest: Optional[DatasetManifest] = None,
+    ) -> None:
+        """
+        Schedules the bulk copy of the carried samples buffered so far, emptying the buffer.
+        """
+        if not carried_samples:
+            return
+
+        pending_copies.append(
+            copy_executor.submit(
+                self._copy_carried_samples,
+                source_bucket_name,
+                dataset,
+                list(carried_samples),
+                parent_manifest,
+            )
+        )
+        carried_samples.clear()
+
+    @staticmethod
+    def _add_data_source_statistics(
+        dataset: Dataset,
+        data_source: DataSource,
+        number_of_samples: int,
+        previous_image_bytes: int,
+    ) -> None:
+        """
+        Records a prepared data source in the dataset's statistics, with the number of samples
+        it contributed and the size of their images, i.e. the images' bytes added since
+        `previous_image_bytes`.
+        """
+        dataset.statistics.flush()
+        dataset.statistics.add_data_source(
+            data_source=data_source,
+            number_of_records=number_of_samples,
+            size=dataset.statistics.image_bytes - previous_image_bytes,
+        )
+
+    @staticmethod
+    def _get_split_name(
+        dataset: Dataset,
+        sample: DatasetSample,
+        parent_manifest: Optional[DatasetManifest],
+    ) -> str:
+        """
+        Carries a sample's split over from the parent dataset, or assigns it one.
+        """
+        if parent_manifest is not None:
+            parent_entry = parent_manifest.get(sample.annotation_file_path)
+            if (
+                parent_entry is not None
+                and parent_entry.split_name in dataset.split_names
+            ):
+                return parent_entry.split_name
+        return dataset.get_split(sample.image_file_path)
+
+    @staticmethod
+    def _add_to_dataset_manifest(
+        dataset: Dataset,
+        sample: DatasetSample,
+        source_bucket_name: Optional[str] = None,
+    ) -> None:
+        """
+        Records a copied sample in the dataset's manifest, or in a virtual dataset, the
+        reference to its image's version and its annotation.
+        """
+        assert sample.split_name is not None
+        is_virtual = dataset.dataset_format == DatasetFormat.VIRTUAL
+
+        dataset.manifest.add_entry(
+            DatasetManifestEntry(
+                annotation_file_path=sample.annotation_file_path,
+                image_file_path=sample.image_file_path,
+                split_name=sample.split_name,
+                annotation_sha256=sample.annotation_sha256,
+                image_sha256=sample.image_sha256,
+                image_format=sample.image_format,
+                source_bucket_name=source_bucket_name if is_virtual else None,
+                image_version_id=sample.image_version_id if is_virtual else None,
+                image_size=sample.image_size,
+                annotation=sample.annotation if is_virtual else None,
+                image_width=sample.image_width,
+                image_height=sample.image_height,
+            )
+        )
+
+    @staticmethod
+    def _get_carried_sample(
+        parent_manifest: Optional[DatasetManifest],
+        annotation_file_path: str,
+        manifest_entry: Optional[ManifestEntry],
+        batched_annotation: Optional[BatchedAnnotation] = None,
+    ) -> Optional[DatasetSample]:
+        """
+        Builds the sample of an annotation whose annotation and image did not change since the
+        parent dataset was prepared, to be copied without being fetched and validated again.
+
+        Returns:
+            Optional[DatasetSample]: The sample, or None if it has to be prepared.
+        """
+        if parent_manifest is None or manifest_entry is None:
+            return None
+
+        parent_entry = parent_manifest.get(annotation_file_path)
+        if (
+            parent_entry is None
+            or manifest_entry.annotation is None
+            or not parent_entry.has_same_content(
+                annotation_sha256=manifest_entry.annotation_sha256,
+                image_sha256=manifest_entry.image_sha256,
+            )
+        ):
+            return None
+
+        return DatasetSample(
+            annotation_file_path=annotation_file_path,
+            image_file_path=parent_entry.image_file_path,
+            annotation=manifest_entry.annotation,
+            image_size=manifest_entry.image_size,
+            batched_annotation=batched_annotation,
+            image_format=manifest_entry.image_format,
+            annotation_sha256=manifest_entry.annotation_sha256,
+            image_sha256=manifest_entry.image_sha256,
+            image_version_id=manifest_entry.image_version_id,
+            image_width=parent_entry.image_width,
+            image_height=parent_entry.image_height,
+            is_carried=True,
+        )
+
+    @staticmethod
+    def _get_fetched_future(sample: DatasetSample) -> Future:
+        """
+        Wraps a sample that needs no fetch as the future of a fetch and of its validation.
+        """
+        validation: Future = Future()
+        validation.set_result(sample)
+        fetch: Future = Future()
+        fetch.set_result(validation)
+        return fetch
+
+    @staticmethod
+    def _get_fetched_future_async(sample: DatasetSample) -> asyncio.Future:
+        """
+        Asynchronous counterpart of `_get_fetched_future`.
+        """
+        fetch = asyncio.get_running_loop().create_future()
+        fetch.set_result(sample)
+        return fetch
+
+    def _list_samples(
+        self,
+        source_bucket_name: str,
+        data_source: DataSource,
+        manifest: Optional[DataSourceManifest] = None,
+        annotation_index: Optional[AnnotationBatchIndex] = None,
+    ) -> Iterator[Tuple[str, Optional[ManifestEntry]]]:
+        """
+        Lists the annotation files of a data source with their manifest entry, from the data
+        source's manifest if it has one, from its annotation index if its annotations are
+        batched, or from the bucket's listing otherwise.
+        """
+        if manifest is not None:
+            for manifest_entry in manifest:
+                yield manifest_entry.annotation_path, manifest_entry
+            return
+
+        if annotation_index is not None:
+            for batched_annotation in annotation_index:
+                yield batched_annotation.annotation_path, None
+            return
+
+        for annotation_file_path in self._list_annotation_file_paths(
+            source_bucket_name=source_bucket_name, data_source=data_source
+        ):
+            yield annotation_file_path, None
+
+    async def _list_samples_async(
+        self,
+        async_bucket_client: AsyncBucketClient,
+        source_bucket_name: str,
+        data_source: DataSource,
+        manifest: Optional[DataSourceManifest] = None,
+        annotation_index: Optional[AnnotationBatchIndex] = None,
+    ) -> AsyncIterator[Tuple[str, Optional[ManifestEntry]]]:
+        """
+        Asynchronous counterpart of `_list_samples`.
+        """
+        if manifest is not None:
+            for manifest_entry in manifest:
+                yield manifest_entry.annotation_path, manifest_entry
+            return
+
+        if annotation_index is not None:
+            for batched_annotation in annotation_index:
+                yield batched_annotation.annotation_path, None
+            return
+
+        async for annotation_bucket_object in async_bucket_client.list_objects(
+            bucket_name=source_bucket_name,
+            prefix=f"{data_source.name}/annotations/",
+        ):
+            if annotation_bucket_object.object_name.lower().endswith(".json"):
+                yield annotation_bucket_object.object_name, None
+
+    def _assign_stratified_splits(
+        self,
+        dataset: Dataset,
+        data_source: DataSource,
+        manifest: Optional[DataSourceManifest],
+    ) -> None:
+        """
+        Assigns the splits of a data source's samples up front, for the stratified strategy,
+        from the labels of the valid annotations its manifest records. The samples of a data
+        source without a manifest are split by hash, with a warning.
+        """
+        if dataset.split_strategy != SplitStrategy.STRATIFIED:
+            return
+        if manifest is None:
+            logger.warning(
+                f"The data source {data_source.name} has no manifest, its samples are split "
+                "by hash rather than stratified by label. Upload it again to write its "
+                "manifest."
+            )
+            return
+
+        annotations = [
+            annotation
+            for annotation in map(self._get_manifest_annotation, manifest)
+            if annotation is not None
+        ]
+        dataset.assign_stratified_splits(
+            sample_keys=[annotation["image_path"] for annotation in annotations],
+            labels=[annotation["label"] for annotation in annotations],
+        )
+
+    def _get_manifest(
+        self, source_bucket_name: str, data_source: DataSource
+    ) -> Optional[DataSourceManifest]:
+        """
+        Downloads the manifest of a data source.
+
+        Returns:
+            Optional[DataSourceManifest]: The data source's manifest, or None if it has none.
+        """
+        return DataSourceManifest.download(
+            bucket_client=self.bucket_client,
+            bucket_name=source_bucket_name,
+            data_source_name=data_source.name,
+        )
+
+    @staticmethod
+    async def _get_manifest_async(
+        async_bucket_client: AsyncBucketClient,
+        source_bucket_name: str,
+        data_source: DataSource,
+    ) -> Optional[DataSourceManifest]:
+        """
+        Asynchronous counterpart of `_get_manifest`.
+        """
+        manifest_data = await async_bucket_client.get_object_data_or_none(
+            bucket_name=source_bucket_name,
+            object_name=DataSourceManifest.get_manifest_object_name(data_source.name),
+        )
+        if manifest_data is None:
+            return None
+
+        return DataSourceManifest.from_bytes(
+            data_source_name=data_source.name, data=manifest_data
+        )
+
+    @staticmethod
+    def _get_manifest_annotation(manifest_entry: ManifestEntry) -> Optional[dict]:
+        """
+        Returns the annotation recorded in a manifest entry if it is a valid annotation.
+        """
+        annotation = manifest_entry.annotation
+        if annotation is None or not is_annotation_file_valid(json_data=annotation):
+            return None
+        return annotation
+
+    def _get_annotation_index(
+        self, source_bucket_name: str, data_source: DataSource
+    ) -> Optional[AnnotationBatchIndex]:
+        """
+        Downloads the annotation index of a data source.
+
+        Returns:
+            Optional[AnnotationBatchIndex]: The index, or None if the data source's annotations
+                are not batched.
+        """
+        return AnnotationBatchIndex.download(
+            bucket_client=self.bucket_client,
+            bucket_name=source_bucket_name,
+            folder_name=data_source.name,
+        )
+
+    @staticmethod
+    async def _get_annotation_index_async(
+        async_bucket_client: AsyncBucketClient,
+        source_bucket_name: str,
+        data_source: DataSource,
+    ) -> Optional[AnnotationBatchIndex]:
+        """
+        Asynchronous counterpart of `_get_annotation_index`.
+        """
+        annotation_index_data = await async_bucket_client.get_object_data_or_none(
+            bucket_name=source_bucket_name,
+            object_name=AnnotationBatchIndex.get_index_object_name(data_source.name),
+        )
+        if annotation_index_data is None:
+            return None
+
+        return AnnotationBatchIndex.from_bytes(annotation_index_data)
+
+    @staticmethod
+    def _get_batched_annotation(
+        annotation_index: Optional[AnnotationBatchIndex], annotation_file_path: str
+    ) -> Optional[BatchedAnnotation]:
+        if annotation_index is None:
+            return None
+        return annotation_index.get(annotation_file_path)
+
+    def _list_annotation_file_paths(
+        self, source_bucket_name: str, data_source: DataSource
+    ) -> Iterator[str]:
+        """
+        Lists the annotation files of a data source, in the bucket's listing order.
+        """
+        for annotation_bucket_object in self.bucket_client.list_objects(
+            bucket_name=source_bucket_name,
+            prefix=f"{data_source.name}/annotations/",
+        ):
+            if annotation_bucket_object.object_name.lower().endswith(".json"):
+                yield annotation_bucket_object.object_name
+
+    def _prefetch(self, iterable: Iterable) -> Iterator:
+        """
+        Consumes an iterable from a dedicated thread, buffering up to `listing_buffer_size` items.
+
+        Bucket listings are paginated with continuation tokens and cannot be split between
+        several workers, so the listing stage runs on a single thread ahead of the other stages.
+        """
+        buffer: queue.Queue = queue.Queue(maxsize=self.listing_buffer_size)
+        stop_event = threading.Event()
+
+        def _produce() -> None:
+            try:
+                for item in iterable:
+                    if stop_event.is_set():
+                        return
+                    buffer.put(item)
+                buffer.put(_END_OF_LISTING)
+            except BaseException as e:
+                buffer.put(e)
+
+        producer = threading.Thread(target=_produce, name="list", daemon=True)
+        producer.start()
+
+        try:
+            while (item := buffer.get()) is not _END_OF_LISTING:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop_event.set()
+            # Unblock the producer if it is waiting on a full buffer
+            while not buffer.empty():
+                buffer.get_nowait()
+
+    def _fetch_sample(
+        self,
+        validate_executor: ThreadPoolExecutor,
+        source_bucket_name: str,
+        annotation_file_path: str,
+        manifest_entry: Optional[ManifestEntry] = None,
+        batched_annotation: Optional[BatchedAnnotation] = None,
+    ) -> Optional[Future]:
+        """
+        Runs the reads of `_read_sample` with the bucket client, then hands the sample to the
+        validation stage.
+
+        Returns:
+            Optional[Future]: The validation's future, or None if the sample was discarded.
+        """
+        reads = self._read_sample(
+            source_bucket_name, annotation_file_path, manifest_entry, batched_annotation
+        )
+        try:
+            request = next(reads)
+            while True:
+                request = reads.send(self._run_read(request))
+        except StopIteration as stop:
+            sample = stop.value
+
+        if sample is None:
+            return None
+        return validate_executor.submit(self._validate_sample, sample)
+
+    async def _fetch_sample_async(
+        self,
+        async_bucket_client: AsyncBucketClient,
+        validate_executor: ThreadPoolExecutor,
+        source_bucket_name: str,
+        annotation_file_path: str,
+        manifest_entry: Optional[ManifestEntry] = None,
+        batched_annotation: Optional[BatchedAnnotation] = None,
+    ) -> Optional[DatasetSample]:
+        """
+        Asynchronous counterpart of `_fetch_sample`, awaiting the sample's validation.
+
+        Returns:
+            Optional[DatasetSample]: The sample if it is valid, None otherwise.
+        """
+        reads = self._read_sample(
+            source_bucket_name, annotation_file_path, manifest_entry, batched_annotation
+        )
+        try:
+            request = next(reads)
+            while True:
+                request = reads.send(
+                    await self._run_read_async(async_bucket_client, request)
+                )
+        except StopIteration as stop:
+            sample = stop.value
+
+        if sample is None:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(
+            validate_executor, self._validate_sample, sample
+        )
+
+    def _read_sample(
+        self,
+        source_bucket_name: str,
+        annotation_file_path: str,
+        manifest_entry: Optional[ManifestEntry] = None,
+        batched_annotation: Optional[BatchedAnnotation] = None,
+    ) -> Generator[Union[GetRequest, StatRequest], Any, Optional[DatasetSample]]:
+        """
+        Reads an annotation and its image. The reads are yielded to the caller, which runs them
+        with its bucket client and sends their result back, so that the fetch stages of
+        `prepare_dataset` and `prepare_dataset_async` share the same steps.
+
+        The annotation and the image's size are taken from the manifest entry when given, and
+        a batched annotation is read from its batch with a ranged request otherwise. At the
+        header validation level, only the image's header is read.
+
+        Returns:
+            Optional[DatasetSample]: The sample to validate, or None if the annotation is
+                invalid, the image is empty, or it was replaced while being read.
+        """
+        if manifest_entry is not None:
+            annotation_json_data = self._get_manifest_annotation(manifest_entry)
+        else:
+            annotation_request = (
+                GetRequest(
+                    bucket_name=source_bucket_name,
+                    object_name=batched_annotation.batch_object_name,
+                    offset=batched_annotation.offset,
+                    length=batched_annotation.length,
+                )
+                if batched_annotation is not None
+                else GetRequest(
+                    bucket_name=source_bucket_name, object_name=annotation_file_path
+                )
+            )
+            annotation_data, _ = yield annotation_request
+            annotation_json_data = get_json_data_from_bytes_if_valid(
+                annotation_data=annotation_data,
+                object_url=f"{source_bucket_name}/{annotation_request.object_name}",
+                batched_annotation=batched_annotation,
+            )
+
+        if annotation_json_data is None:
+            return None
+
+        image_file_path = annotation_json_data["image_path"]
+        image_size = manifest_entry.image_size if manifest_entry is not None else None
+        image_format = (
+            manifest_entry.image_format if manifest_entry is not None else None
+        )
+        annotation_sha256, image_sha256, image_version_id = (
+            (
+                manifest_entry.annotation_sha256,
+                manifest_entry.image_sha256,
+                manifest_entry.image_version_id,
+            )
+            if manifest_entry is not None
+            else (None, None, None)
+        )
+        image_etag = None
+        length = 0
+
+        if self.image_validation_level == ImageValidationLevel.HEADER:
+            if image_size is None:
+                image_info = yield StatRequest(
+                    bucket_name=source_bucket_name, object_name=image_file_path
+                )
+                image_size, image_etag = image_info.size, image_info.etag
+            length = self.image_header_size
+
+            # Empty objects cannot be read with a range
+            if not image_size:
+                return None
+
+        image_data, image_headers = yield GetRequest(
+            bucket_name=source_bucket_name, object_name=image_file_path, length=length
+        )
+
+        # The image was replaced between its stat and its read
+        response_etag = image_headers.get("ETag", "")
+        if image_etag and response_etag and response_etag.strip('"') != image_etag:
+            return None
+
+        # Manifests written before image versions were recorded lack them
+        image_version_id = image_version_id or image_headers.get("x-amz-version-id")
+
+        return DatasetSample(
+            annotation_file_path=annotation_file_path,
+            image_file_path=image_file_path,
+            annotation=annotation_json_data,
+            image_data=image_data,
+            image_size=image_size,
+            image_etag=image_etag,
+            batched_annotation=batched_annotation,
+            image_format=image_format,
+            annotation_sha256=annotation_sha256,
+            image_sha256=image_sha256,
+            image_version_id=image_version_id,
+        )
+
+    def _run_read(self, request: Union[GetRequest, StatRequest]) -> Any:
+        """
+        Runs a read of `_read_sample`.
+
+        Returns:
+            Any: The object's information for a stat, its content and the response's headers
+                for a read.
+        """
+        if isinstance(request, StatRequest):
+            return self.bucket_client.stat_object(
+                bucket_name=request.bucket_name, object_name=request.object_name
+            )
+
+        response = self.bucket_client.get_object(
+            bucket_name=request.bucket_name,
+            object_name=request.object_name,
+            offset=request.offset,
+            length=request.length,
+        )
+        try:
+            return response.data, response.headers
+        finally:
+            response.close()
+            response.release_conn()
+
+    @staticmethod
+    async def _run_read_async(
+        async_bucket_client: AsyncBucketClient,
+        request: Union[GetRequest, StatRequest],
+    ) -> Any:
+        """
+        Asynchronous counterpart of `_run_read`.
+        """
+        if isinstance(request, StatRequest):
+            return await async_bucket_client.stat_object(
+                bucket_name=request.bucket_name, object_name=request.object_name
+            )
+
+        return await async_bucket_client.get_object_with_headers(
+            bucket_name=request.bucket_name,
+            object_name=request.object_name,
+            offset=request.offset,
+            length=request.length,
+        )
+
+    def _validate_sample(self, sample: DatasetSample) -> Optional[DatasetSample]:
+        """
+        Verifies the sample's image, in the format it was stored in when known, and reads its
+        dimensions, releasing its content once checked.
+
+        Returns:
+            Optional[DatasetSample]: The sample if its image is valid, None otherwise.
+        """
+        assert sample.image_data is not None
+        if self.image_validation_level == ImageValidationLevel.HEADER:
+            # Header reads know the image's size, from the manifest or a stat
+            assert sample.image_size is not None
+            is_valid = is_image_header_valid(
+                header_data=sample.image_data,
+                object_size=sample.image_size,
+                expected_header_size=self.image_header_size,
+                expected_format=sample.image_format,
+            )
+        else:
+            is_valid = is_image_data_valid(
+                image_data=sample.image_data, expected_format=sample.image_format
+            )
+            if sample.image_size is None:
+                sample.image_size = len(sample.image_data)
+        if is_valid:
+            sample.image_width, sample.image_height = get_image_dimensions(
+                sample.image_data
+            ) or (None, None)
+        sample.image_data = None
+
+        return sample if is_valid else None
+
+    @staticmethod
+    def _add_to_annotation_batch(
+        dataset: Dataset, sample: DatasetSample
+    ) -> Optional[Tuple[str, bytes]]:
+        """
+        Packs a sample's annotation into its split's open batch, in the batched layout.
+
+        Returns:
+            Optional[Tuple[str, bytes]]: The object name and content of the batch closed by the
+                annotation, to be uploaded, or None.
+        """
+        if (
+            dataset.annotation_layout != AnnotationLayout.BATCHED
+            or dataset.dataset_format == DatasetFormat.VIRTUAL
+        ):
+            return None
+
+        assert sample.split_name is not None
+        return dataset.get_annotation_batch_writer(sample.split_name).add(
+            annotation_path=dataset.format_bucket_annotation_path(
+                annotation_file_path=sample.annotation_file_path,
+                split_name=sample.split_name,
+            ),
+            annotation=sample.annotation,
+        )
+
+    def _upload_annotation_batches(self, dataset: Dataset) -> None:
+        """
+        Uploads the open annotation batch of each split, followed by the split's index.
+        """
+        for (
+            split_name,
+            annotation_batch_writer,
+        ) in dataset.get_annotation_batch_writers().items():
+            open_batch = annotation_batch_writer.get_open_batch()
+            if open_batch is not None:
+                self._upload_dataset_object(dataset, *open_batch)
+            self._upload_dataset_object(
+                dataset,
+                dataset.get_annotation_index_path(split_name),
+                annotation_batch_writer.index.to_bytes(),
+            )
+
+    @staticmethod
+    async def _upload_annotation_batches_async(
+        async_bucket_client: AsyncBucketClient, dataset: Dataset
+    ) -> None:
+        """
+        Asynchronous counterpart of `_upload_annotation_batches`.
+        """
+        for (
+            split_name,
+            annotation_batch_writer,
+        ) in dataset.get_annotation_batch_writers().items():
+            open_batch = annotation_batch_writer.get_open_batch()
+            if open_batch is not None:
+                await async_bucket_client.upload_data(
+                    bucket_name=dataset.bucket_name,
+                    object_name=open_batch[0],
+                    data=open_batch[1],
+                )
+            await async_bucket_client.upload_data(
+                bucket_name=dataset.bucket_name,
+                object_name=dataset.get_annotation_index_path(split_name),
+                data=annotation_batch_writer.index.to_bytes(),
+            )
+
+    def _upload_dataset_object(
+        self, dataset: Dataset, object_name: str, data: bytes
+    ) -> None:
+        self.bucket_client.upload_data(
+            bucket_name=dataset.bucket_name,
+            object_name=object_name,
+            data=io.BytesIO(data),
+            length=len(data),
+        )
+
+    def _copy_sample(
+        self, source_bucket_name: str, dataset: Dataset, sample: DatasetSample
+    ) -> None:
+        """
+        Copies a sample's image into its split, server-side, and its annotation too in the
+        objects layout. An annotation batched in the data source has no object of its own, so
+        it is uploaded instead. Nothing is copied into a virtual dataset, the image's version is
+        only referenced.
+        """
+        if dataset.dataset_format == DatasetFormat.VIRTUAL:
+            self._add_to_dataset_manifest(
+                dataset, sample, source_bucket_name=source_bucket_name
+            )
+            return
+
+        copy_requests, upload_requests = self._get_sample_transfers(
+            source_bucket_name, dataset, sample
+        )
+        for upload_request in upload_requests:
+            self.bucket_client.upload_data(
+                bucket_name=upload_request.bucket_name,
+                object_name=upload_request.object_name,
+                data=upload_request.data,
+                length=upload_request.length,
+            )
+        for copy_request in copy_requests:
+            self.bucket_client.copy_object(
+                source_bucket_name=copy_request.source_bucket_name,
+                source_object_name=copy_request.source_object_name,
+                destination_bucket_name=copy_request.destination_bucket_name,
+                destination_object_name=copy_request.destination_object_name,
+            )
+        self._add_to_dataset_manifest(dataset, sample)
+
+    def _copy_carried_samples(
+        self,
+        source_bucket_name: str,
+        dataset: Dataset,
+        samples: List[DatasetSample],
+        parent_manifest: Optional[DatasetManifest] = None,
+    ) -> None:
+        """
+        Copies samples carried over from the parent dataset in bulk, through the bucket
+        client's bulk operations, which run them concurrently under its concurrency limit.
+
+        Raises:
+            Exception: The first error of the bulk operations.
+        """
+        if dataset.dataset_format == DatasetFormat.VIRTUAL:
+            self._reference_carried_samples(
+                source_bucket_name, dataset, samples, parent_manifest
+            )
+            return
+
+        copy_requests: List[CopyRequest] = []
+        upload_requests: List[UploadRequest] = []
+        for sample in samples:
+            sample_copy_requests, sample_upload_requests = self._get_sample_transfers(
+                source_bucket_name, dataset, sample
+            )
+            copy_requests.extend(sample_copy_requests)
+            upload_requests.extend(sample_upload_requests)
+
+        for result in itertools.chain(
+            self.bucket_client.upload_many(upload_requests),
+            self.bucket_client.copy_many(copy_requests),
+        ):
+            if result.error is not None:
+                raise result.error
+
+        for sample in samples:
+            self._add_to_dataset_manifest(dataset, sample)
+
+    def _reference_carried_samples(
+        self,
+        source_bucket_name: str,
+        dataset: Dataset,
+        samples: List[DatasetSample],
+        parent_manifest: Optional[DatasetManifest] = None,
+    ) -> None:
+        """
+        Records samples carried over from the parent dataset in a virtual dataset, without any
+        request. A sample whose parent entry references the same data source keeps that
+        reference, its image's content being unchanged, and the others reference the image's
+        version recorded in the data source's manifest.
+        """
+        for sample in samples:
+            parent_entry = (
+                parent_manifest.get(sample.annotation_file_path)
+                if parent_manifest is not None
+                else None
+            )
+            if (
+                parent_entry is not None
+                and parent_entry.source_bucket_name == source_bucket_name
+            ):
+                sample.image_version_id = parent_entry.image_version_id
+                sample.image_size = parent_entry.image_size
+            self._add_to_dataset_manifest(
+                dataset, sample, source_bucket_name=source_bucket_name
+            )
+
+    @staticmethod
+    def _get_sample_transfers(
+        source_bucket_name: str, dataset: Dataset, sample: DatasetSample
+    ) -> Tuple[List[CopyRequest], List[UploadRequest]]:
+        """
+        Lists the requests storing a sample into its split: the server-side copy of its image,
+        and in the objects layout, that of its annotation, or its upload when batched in the
+        data source.
+
+        Returns:
+            Tuple[List[CopyRequest], List[UploadRequest]]: The copies and uploads to run.
+        """
+        assert sample.split_name is not None
+        copy_requests = [
+            CopyRequest(
+                source_bucket_name=source_bucket_name,
+                source_object_name=sample.image_file_path,
+                destination_bucket_name=dataset.bucket_name,
+                destination_object_name=dataset.format_bucket_image_path(
+                    image_file_path=sample.image_file_path,
+                    split_name=sample.split_name,
+                    image_format=sample.image_format,
+                ),
+            )
+        ]
+        upload_requests = []
+
+        if dataset.annotation_layout == AnnotationLayout.OBJECTS:
+            annotation_object_name = dataset.format_bucket_annotation_path(
+                annotation_file_path=sample.annotation_file_path,
+                split_name=sample.split_name,
+            )
+            if sample.batched_annotation is None:
+                copy_requests.append(
+                    CopyRequest(
+                        source_bucket_name=source_bucket_name,
+                        source_object_name=sample.annotation_file_path,
+                        destination_bucket_name=dataset.bucket_name,
+                        destination_object_name=annotation_object_name,
+                    )
+                )
+            else:
+                annotation_data = json.dumps(sample.annotation).encode()
+                upload_requests.append(
+                    UploadRequest(
+                        bucket_name=dataset.bucket_name,
+                        object_name=annotation_object_name,
+                        data=io.BytesIO(annotation_data),
+                        length=len(annotation_data),
+                    )
+                )
+
+        return copy_requests, upload_requests
+
+    async def _copy_sample_async(
+        self,
+        async_bucket_client: AsyncBucketClient,
+        source_bucket_name: str,
+        dataset: Dataset,
+        sample: DatasetSample,
+    ) -> None:
+        """
+        Asynchronous counterpart of `_copy_sample`, running the sample's transfers concurrently.
+        """
+        if dataset.dataset_format == DatasetFormat.VIRTUAL:
+            self._add_to_dataset_manifest(
+                dataset, sample, source_bucket_name=source_bucket_name
+            )
+            return
+
+        copy_requests, upload_requests = self._get_sample_transfers(
+            source_bucket_name, dataset, sample
+        )
+        await asyncio.gather(
+            *(
+                async_bucket_client.upload_data(
+                    bucket_name=upload_request.bucket_name,
+                    object_name=upload_request.object_name,
+                    data=upload_request.data.read(),
+                )
+                for upload_request in upload_requests
+            ),
+            *(
+                async_bucket_client.copy_object(
+                    source_bucket_name=copy_request.source_bucket_name,
+                    source_object_name=copy_request.source_object_name,
+                    destination_bucket_name=copy_request.destination_bucket_name,
+                    destination_object_name=copy_request.destination_object_name,
+                )
+                for copy_request in copy_requests
+            ),
+        )
+        self._add_to_dataset_manifest(dataset, sample)
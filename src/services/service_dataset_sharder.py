@@ -0,0 +1,314 @@
+import io
+import json
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, Iterator, Optional, Tuple
+
+import tqdm
+
+from src.models.model_annotation_batch import (
+    AnnotationBatchIndex,
+    AnnotationLayout,
+    BatchedAnnotation,
+)
+from src.models.model_bucket_client import BucketClient
+from src.models.model_dataset import Dataset, DatasetFormat
+from src.models.model_dataset_manifest import DatasetManifest
+from src.models.model_shard_index import ShardIndex, ShardInfo
+from src.utils.shard_helper import ShardWriter
+
+
+class DatasetSharderService:
+    def __init__(
+        self,
+        bucket_client: BucketClient,
+        shard_size: int = 256 * 1024 * 1024,
+        fetch_workers: int = 16,
+        max_in_flight: int = 256,
+        temporary_path: str | None = None,
+    ):
+        """
+        Packs the splits of prepared datasets into WebDataset-style tar shards.
+
+        Args:
+            bucket_client (BucketClient): The bucket client used for bucket operations.
+            shard_size (int): Size from which a shard is closed and the next one started.
+            fetch_workers (int): Number of threads downloading the samples to pack.
+            max_in_flight (int): Maximum number of samples downloaded ahead of the shard writer.
+            temporary_path (str | None): Folder the shards are written into before their
+                upload, the system's temporary folder if None.
+        """
+        self.bucket_client = bucket_client
+        self.shard_size = shard_size
+        self.fetch_workers = max(1, fetch_workers)
+        self.max_in_flight = max(1, max_in_flight)
+        self.temporary_path = temporary_path
+
+    def write_shards(self, dataset: Dataset) -> ShardIndex:
+        """
+        Packs every split of a dataset into tar shards, followed by the shards' index, then
+        removes the splits' objects and marks the dataset as sharded. The shards hold every
+        sample, and a sharded dataset is only read from them, so keeping the objects would
+        double the dataset's storage. The dataset's manifest, split assignments and statistics
+        are kept.
+
+        Within a split, samples are packed in the bucket's listing order, or in the order of the
+        split's annotation index in the batched layout. Each sample is keyed by its annotation's
+        file name, with its annotation stored as `{key}.json` and its image as
+        `{key}.{image extension}`, the extension of the format the image was stored in.
+
+        Args:
+            dataset (Dataset): The prepared dataset to pack.
+
+        Returns:
+            ShardIndex: The index of the uploaded shards.
+        """
+        shard_index = ShardIndex(shard_size=self.shard_size)
+        image_formats = self._get_image_formats(dataset)
+
+        with tempfile.TemporaryDirectory(
+            dir=self.temporary_path
+        ) as temporary_directory, ThreadPoolExecutor(
+            max_workers=self.fetch_workers, thread_name_prefix="fetch"
+        ) as fetch_executor, ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="upload"
+        ) as upload_executor:
+            for split_name in dataset.split_names:
+                self._write_split_shards(
+                    dataset=dataset,
+                    split_name=split_name,
+                    shard_index=shard_index,
+                    image_formats=image_formats,
+                    directory=temporary_directory,
+                    fetch_executor=fetch_executor,
+                    upload_executor=upload_executor,
+                )
+
+        shard_index_data = shard_index.to_bytes()
+        self.bucket_client.upload_data(
+            bucket_name=dataset.bucket_name,
+            object_name=dataset.get_shard_index_path(),
+            data=io.BytesIO(shard_index_data),
+            length=len(shard_index_data),
+        )
+        self._remove_split_objects(dataset)
+        dataset.dataset_format = DatasetFormat.SHARDS
+
+        return shard_index
+
+    def _write_split_shards(
+        self,
+        dataset: Dataset,
+        split_name: str,
+        shard_index: ShardIndex,
+        image_formats: Dict[str, Optional[str]],
+        directory: str,
+        fetch_executor: ThreadPoolExecutor,
+        upload_executor: ThreadPoolExecutor,
+    ) -> None:
+        """
+        Packs a split into shards. Samples are downloaded concurrently but written in listing
+        order, and each closed shard is uploaded while the next one is being written.
+        """
+        pending_samples: Deque[Future] = deque()
+        pending_uploads: Deque[Future] = deque()
+
+        def _on_shard_complete(
+            file_path: str, shard_number: int, number_of_samples: int
+        ) -> None:
+            # Only one shard is uploaded at a time, so that at most two are kept on disk
+            while pending_uploads:
+                shard_index.add_shard(split_name, pending_uploads.popleft().result())
+
+            pending_uploads.append(
+                upload_executor.submit(
+                    self._upload_shard,
+                    dataset,
+                    dataset.format_bucket_shard_path(
+                        split_name=split_name, shard_number=shard_number
+                    ),
+                    file_path,
+                    number_of_samples,
+                )
+            )
+
+        with ShardWriter(
+            directory=directory,
+            shard_name_pattern=f"{split_name}-{{:06d}}.tar",
+            max_shard_size=self.shard_size,
+            on_shard_complete=_on_shard_complete,
+        ) as shard_writer:
+            try:
+                for annotation_file_path, batched_annotation in tqdm.tqdm(
+                    self._list_annotations(dataset, split_name),
+                    desc=f"Packing {split_name}",
+                ):
+                    pending_samples.append(
+                        fetch_executor.submit(
+                            self._fetch_sample,
+                            dataset,
+                            split_name,
+                            annotation_file_path,
+                            batched_annotation,
+                            image_formats.get(annotation_file_path),
+                        )
+                    )
+
+                    if len(pending_samples) >= self.max_in_flight:
+                        shard_writer.write_sample(*pending_samples.popleft().result())
+
+                while pending_samples:
+                    shard_writer.write_sample(*pending_samples.popleft().result())
+            except BaseException:
+                for future in pending_samples:
+                    future.cancel()
+                raise
+
+        while pending_uploads:
+            shard_index.add_shard(split_name, pending_uploads.popleft().result())
+
+    def _get_image_formats(self, dataset: Dataset) -> Dict[str, Optional[str]]:
+        """
+        Gets the format each image was stored in, by the object name of its annotation in the
+        dataset, from the dataset's manifest, downloaded if the dataset was not just prepared.
+        """
+        manifest = (
+            dataset.manifest
+            if len(dataset.manifest)
+            else DatasetManifest.download(
+                bucket_client=self.bucket_client,
+                bucket_name=dataset.bucket_name,
+                dataset_uuid=dataset.uuid,
+            )
+        )
+        return {
+            dataset.format_bucket_annotation_path(
+                annotation_file_path=entry.annotation_file_path,
+                split_name=entry.split_name,
+            ): entry.image_format
+            for entry in manifest or []
+        }
+
+    def _list_annotations(
+        self, dataset: Dataset, split_name: str
+    ) -> Iterator[Tuple[str, Optional[BatchedAnnotation]]]:
+        """
+        Lists the annotations of a split, from the split's annotation index in the batched
+        layout, or from the bucket's listing otherwise.
+        """
+        if dataset.annotation_layout == AnnotationLayout.BATCHED:
+            annotation_index = AnnotationBatchIndex.download(
+                bucket_client=self.bucket_client,
+                bucket_name=dataset.bucket_name,
+                folder_name=dataset.get_split_folder_path(split_name),
+            )
+            for batched_annotation in annotation_index or []:
+                yield batched_annotation.annotation_path, batched_annotation
+            return
+
+        for annotation_bucket_object in self.bucket_client.list_objects(
+            bucket_name=dataset.bucket_name,
+            prefix=f"{dataset.uuid}/{split_name}/{dataset.annotations_path}/",
+        ):
+            yield annotation_bucket_object.object_name, None
+
+    def _fetch_sample(
+        self,
+        dataset: Dataset,
+        split_name: str,
+        annotation_file_path: str,
+        batched_annotation: Optional[BatchedAnnotation] = None,
+        image_format: Optional[str] = None,
+    ) -> Tuple[str, Dict[str, bytes]]:
+        """
+        Downloads an annotation of the dataset and the image it references, named after the
+        format it was stored in when known. A batched annotation is read from its batch with a
+        ranged request.
+
+        Returns:
+            Tuple[str, Dict[str, bytes]]: The sample's key and its files' content by extension.
+        """
+        if batched_annotation is not None:
+            annotation_data = batched_annotation.decode(
+                self._get_object_data(
+                    dataset.bucket_name,
+                    batched_annotation.batch_object_name,
+                    offset=batched_annotation.offset,
+                    length=batched_annotation.length,
+                )
+            )
+        else:
+            annotation_data = self._get_object_data(
+                dataset.bucket_name, annotation_file_path
+            )
+        image_object_name = dataset.format_bucket_image_path(
+            image_file_path=json.loads(annotation_data)["image_path"],
+            split_name=split_name,
+            image_format=image_format,
+        )
+        image_data = self._get_object_data(dataset.bucket_name, image_object_name)
+
+        key = annotation_file_path.split("/")[-1].rpartition(".")[0]
+        image_extension = image_object_name.rpartition(".")[2].lower()
+        return key, {"json": annotation_data, image_extension: image_data}
+
+    def _get_object_data(
+        self, bucket_name: str, object_name: str, offset: int = 0, length: int = 0
+    ) -> bytes:
+        response = self.bucket_client.get_object(
+            bucket_name=bucket_name,
+            object_name=object_name,
+            offset=offset,
+            length=length,
+        )
+        try:
+            return response.data
+        finally:
+            response.close()
+            response.release_conn()
+
+    def _remove_split_objects(self, dataset: Dataset) -> None:
+        """
+        Removes the objects of a dataset's splits, i.e. its images and annotations, once packed.
+        """
+        for split_name in dataset.split_names:
+            self.bucket_client.remove_objects(
+                bucket_name=dataset.bucket_name,
+                object_names=[
+                    bucket_object.object_name
+                    for bucket_object in self.bucket_client.list_objects(
+                        bucket_name=dataset.bucket_name,
+                        prefix=f"{dataset.get_split_folder_path(split_name)}/",
+                        recursive=True,
+                    )
+                ],
+            )
+
+    def _upload_shard(
+        self,
+        dataset: Dataset,
+        object_name: str,
+        file_path: str,
+        number_of_samples: int,
+    ) -> ShardInfo:
+        """
+        Uploads a closed shard, then removes it from the disk.
+        """
+        try:
+            size = os.path.getsize(file_path)
+            sha256, _ = self.bucket_client.upload_file(
+                bucket_name=dataset.bucket_name,
+                object_name=object_name,
+                file_path=file_path,
+            )
+        finally:
+            os.remove(file_path)
+
+        return ShardInfo(
+            object_name=object_name,
+            size=size,
+            number_of_samples=number_of_samples,
+            sha256=sha256,
+        )
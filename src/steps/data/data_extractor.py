@@ -1,13 +1,68 @@
 from zenml import step
+from zenml.logger import get_logger
 
+from src.models.model_annotation_batch import AnnotationLayout
 from src.models.model_bucket_client import BucketClient
-from src.models.model_dataset import Dataset
+from src.models.model_dataset import Dataset, DatasetFormat
+from src.models.model_yolo_export import YoloLabelWriter
 
 
 @step(name="Extract the data from the bucket client")
 def data_extractor(
-    dataset: Dataset, bucket_client: BucketClient, destination_path: str = "datasets/"
+    dataset: Dataset,
+    bucket_client: BucketClient,
+    destination_path: str = "datasets/",
+    unpack_shards: bool = True,
+    unpack_annotation_batches: bool = True,
+    export_yolo: bool = False,
 ) -> None:
-    dataset.download(
-        bucket_client=bucket_client, destination_root_path=destination_path
+    """
+    Downloads the dataset. A sharded dataset is downloaded as its shards, which are then
+    unpacked into one file per image and annotation, unless `unpack_shards` is False. Likewise,
+    batched annotations are unpacked into one file per annotation, unless
+    `unpack_annotation_batches` is False.
+
+    With `export_yolo`, the annotations are also converted into YOLO label files as they are
+    downloaded, and a `data.yaml` describing the splits is written, so that the dataset can be
+    trained on by Ultralytics as soon as it is extracted.
+    """
+    logger = get_logger(__name__)
+
+    yolo_label_writer = (
+        YoloLabelWriter(dataset=dataset, destination_root_path=destination_path)
+        if export_yolo
+        else None
+    )
+
+    transfer_stats = dataset.download(
+        bucket_client=bucket_client,
+        destination_root_path=destination_path,
+        on_object_downloaded=yolo_label_writer.add_downloaded_object
+        if yolo_label_writer is not None
+        else None,
     )
+    logger.info(f"Downloaded the dataset {dataset.uuid}: {transfer_stats}")
+
+    if dataset.dataset_format == DatasetFormat.SHARDS and unpack_shards:
+        number_of_samples = dataset.unpack_shards(
+            destination_root_path=destination_path
+        )
+        logger.info(f"Unpacked {number_of_samples} samples from the dataset's shards")
+    elif (
+        dataset.dataset_format == DatasetFormat.OBJECTS
+        and dataset.annotation_layout == AnnotationLayout.BATCHED
+        and unpack_annotation_batches
+    ):
+        number_of_annotations = dataset.unpack_annotation_batches(
+            destination_root_path=destination_path
+        )
+        logger.info(
+            f"Unpacked {number_of_annotations} annotations from the dataset's batches"
+        )
+
+    if yolo_label_writer is not None:
+        data_file_path = yolo_label_writer.close()
+        logger.info(
+            f"Exported {yolo_label_writer.number_of_label_files} YOLO label files,"
+            f" described by {data_file_path}"
+        )
@@ -2,12 +2,25 @@ from zenml import step
 from zenml.logger import get_logger
 
 from src.config.settings import (
+    ANNOTATION_BATCH_COMPRESSION,
+    ANNOTATION_BATCH_SIZE,
+    DATA_SOURCE_ANNOTATION_LAYOUT,
+    DATA_UPLOAD_JOURNAL_PATH,
+    HUGGINGFACE_ENCODE_WORKERS,
+    LOCAL_SYNC_DELETE_REMOVED,
+    LOCAL_SYNC_SCAN_WORKERS,
+    LOCAL_SYNC_VERIFY_CHECKSUMS,
     MINIO_DATA_SOURCES_BUCKET_NAME,
 )
+from src.models.model_annotation_batch import AnnotationLayout
 from src.models.model_bucket_client import BucketClient
 from src.models.model_data_source import DataSource, DataSourceList
+from src.models.model_upload_journal import UploadJournal
 from src.services.service_data_uploader import DataUploaderService
-from src.steps.data.datalake_initializers import validate_bucket_connection
+from src.steps.data.datalake_initializers import (
+    create_async_minio_client,
+    validate_bucket_connection,
+)
 
 
 def get_data_sources_bucket_name() -> str:
@@ -42,10 +55,18 @@ def upload_data(
     """
     logger = get_logger(__name__)
 
+    if data_uploader_service.upload_journal is not None:
+        for upload_run in data_uploader_service.upload_journal.get_runs(
+            data_source.name
+        )[:1]:
+            if not upload_run.is_finished:
+                logger.info(f"Resuming the interrupted upload: {upload_run}")
+
     try:
-        data_uploader_service.upload_data(
+        transfer_stats = data_uploader_service.upload_data(
             bucket_name=bucket_name, data_source=data_source
         )
+        logger.info(f"Uploaded data source {data_source.name}: {transfer_stats}")
     except TypeError:
         logger.error(
             f"Couldn't upload the data source, type {type(data_source).__name__} is not supported."
@@ -55,13 +76,44 @@ def upload_data(
 
 @step(name="Prepare data sources")
 def data_sources_uploader(
-    bucket_client: BucketClient, data_source_list: DataSourceList
+    bucket_client: BucketClient,
+    data_source_list: DataSourceList,
+    use_async: bool = False,
+    max_in_flight: int = 256,
+    encode_workers: int = HUGGINGFACE_ENCODE_WORKERS,
+    scan_workers: int = LOCAL_SYNC_SCAN_WORKERS,
+    delete_removed: bool = LOCAL_SYNC_DELETE_REMOVED,
+    verify_checksums: bool = LOCAL_SYNC_VERIFY_CHECKSUMS,
+    journal_path: str = DATA_UPLOAD_JOURNAL_PATH,
+    annotation_layout: str = DATA_SOURCE_ANNOTATION_LAYOUT,
+    annotation_batch_size: int = ANNOTATION_BATCH_SIZE,
+    compress_annotations: bool = ANNOTATION_BATCH_COMPRESSION,
 ) -> None:
     """
     Flow for preparing data sources, which includes validating the data path, checking the bucket connection,
     configuring the bucket, and uploading the data.
+    With `use_async`, the uploads run on an event loop with an async MinIO client.
+    `max_in_flight` bounds the number of rows held in memory while they are uploaded, and
+    `encode_workers` processes encode and hash the images, so that encoding scales with cores.
+    Local data sources are synced incrementally: only new or changed files are uploaded, and
+    with `delete_removed` the objects of deleted files are removed from the bucket. With a
+    `journal_path`, an upload interrupted by a crash resumes where it stopped on the next run.
+    In the "batched" `annotation_layout`, annotations are packed into JSON lines batches of
+    `annotation_batch_size` bytes, optionally compressed, rather than uploaded one by one.
     """
-    data_uploader_service = DataUploaderService(bucket_client)
+    data_uploader_service = DataUploaderService(
+        bucket_client,
+        async_bucket_client=create_async_minio_client() if use_async else None,
+        max_in_flight=max_in_flight,
+        encode_workers=encode_workers,
+        scan_workers=scan_workers,
+        delete_removed=delete_removed,
+        verify_checksums=verify_checksums,
+        upload_journal=UploadJournal(journal_path) if journal_path else None,
+        annotation_layout=AnnotationLayout(annotation_layout),
+        annotation_batch_size=annotation_batch_size,
+        compress_annotations=compress_annotations,
+    )
     validate_bucket_connection(bucket_client=bucket_client)
 
     for data_source in data_source_list.data_sources:
@@ -72,3 +124,27 @@ def data_sources_uploader(
             bucket_name=get_data_sources_bucket_name(),
             data_source=data_source,
         )
+
+
+@step(name="Inspect the upload journal")
+def upload_journal_inspector(
+    journal_path: str = DATA_UPLOAD_JOURNAL_PATH,
+    data_source_name: str | None = None,
+) -> list[dict]:
+    """
+    Logs the progress of the uploads recorded in the upload journal, most recent first.
+
+    Returns:
+        list[dict]: The upload runs, with the number and size of the items they completed.
+    """
+    logger = get_logger(__name__)
+
+    upload_journal = UploadJournal(journal_path)
+    try:
+        upload_runs = upload_journal.get_runs(data_source_name)
+    finally:
+        upload_journal.close()
+
+    for upload_run in upload_runs:
+        logger.info(str(upload_run))
+    return [upload_run.to_dict() for upload_run in upload_runs]
@@ -1,9 +1,23 @@
 import io
-from typing import Any
+import json
+import logging
+from enum import Enum
+from typing import Any, Optional, Tuple
 
 import urllib3
 from PIL import Image
 
+from src.models.model_annotation_batch import BatchedAnnotation
+
+logger = logging.getLogger(__name__)
+
+
+class ImageValidationLevel(str, Enum):
+    # Parse the image's header from a ranged read, and check its size against the bucket
+    HEADER = "header"
+    # Download and verify the whole image
+    FULL = "full"
+
 
 def is_annotation_file_valid(json_data: Any) -> bool:
     """
@@ -40,8 +54,44 @@ def is_annotation_file_valid(json_data: Any) -> bool:
     return True
 
 
+def get_json_data_from_bytes_if_valid(
+    annotation_data: bytes,
+    object_url: Optional[str],
+    batched_annotation: Optional[BatchedAnnotation] = None,
+) -> Optional[dict]:
+    """
+    Decodes the raw content of an annotation file and returns it if it is a valid annotation.
+
+    Args:
+        annotation_data (bytes): The raw content of the annotation file, or the annotation's
+            record read from its batch.
+        object_url (Optional[str]): The annotation's location, used in error messages.
+        batched_annotation (Optional[BatchedAnnotation]): The annotation's location within
+            its batch, if `annotation_data` is a batched record.
+
+    Returns:
+        Optional[dict]: The annotation's content if valid, None otherwise.
+    """
+    try:
+        if batched_annotation is not None:
+            annotation_data = batched_annotation.decode(annotation_data)
+        json_data = json.loads(annotation_data.decode("utf-8"))
+
+        if is_annotation_file_valid(json_data=json_data):
+            return json_data
+        else:
+            return None
+    except json.JSONDecodeError:
+        logger.error(f"Invalid .json format for object {object_url}")
+        return None
+    except Exception as e:
+        logger.error(f"Error while decoding object {object_url}: {e}")
+        return None
+
+
 def is_image_file_valid(
     image_file_bucket_response: urllib3.response.HTTPResponse,
+    expected_format: Optional[str] = None,
 ) -> bool:
     """
     Validates if the provided image file is a valid image.
@@ -53,14 +103,106 @@ def is_image_file_valid(
     Args:
         image_file_bucket_response (urllib3.response.HTTPResponse):
             The HTTP response object containing the image data.
+        expected_format (Optional[str]): The format the image was stored in, e.g. "jpeg".
 
     Returns:
         bool: True if the image file is valid, False otherwise.
     """
+    return is_image_data_valid(
+        image_data=image_file_bucket_response.data, expected_format=expected_format
+    )
+
+
+def is_image_data_valid(
+    image_data: bytes, expected_format: Optional[str] = None
+) -> bool:
+    """
+    Validates if the provided bytes hold a valid image, in the expected format if any.
+
+    Args:
+        image_data (bytes): The raw content of the image file.
+        expected_format (Optional[str]): The format the image was stored in, e.g. "jpeg".
+
+    Returns:
+        bool: True if the image data is valid, False otherwise.
+    """
     try:
-        image_data = io.BytesIO(image_file_bucket_response.data)
-        with Image.open(image_data) as img:
+        with Image.open(io.BytesIO(image_data)) as img:
+            if not is_image_format_expected(img.format, expected_format):
+                return False
             img.verify()
         return True
     except Exception:
         return False
+
+
+def is_image_header_valid(
+    header_data: bytes,
+    object_size: int,
+    expected_header_size: int,
+    expected_format: Optional[str] = None,
+) -> bool:
+    """
+    Validates an image from the first bytes of its file.
+
+    This function checks that the header read matches the object's size in the bucket and
+    that PIL can identify the image's format and dimensions from it, the format being the one
+    the image was stored in when known. The pixel data is not decoded, so a file truncated
+    after its header is not detected.
+
+    Args:
+        header_data (bytes): The first bytes of the image file.
+        object_size (int): The size of the image object, as reported by the bucket.
+        expected_header_size (int): The number of bytes requested for the header.
+        expected_format (Optional[str]): The format the image was stored in, e.g. "jpeg".
+
+    Returns:
+        bool: True if the image's header is valid, False otherwise.
+    """
+    if object_size <= 0 or len(header_data) != min(expected_header_size, object_size):
+        return False
+
+    try:
+        with Image.open(io.BytesIO(header_data)) as img:
+            if not is_image_format_expected(img.format, expected_format):
+                return False
+            width, height = img.size
+        return width > 0 and height > 0
+    except Exception:
+        return False
+
+
+def get_image_dimensions(image_data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Reads an image's dimensions from its file, or from its header only.
+
+    Args:
+        image_data (bytes): The raw content of the image file, or its first bytes.
+
+    Returns:
+        Optional[Tuple[int, int]]: The image's width and height, or None if PIL cannot
+            identify them.
+    """
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def is_image_format_expected(
+    image_format: Optional[str], expected_format: Optional[str]
+) -> bool:
+    """
+    Checks an image's format, as PIL identified it, against the format it was stored in.
+
+    Args:
+        image_format (Optional[str]): The image's format, e.g. "JPEG".
+        expected_format (Optional[str]): The format the image was stored in, None if unknown.
+
+    Returns:
+        bool: True if the formats match or the expected one is unknown, False otherwise.
+    """
+    if expected_format is None:
+        return True
+    return (image_format or "").lower() == expected_format.lower()
@@ -1,21 +1,39 @@
+import os
 from typing import List
 
 from zenml import step
 from zenml.logger import get_logger
 
 from src.config.settings import (
+    FILESYSTEM_BUCKETS_ROOT_PATH,
+    HUGGINGFACE_DATASETS_PATH,
+    HUGGINGFACE_IMAGE_FORMAT,
+    HUGGINGFACE_IMAGE_MAX_SIDE,
+    HUGGINGFACE_IMAGE_QUALITY,
+    HUGGINGFACE_STREAMING,
+    MINIO_ADAPTIVE_CONCURRENCY,
+    MINIO_ASYNC_MAX_CONNECTIONS,
+    MINIO_DATA_SOURCES_BUCKET_NAME,
+    MINIO_DATASETS_BUCKET_NAME,
     MINIO_ENDPOINT,
-    MINIO_ROOT_USER,
-    MINIO_ROOT_PASSWORD,
+    MINIO_MAX_BYTES_PER_SECOND,
+    MINIO_MAX_WORKERS,
+    MINIO_MIN_CONCURRENCY,
+    MINIO_PARALLEL_PART_UPLOADS,
+    MINIO_PART_SIZE,
     MINIO_PENDING_ANNOTATIONS_BUCKET_NAME,
     MINIO_PENDING_REVIEWS_BUCKET_NAME,
-    MINIO_DATA_SOURCES_BUCKET_NAME,
-    MINIO_DATASETS_BUCKET_NAME,
+    MINIO_ROOT_PASSWORD,
+    MINIO_ROOT_USER,
 )
 from src.materializers.materializer_bucket_client import BucketClientMaterializer
 from src.materializers.materializer_data_source import DataSourceMaterializer
+from src.models.model_async_bucket_client import AsyncMinioClient
 from src.models.model_bucket_client import BucketClient, MinioClient
-from src.models.model_data_source import HuggingFaceDataSource, DataSourceList
+from src.models.model_concurrency_controller import AsyncConcurrencyController
+from src.models.model_data_source import DataSourceList, HuggingFaceDataSource
+from src.models.model_filesystem_bucket_client import FilesystemBucketClient
+from src.models.model_image_transcoding import ImageFormat, ImageTranscodingPolicy
 
 
 @step(name="Validate connection to bucket client")
@@ -71,9 +89,55 @@ def minio_client_initializer() -> MinioClient:
         access_key=MINIO_ROOT_USER,
         secret_key=MINIO_ROOT_PASSWORD,
         secure=False,
+        max_workers=MINIO_MAX_WORKERS,
+        part_size=MINIO_PART_SIZE,
+        parallel_part_uploads=MINIO_PARALLEL_PART_UPLOADS,
+        adaptive_concurrency=MINIO_ADAPTIVE_CONCURRENCY,
+        min_concurrency=MINIO_MIN_CONCURRENCY,
+        max_bytes_per_second=MINIO_MAX_BYTES_PER_SECOND or None,
     )
 
 
+def create_async_minio_client() -> AsyncMinioClient:
+    """
+    Create an asynchronous MinIO client from the configuration. Async clients are bound to an
+    event loop, so they are created within the steps using them rather than passed as artifacts.
+    """
+    return AsyncMinioClient(
+        endpoint=MINIO_ENDPOINT,
+        access_key=MINIO_ROOT_USER,
+        secret_key=MINIO_ROOT_PASSWORD,
+        secure=False,
+        max_connections=MINIO_ASYNC_MAX_CONNECTIONS,
+        concurrency_controller=AsyncConcurrencyController(
+            initial_limit=max(MINIO_MIN_CONCURRENCY, MINIO_ASYNC_MAX_CONNECTIONS // 2),
+            min_limit=MINIO_MIN_CONCURRENCY,
+            max_limit=MINIO_ASYNC_MAX_CONNECTIONS,
+            max_bytes_per_second=MINIO_MAX_BYTES_PER_SECOND or None,
+        )
+        if MINIO_ADAPTIVE_CONCURRENCY or MINIO_MAX_BYTES_PER_SECOND
+        else None,
+    )
+
+
+@step(
+    name="Initialize a filesystem bucket client",
+    output_materializers=BucketClientMaterializer,
+)
+def filesystem_client_initializer(
+    root_path: str = FILESYSTEM_BUCKETS_ROOT_PATH,
+) -> FilesystemBucketClient:
+    """
+    Initialize a bucket client storing the buckets in a local folder, for co-located or
+    network-free runs.
+
+    Args:
+        root_path (str): The folder holding the buckets.
+    """
+    os.makedirs(root_path, exist_ok=True)
+    return FilesystemBucketClient(root_path=root_path)
+
+
 @step(name="Retrieve bucket names")
 def bucket_name_list_initializer() -> List[str]:
     """
@@ -95,10 +159,30 @@ def data_source_list_initializer() -> DataSourceList:
     """
     Retrieve a list of DataSource. Those DataSource will then be imported into the Datalake.
 
+    HuggingFace datasets are streamed with `HUGGINGFACE_STREAMING`, and loaded from their copy
+    under `HUGGINGFACE_DATASETS_PATH` when it is set. Their images are stored as the
+    `HUGGINGFACE_IMAGE_*` settings require.
+
     Returns:
         DataSourceList: A list of DataSource.
     """
-    return DataSourceList([HuggingFaceDataSource("kili-technology/plastic_in_river")])
+    dataset_name = "kili-technology/plastic_in_river"
+    return DataSourceList(
+        [
+            HuggingFaceDataSource(
+                dataset_name,
+                streaming=HUGGINGFACE_STREAMING,
+                local_path=os.path.join(HUGGINGFACE_DATASETS_PATH, dataset_name)
+                if HUGGINGFACE_DATASETS_PATH
+                else None,
+                image_transcoding=ImageTranscodingPolicy(
+                    image_format=ImageFormat(HUGGINGFACE_IMAGE_FORMAT),
+                    quality=HUGGINGFACE_IMAGE_QUALITY,
+                    max_side=HUGGINGFACE_IMAGE_MAX_SIDE,
+                ),
+            )
+        ]
+    )
 
 
 @step(name="Initialize the datalake")
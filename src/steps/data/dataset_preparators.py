@@ -1,21 +1,37 @@
-import json
 from typing import Optional
 
-import tqdm
-import urllib3
 from zenml import step
 from zenml.logger import get_logger
 
 from src.config.settings import (
+    ANNOTATION_BATCH_COMPRESSION,
+    ANNOTATION_BATCH_SIZE,
+    DATASET_ANNOTATION_LAYOUT,
+    DATASET_FORMAT,
+    DATASET_PREPARATION_COPY_WORKERS,
+    DATASET_PREPARATION_FETCH_WORKERS,
+    DATASET_PREPARATION_IMAGE_HEADER_SIZE,
+    DATASET_PREPARATION_IMAGE_VALIDATION_LEVEL,
+    DATASET_PREPARATION_MAX_IN_FLIGHT,
+    DATASET_PREPARATION_VALIDATE_WORKERS,
+    DATASET_SHARD_SIZE,
+    DATASET_SPLIT_STRATEGY,
     MINIO_DATA_SOURCES_BUCKET_NAME,
     MINIO_DATASETS_BUCKET_NAME,
 )
 from src.materializers.materializer_dataset import DatasetMaterializer
+from src.models.model_annotation_batch import AnnotationLayout
 from src.models.model_bucket_client import BucketClient
 from src.models.model_data_source import DataSource, DataSourceList
-from src.models.model_dataset import Dataset
-from src.steps.data.data_validators import is_annotation_file_valid, is_image_file_valid
-from src.steps.data.datalake_initializers import validate_bucket_connection
+from src.models.model_dataset import Dataset, DatasetFormat, SplitStrategy
+from src.models.model_dataset_manifest import DatasetManifest
+from src.services.service_dataset_preparator import DatasetPreparatorService
+from src.services.service_dataset_sharder import DatasetSharderService
+from src.steps.data.data_validators import ImageValidationLevel
+from src.steps.data.datalake_initializers import (
+    create_async_minio_client,
+    validate_bucket_connection,
+)
 
 
 def get_data_sources_bucket_name() -> str:
@@ -32,130 +48,203 @@ def get_dataset_bucket_name() -> str:
     return MINIO_DATASETS_BUCKET_NAME
 
 
-def get_json_data_if_valid(
-    annotation_file_bucket_response: urllib3.response.HTTPResponse,
-) -> Optional[dict]:
-    logger = get_logger(__name__)
+def has_annotation_index(bucket_client: BucketClient, dataset: Dataset) -> bool:
+    """
+    Checks if any split of the dataset has an annotation index, i.e. if its annotations are
+    batched.
+    """
+    for split_name in dataset.split_names:
+        for _ in bucket_client.list_objects(
+            bucket_name=dataset.bucket_name,
+            prefix=dataset.get_annotation_index_path(split_name),
+        ):
+            return True
+    return False
 
-    try:
-        urllib3.response.HTTPResponse()
-        json_data = json.loads(annotation_file_bucket_response.data.decode("utf-8"))
-
-        if is_annotation_file_valid(json_data=json_data):
-            return json_data
-        else:
-            return None
-    except json.JSONDecodeError:
-        logger.error(
-            "Invalid .json format for object"
-            f" {annotation_file_bucket_response.geturl()}"
+
+def get_parent_dataset_manifest(
+    bucket_client: BucketClient, parent_dataset_uuid: str
+) -> DatasetManifest:
+    """
+    Downloads the manifest of the dataset a new dataset is incrementally prepared from.
+    """
+    if not bucket_client.folder_exists(
+        bucket_name=get_dataset_bucket_name(), folder_name=parent_dataset_uuid
+    ):
+        raise NotADirectoryError(
+            f"The provided parent dataset's name {parent_dataset_uuid} does not exist."
         )
-        return None
-    except Exception as e:
-        logger.error(
-            "Error while decoding object"
-            f" {annotation_file_bucket_response.geturl()}: {e}"
+
+    parent_manifest = DatasetManifest.download(
+        bucket_client=bucket_client,
+        bucket_name=get_dataset_bucket_name(),
+        dataset_uuid=parent_dataset_uuid,
+    )
+    if parent_manifest is None:
+        raise FileNotFoundError(
+            f"The parent dataset {parent_dataset_uuid} has no manifest, it was prepared"
+            " before datasets recorded their samples and cannot be built upon."
         )
-        return None
+    return parent_manifest
 
 
-def copy_object(
-    bucket_client: BucketClient,
-    source_bucket_name,
-    source_object_name: str,
-    destination_bucket_name: str,
-    destination_object_name: str,
-) -> None:
-    bucket_client.copy_object(
-        source_bucket_name=source_bucket_name,
-        source_object_name=source_object_name,
-        destination_bucket_name=destination_bucket_name,
-        destination_object_name=destination_object_name,
+def is_virtual_dataset(bucket_client: BucketClient, dataset: Dataset) -> bool:
+    """
+    Checks if the dataset is virtual, i.e. if it has a manifest but none of its splits'
+    objects. A dataset without a manifest predates them, and is never virtual.
+    """
+    manifest_object_name = DatasetManifest.get_manifest_object_name(dataset.uuid)
+    has_manifest = any(
+        obj.object_name == manifest_object_name
+        for obj in bucket_client.list_objects(
+            bucket_name=dataset.bucket_name, prefix=manifest_object_name
+        )
+    )
+    return has_manifest and not any(
+        bucket_client.folder_exists(
+            bucket_name=dataset.bucket_name,
+            folder_name=dataset.get_split_folder_path(split_name),
+        )
+        for split_name in dataset.split_names
     )
 
 
 @step(name="Prepare the dataset inside the bucket")
 def prepare_dataset(
-    bucket_client: BucketClient,
+    dataset_preparator_service: DatasetPreparatorService,
     source_bucket_name: str,
     dataset: Dataset,
     data_source: DataSource,
-):
+    parent_manifest: Optional[DatasetManifest] = None,
+) -> None:
+    """
+    Copies the valid samples of a data source into the dataset, carrying over those of the
+    parent dataset when given its manifest.
+    """
     logger = get_logger(__name__)
-    data_source_bucket_annotation_path = f"{data_source.name}/annotations/"
 
-    for annotation_bucket_object in tqdm.tqdm(
-        bucket_client.list_objects(
-            bucket_name=source_bucket_name,
-            prefix=data_source_bucket_annotation_path,
+    try:
+        number_of_samples = dataset_preparator_service.prepare_dataset(
+            source_bucket_name=source_bucket_name,
+            dataset=dataset,
+            data_source=data_source,
+            parent_manifest=parent_manifest,
         )
-    ):
-        try:
-            annotation_file_path = annotation_bucket_object.object_name
-
-            if annotation_file_path.lower().endswith(".json"):
-                annotation_file_bucket_response = bucket_client.get_object(
-                    bucket_name=source_bucket_name,
-                    object_name=annotation_bucket_object.object_name,
-                )
-
-                if annotation_json_data := get_json_data_if_valid(
-                    annotation_file_bucket_response=annotation_file_bucket_response
-                ):
-                    image_file_path = annotation_json_data["image_path"]
-
-                    image_file_bucket_response = bucket_client.get_object(
-                        bucket_name=source_bucket_name, object_name=image_file_path
-                    )
-
-                    if is_image_file_valid(
-                        image_file_bucket_response=image_file_bucket_response
-                    ):
-                        split_name = dataset.get_next_split()
-                        copy_object(
-                            bucket_client=bucket_client,
-                            source_bucket_name=source_bucket_name,
-                            source_object_name=annotation_file_path,
-                            destination_bucket_name=dataset.bucket_name,
-                            destination_object_name=dataset.format_bucket_annotation_path(
-                                annotation_file_path=annotation_file_path,
-                                split_name=split_name,
-                            ),
-                        )
-                        copy_object(
-                            bucket_client=bucket_client,
-                            source_bucket_name=source_bucket_name,
-                            source_object_name=image_file_path,
-                            destination_bucket_name=dataset.bucket_name,
-                            destination_object_name=dataset.format_bucket_image_path(
-                                image_file_path=image_file_path, split_name=split_name
-                            ),
-                        )
-        except Exception as e:
-            logger.error(f"Error while retrieving bucket object: {e}")
-            raise
-        finally:
-            annotation_file_bucket_response.close()
-            annotation_file_bucket_response.release_conn()
-
-            image_file_bucket_response.close()
-            image_file_bucket_response.release_conn()
+    except Exception as e:
+        logger.error(f"Error while retrieving bucket object: {e}")
+        raise
+
+    logger.info(
+        f"Copied {number_of_samples} samples from the data source {data_source.name}"
+    )
+    logger.info(
+        "Dataset splits: "
+        + ", ".join(
+            f"{split_name} {split_statistics['number_of_samples']} samples"
+            f" / {split_statistics['number_of_boxes']} boxes"
+            for split_name, split_statistics in dataset.statistics.to_dict()[
+                "splits"
+            ].items()
+        )
+    )
+
+
+@step(name="Pack the dataset into shards")
+def shard_dataset(
+    dataset_sharder_service: DatasetSharderService, dataset: Dataset
+) -> None:
+    """
+    Packs the splits of the dataset into tar shards.
+    """
+    logger = get_logger(__name__)
+
+    try:
+        shard_index = dataset_sharder_service.write_shards(dataset=dataset)
+    except Exception as e:
+        logger.error(f"Error while packing the dataset {dataset.uuid}: {e}")
+        raise
+
+    logger.info(
+        f"Packed {shard_index.get_number_of_samples()} samples into"
+        f" {sum(len(shards) for shards in shard_index.splits.values())} shards"
+    )
 
 
 @step(name="Create dataset", output_materializers=DatasetMaterializer)
 def dataset_creator(
-    bucket_client: BucketClient, data_source_list: DataSourceList
+    bucket_client: BucketClient,
+    data_source_list: DataSourceList,
+    fetch_workers: int = DATASET_PREPARATION_FETCH_WORKERS,
+    validate_workers: int = DATASET_PREPARATION_VALIDATE_WORKERS,
+    copy_workers: int = DATASET_PREPARATION_COPY_WORKERS,
+    max_in_flight: int = DATASET_PREPARATION_MAX_IN_FLIGHT,
+    use_async: bool = False,
+    image_validation_level: str = DATASET_PREPARATION_IMAGE_VALIDATION_LEVEL,
+    image_header_size: int = DATASET_PREPARATION_IMAGE_HEADER_SIZE,
+    dataset_format: str = DATASET_FORMAT,
+    shard_size: int = DATASET_SHARD_SIZE,
+    annotation_layout: str = DATASET_ANNOTATION_LAYOUT,
+    annotation_batch_size: int = ANNOTATION_BATCH_SIZE,
+    compress_annotations: bool = ANNOTATION_BATCH_COMPRESSION,
+    split_strategy: str = DATASET_SPLIT_STRATEGY,
+    parent_dataset_uuid: Optional[str] = None,
 ) -> Dataset:
-    dataset = Dataset(bucket_name=get_dataset_bucket_name())
+    """
+    Prepares a new dataset from the data sources. Given a parent dataset, the new dataset keeps
+    the parent's split assignments and only fetches and validates the samples added or changed
+    since the parent was prepared.
+    """
+    dataset = Dataset(
+        bucket_name=get_dataset_bucket_name(),
+        annotation_layout=AnnotationLayout(annotation_layout),
+        annotation_batch_size=annotation_batch_size,
+        compress_annotations=compress_annotations,
+        split_strategy=SplitStrategy(split_strategy),
+        parent_uuid=parent_dataset_uuid,
+        # A sharded dataset is prepared as objects first, then packed
+        dataset_format=DatasetFormat.VIRTUAL
+        if DatasetFormat(dataset_format) == DatasetFormat.VIRTUAL
+        else DatasetFormat.OBJECTS,
+    )
+    dataset_preparator_service = DatasetPreparatorService(
+        bucket_client=bucket_client,
+        fetch_workers=fetch_workers,
+        validate_workers=validate_workers,
+        copy_workers=copy_workers,
+        max_in_flight=max_in_flight,
+        async_bucket_client=create_async_minio_client() if use_async else None,
+        image_validation_level=ImageValidationLevel(image_validation_level),
+        image_header_size=image_header_size,
+    )
 
     validate_bucket_connection(bucket_client=bucket_client)
 
+    parent_manifest = (
+        get_parent_dataset_manifest(
+            bucket_client=bucket_client, parent_dataset_uuid=parent_dataset_uuid
+        )
+        if parent_dataset_uuid is not None
+        else None
+    )
+
     for data_source in data_source_list.data_sources:
         prepare_dataset(
-            bucket_client=bucket_client,
+            dataset_preparator_service=dataset_preparator_service,
             source_bucket_name=get_data_sources_bucket_name(),
             dataset=dataset,
             data_source=data_source,
+            parent_manifest=parent_manifest,
+        )
+
+    if DatasetFormat(dataset_format) == DatasetFormat.SHARDS:
+        shard_dataset(
+            dataset_sharder_service=DatasetSharderService(
+                bucket_client,
+                shard_size=shard_size,
+                fetch_workers=fetch_workers,
+                max_in_flight=max_in_flight,
+            ),
+            dataset=dataset,
         )
 
     return dataset
@@ -166,7 +255,17 @@ def dataset_retriever(bucket_client: BucketClient, dataset_uuid: str) -> Dataset
     if bucket_client.folder_exists(
         bucket_name=get_dataset_bucket_name(), folder_name=dataset_uuid
     ):
-        return Dataset(bucket_name=get_dataset_bucket_name(), uuid=dataset_uuid)
+        dataset = Dataset(bucket_name=get_dataset_bucket_name(), uuid=dataset_uuid)
+        if bucket_client.folder_exists(
+            bucket_name=get_dataset_bucket_name(),
+            folder_name=dataset.get_shards_folder_path(),
+        ):
+            dataset.dataset_format = DatasetFormat.SHARDS
+        elif is_virtual_dataset(bucket_client=bucket_client, dataset=dataset):
+            dataset.dataset_format = DatasetFormat.VIRTUAL
+        if has_annotation_index(bucket_client=bucket_client, dataset=dataset):
+            dataset.annotation_layout = AnnotationLayout.BATCHED
+        return dataset
 
     else:
         raise NotADirectoryError(
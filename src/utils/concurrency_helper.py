@@ -0,0 +1,38 @@
+"""Helper functions for concurrent work.
+
+This module contains helper functions to run tasks on a bounded worker pool while
+keeping memory usage independent of the number of tasks.
+"""
+
+
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Any, Callable, Iterable, Iterator, Set
+
+
+def iter_completed(
+    executor: Executor,
+    fn: Callable[..., Any],
+    iterable: Iterable[Any],
+    max_in_flight: int,
+) -> Iterator[Future]:
+    """Submit `fn(item)` for each item and yield the futures as they complete.
+
+    At most `max_in_flight` tasks are pending at any time: the iterable is only
+    consumed as earlier tasks complete, so it can be lazy and arbitrarily long.
+    """
+
+    pending: Set[Future] = set()
+    try:
+        for item in iterable:
+            pending.add(executor.submit(fn, item))
+
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from done
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from done
+    finally:
+        for future in pending:
+            future.cancel()
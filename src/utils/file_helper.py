@@ -0,0 +1,54 @@
+"""Helper functions for local files.
+
+This module contains helpers to scan large local folders, listing directories
+concurrently since each listing mostly waits on the filesystem.
+"""
+
+
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Iterator, List, Set, Tuple
+
+
+def scan_files(
+    root_path: str, max_workers: int = 16
+) -> Iterator[Tuple[str, os.stat_result]]:
+    """Yield the path and stat of every file under `root_path`, in no particular order.
+
+    Directories are listed concurrently by `max_workers` threads. As with `os.walk`,
+    symbolic links to directories are not followed, while those to files are.
+    """
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, max_workers), thread_name_prefix="scan"
+    ) as executor:
+        pending: Set[Future] = {executor.submit(_scan_directory, root_path)}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, directory_paths = future.result()
+                    pending.update(
+                        executor.submit(_scan_directory, directory_path)
+                        for directory_path in directory_paths
+                    )
+                    yield from files
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _scan_directory(
+    directory_path: str,
+) -> Tuple[List[Tuple[str, os.stat_result]], List[str]]:
+    files: List[Tuple[str, os.stat_result]] = []
+    directory_paths: List[str] = []
+
+    with os.scandir(directory_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                directory_paths.append(entry.path)
+            elif entry.is_file():
+                files.append((entry.path, entry.stat()))
+
+    return files, directory_paths
@@ -0,0 +1,130 @@
+"""Helper functions for tar shards.
+
+This module contains helpers to pack samples into WebDataset-style tar shards and
+to read them back. A sample is a group of consecutive tar members sharing the same
+key, each member being named `{key}.{extension}`, e.g. `0a1b.json` and `0a1b.png`,
+the extension being what follows the name's last dot.
+"""
+
+
+import io
+import os
+import tarfile
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+
+class ShardWriter:
+    def __init__(
+        self,
+        directory: str,
+        shard_name_pattern: str,
+        max_shard_size: int,
+        on_shard_complete: Callable[[str, int, int], None],
+    ):
+        """
+        Writes samples into tar shards on disk, starting a new shard once the current one
+        reaches `max_shard_size` bytes. Samples are never split between two shards.
+
+        Args:
+            directory (str): The local folder the shards are written into.
+            shard_name_pattern (str): File name of the shards, formatted with their number.
+            max_shard_size (int): Size from which a shard is closed.
+            on_shard_complete (Callable[[str, int, int], None]): Called with the file path, the
+                number and the number of samples of each closed shard.
+        """
+        self.directory = directory
+        self.shard_name_pattern = shard_name_pattern
+        self.max_shard_size = max_shard_size
+        self.on_shard_complete = on_shard_complete
+
+        self.number_of_shards = 0
+        self._tar_file: Optional[tarfile.TarFile] = None
+        self._file_path: Optional[str] = None
+        self._number_of_samples = 0
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+        elif self._tar_file is not None:
+            self._tar_file.close()
+
+    def write_sample(self, key: str, members: Dict[str, bytes]) -> None:
+        """
+        Appends a sample to the current shard.
+
+        Args:
+            key (str): The sample's key, shared by the names of its members.
+            members (Dict[str, bytes]): The sample's files' content, by extension.
+        """
+        if self._tar_file is None:
+            self._file_path = os.path.join(
+                self.directory, self.shard_name_pattern.format(self.number_of_shards)
+            )
+            self._tar_file = tarfile.open(
+                self._file_path, "w", format=tarfile.USTAR_FORMAT
+            )
+            self._number_of_samples = 0
+
+        for extension, data in members.items():
+            # Fixed ownership and dates, so that packing the same samples gives the same shard
+            tar_info = tarfile.TarInfo(name=f"{key}.{extension}")
+            tar_info.size = len(data)
+            tar_info.mode = 0o444
+            self._tar_file.addfile(tar_info, io.BytesIO(data))
+        self._number_of_samples += 1
+
+        if self._tar_file.offset >= self.max_shard_size:
+            self._close_shard()
+
+    def close(self) -> None:
+        """
+        Closes the current shard, if any sample was written into it.
+        """
+        if self._tar_file is not None:
+            self._close_shard()
+
+    def _close_shard(self) -> None:
+        assert self._tar_file is not None and self._file_path is not None
+        self._tar_file.close()
+        self._tar_file = None
+        self.number_of_shards += 1
+        self.on_shard_complete(
+            self._file_path, self.number_of_shards - 1, self._number_of_samples
+        )
+
+
+def iter_shard_samples(
+    shard_file_path: str,
+) -> Iterator[Tuple[str, Dict[str, bytes]]]:
+    """Read the samples of a tar shard sequentially, in the order they were written.
+
+    Args:
+        shard_file_path (str): Path of the shard on disk.
+
+    Returns:
+        Iterator[Tuple[str, Dict[str, bytes]]]: Each sample's key and files' content by extension.
+    """
+
+    key = ""
+    members: Dict[str, bytes] = {}
+
+    with tarfile.open(shard_file_path, "r|") as tar_file:
+        for tar_info in tar_file:
+            if not tar_info.isfile():
+                continue
+
+            member_key, _, extension = tar_info.name.rpartition(".")
+            if member_key != key and members:
+                yield key, members
+                members = {}
+            key = member_key
+            # Regular files always have their content
+            member_file = tar_file.extractfile(tar_info)
+            assert member_file is not None
+            members[extension] = member_file.read()
+
+    if members:
+        yield key, members
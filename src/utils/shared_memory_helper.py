@@ -0,0 +1,157 @@
+"""Helper functions for shared memory.
+
+This module contains helpers to hand buffers between the parent process and its worker
+processes through shared memory, instead of pickling them through the pool's pipe, and
+to read them in place.
+
+The blocks stay registered with the resource tracker, which the spawned workers share
+with their parent, so that a block nobody frees is still removed when the program exits.
+"""
+
+
+import io
+from concurrent.futures import Future
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from _typeshed import WriteableBuffer
+
+
+class SharedBuffer:
+    def __init__(self, name: str, size: int):
+        """
+        A buffer written into a named shared memory block by one process, to be read in place
+        by another. The block is freed by whichever process reads it last.
+
+        Args:
+            name (str): Name of the shared memory block.
+            size (int): Size of the buffer, the block being possibly larger.
+        """
+        self.name = name
+        self.size = size
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview) -> "SharedBuffer":
+        """
+        Copies data into a new shared memory block.
+
+        Args:
+            data (bytes | memoryview): The data to share.
+
+        Returns:
+            SharedBuffer: The shared buffer.
+        """
+        data = memoryview(data).cast("B")
+        shared_memory_block = shared_memory.SharedMemory(
+            create=True, size=max(1, len(data))
+        )
+        try:
+            shared_memory_block.buf[: len(data)] = data
+            return SharedBuffer(name=shared_memory_block.name, size=len(data))
+        finally:
+            shared_memory_block.close()
+
+    @contextmanager
+    def open(self) -> Iterator[memoryview]:
+        """
+        Maps the buffer, for as long as the context lasts. The view must not be used after it.
+
+        Returns:
+            Iterator[memoryview]: The buffer's content, read in place.
+        """
+        shared_memory_block = shared_memory.SharedMemory(name=self.name)
+        view = shared_memory_block.buf[: self.size]
+        try:
+            yield view
+        finally:
+            view.release()
+            shared_memory_block.close()
+
+    def unlink(self) -> None:
+        """
+        Frees the buffer's shared memory block, if it was not already.
+        """
+        try:
+            shared_memory_block = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return
+        shared_memory_block.close()
+        shared_memory_block.unlink()
+
+
+class MemoryviewReader(io.RawIOBase):
+    def __init__(self, data: bytes | memoryview):
+        """
+        A seekable file object reading a buffer in place, where `io.BytesIO` would copy any
+        buffer but `bytes`.
+
+        Args:
+            data (bytes | memoryview): The buffer to read.
+        """
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def read(self, size: int | None = -1) -> bytes:
+        end = (
+            len(self._view)
+            if size is None or size < 0
+            else min(len(self._view), self._position + size)
+        )
+        data = bytes(self._view[self._position : end])
+        self._position = max(self._position, end)
+        return data
+
+    def readinto(self, buffer: "WriteableBuffer") -> int:
+        target = memoryview(buffer).cast("B")
+        size = max(0, min(len(target), len(self._view) - self._position))
+        target[:size] = self._view[self._position : self._position + size]
+        self._position += size
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def open_buffer(data: bytes | memoryview) -> io.BufferedReader:
+    """Open a buffer as a binary file object, reading it in place.
+
+    Closing the file releases its view of the buffer, which the caller may then release.
+    """
+
+    return io.BufferedReader(MemoryviewReader(data))
+
+
+def release_unread_result(future: Future) -> None:
+    """Free the shared buffers of a worker's result that is not going to be read.
+
+    Meant as a done callback of the futures whose reader gave up, e.g. because it was
+    cancelled, so that a result completing afterwards does not leave its blocks behind.
+    """
+
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    for value in result if isinstance(result, tuple) else (result,):
+        if isinstance(value, SharedBuffer):
+            value.unlink()
@@ -0,0 +1,155 @@
+"""Helper functions for dataset splits.
+
+This module contains helpers to assign samples to splits in vectorized NumPy passes,
+so that millions of samples are assigned in seconds.
+"""
+
+
+import hashlib
+import itertools
+from typing import Sequence
+
+import numpy as np
+
+# Stratum of the samples without any label
+UNLABELLED_STRATUM = -1
+
+FNV_OFFSET_BASIS = np.uint64(0xCBF29CE484222325)
+FNV_PRIME = np.uint64(0x100000001B3)
+
+
+def hash_sample_keys(sample_keys: Sequence[str], seed: str) -> np.ndarray:
+    """Return a uniform 64-bit hash of each sample key, salted with `seed`.
+
+    The keys are hashed with FNV-1a one byte column at a time over all of them,
+    then mixed with the SplitMix64 finalizer. The hashes only depend on the keys,
+    so they order the samples the same way whatever the order they are listed in.
+    """
+
+    encoded_keys = [sample_key.encode() for sample_key in sample_keys]
+    key_lengths = np.fromiter(
+        map(len, encoded_keys), dtype=np.int64, count=len(encoded_keys)
+    )
+    key_bytes = (
+        np.array(encoded_keys, dtype=bytes)
+        .view(np.uint8)
+        .reshape(len(encoded_keys), -1)
+    )
+
+    seed_hash = int.from_bytes(
+        hashlib.blake2b(seed.encode(), digest_size=8).digest(), "little"
+    )
+    hashes = np.full(len(encoded_keys), FNV_OFFSET_BASIS ^ np.uint64(seed_hash))
+    with np.errstate(over="ignore"):
+        for column in range(key_bytes.shape[1]):
+            # The padding of the shorter keys is left out of their hash
+            np.copyto(
+                hashes,
+                (hashes ^ key_bytes[:, column]) * FNV_PRIME,
+                where=column < key_lengths,
+            )
+
+        hashes ^= hashes >> np.uint64(30)
+        hashes *= np.uint64(0xBF58476D1CE4E5B9)
+        hashes ^= hashes >> np.uint64(27)
+        hashes *= np.uint64(0x94D049BB133111EB)
+        hashes ^= hashes >> np.uint64(31)
+
+    return hashes
+
+
+def get_label_strata(labels: Sequence[Sequence[int]]) -> np.ndarray:
+    """Return the stratum of each sample: the rarest of its labels.
+
+    A label's rarity is the number of samples having it, so that a sample with
+    several labels is stratified by the class the split proportions are the
+    hardest to preserve for. Samples without labels get `UNLABELLED_STRATUM`.
+    """
+
+    number_of_samples = len(labels)
+    lengths = np.fromiter(
+        (len(sample_labels) for sample_labels in labels),
+        dtype=np.int64,
+        count=number_of_samples,
+    )
+    flat_labels = np.fromiter(
+        itertools.chain.from_iterable(labels), dtype=np.int64, count=lengths.sum()
+    )
+    strata = np.full(number_of_samples, UNLABELLED_STRATUM, dtype=np.int64)
+    if flat_labels.size == 0:
+        return strata
+
+    sample_ids = np.repeat(np.arange(number_of_samples), lengths)
+    unique_labels, label_codes = np.unique(flat_labels, return_inverse=True)
+
+    # Each label is counted once per sample, however many boxes it has
+    pair_keys = np.unique(sample_ids * len(unique_labels) + label_codes)
+    sample_ids = pair_keys // len(unique_labels)
+    label_codes = pair_keys % len(unique_labels)
+    label_counts = np.bincount(label_codes, minlength=len(unique_labels))
+
+    # Rarest label first within each sample, ties broken by the label's value
+    order = np.lexsort((label_codes, label_counts[label_codes], sample_ids))
+    _, first_positions = np.unique(sample_ids[order], return_index=True)
+    first_pairs = order[first_positions]
+    strata[sample_ids[first_pairs]] = unique_labels[label_codes[first_pairs]]
+
+    return strata
+
+
+def get_stratified_splits(
+    strata: np.ndarray, sample_hashes: np.ndarray, weights: Sequence[float]
+) -> np.ndarray:
+    """Return the index of the split of each sample, stratified by `strata`.
+
+    Each stratum is divided between the splits in proportion to `weights`, by
+    largest remainder, and every split with a positive weight gets at least one
+    sample of the strata that have enough. Within a stratum, the samples are
+    assigned in the order of their hash.
+    """
+
+    number_of_samples = len(strata)
+    if number_of_samples == 0:
+        return np.empty(0, dtype=np.int64)
+
+    _, stratum_codes, stratum_counts = np.unique(
+        strata, return_inverse=True, return_counts=True
+    )
+    split_quotas = _get_split_quotas(stratum_counts, np.asarray(weights, dtype=float))
+
+    # Rank of each sample within its stratum, in hash order
+    order = np.argsort(sample_hashes)
+    order = order[np.argsort(stratum_codes[order], kind="stable")]
+    stratum_starts = np.cumsum(stratum_counts) - stratum_counts
+    ranks = np.empty(number_of_samples, dtype=np.int64)
+    ranks[order] = np.arange(number_of_samples) - stratum_starts[stratum_codes[order]]
+
+    cumulative_quotas = np.cumsum(split_quotas, axis=1)
+    return (ranks[:, None] >= cumulative_quotas[stratum_codes]).sum(axis=1)
+
+
+def _get_split_quotas(stratum_counts: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Return the number of samples of each stratum (rows) in each split (columns)."""
+
+    weights = weights / weights.sum()
+    expected_counts = stratum_counts[:, None] * weights[None, :]
+    quotas = np.floor(expected_counts).astype(np.int64)
+
+    # The samples left by the rounding go to the splits with the largest remainders
+    missing_counts = stratum_counts - quotas.sum(axis=1)
+    remainder_ranks = np.argsort(
+        np.argsort(-(expected_counts - quotas), axis=1, kind="stable"), axis=1
+    )
+    quotas += remainder_ranks < missing_counts[:, None]
+
+    # Strata with at least one sample per split leave none of them empty
+    positive_splits = weights > 0
+    for split_index in np.flatnonzero(positive_splits):
+        is_lacking = (quotas[:, split_index] == 0) & (
+            stratum_counts >= positive_splits.sum()
+        )
+        donor_indices = np.argmax(quotas, axis=1)
+        quotas[is_lacking, split_index] += 1
+        quotas[is_lacking, donor_indices[is_lacking]] -= 1
+
+    return quotas
@@ -67,8 +67,8 @@ def get_current_tracker_run_url() -> Optional[str]:
 
     experiment_tracker = Client().active_stack.experiment_tracker
     if isinstance(experiment_tracker, MLFlowExperimentTracker):
-        from zenml.integrations.mlflow.mlflow_utils import get_tracking_uri
         import mlflow
+        from zenml.integrations.mlflow.mlflow_utils import get_tracking_uri
 
         # remote tracking
         if experiment_tracker.config.tracking_uri:
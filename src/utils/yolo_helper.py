@@ -0,0 +1,78 @@
+"""Helper functions for the YOLO format.
+
+This module contains helpers to convert annotations into YOLO label files, which hold
+one `{class} {x_center} {y_center} {width} {height}` line per box, the coordinates being
+normalized by the image's dimensions. A whole batch of annotations is converted at once.
+"""
+
+
+import itertools
+from typing import List, Sequence
+
+import numpy as np
+
+YOLO_LABEL_LINE_FORMAT = "%d %.6f %.6f %.6f %.6f\n"
+
+
+def format_yolo_labels(
+    labels: Sequence[Sequence[int]], bboxes: Sequence[Sequence[Sequence[float]]]
+) -> List[str]:
+    """Return the content of the YOLO label file of each annotation.
+
+    The annotations' boxes are normalized `[x_center, y_center, width, height]`, paired
+    with the label at the same position. They are clipped to the image, and those left
+    without an area or with a negative label are dropped, as YOLO would reject them.
+    """
+
+    # Boxes without a label, or labels without a box, have no line
+    lengths = np.fromiter(
+        map(min, map(len, labels), map(len, bboxes)),
+        dtype=np.int64,
+        count=len(labels),
+    )
+    flat_labels = np.fromiter(
+        itertools.chain.from_iterable(
+            sample_labels[:length]
+            for sample_labels, length in zip(labels, lengths.tolist())
+        ),
+        dtype=np.int64,
+        count=lengths.sum(),
+    )
+    flat_bboxes = np.fromiter(
+        itertools.chain.from_iterable(
+            itertools.chain.from_iterable(sample_bboxes[:length])
+            for sample_bboxes, length in zip(bboxes, lengths.tolist())
+        ),
+        dtype=np.float64,
+        count=4 * lengths.sum(),
+    ).reshape(-1, 4)
+
+    # Clipped as corners, so that the boxes overflowing the image keep their inner part
+    corners = np.clip(
+        np.concatenate(
+            (
+                flat_bboxes[:, :2] - flat_bboxes[:, 2:] / 2,
+                flat_bboxes[:, :2] + flat_bboxes[:, 2:] / 2,
+            ),
+            axis=1,
+        ),
+        0.0,
+        1.0,
+    )
+    sizes = corners[:, 2:] - corners[:, :2]
+    is_kept = (flat_labels >= 0) & (sizes > 0).all(axis=1)
+
+    rows = np.column_stack((flat_labels, (corners[:, :2] + corners[:, 2:]) / 2, sizes))[
+        is_kept
+    ]
+    lines = (
+        (YOLO_LABEL_LINE_FORMAT * len(rows)) % tuple(rows.ravel().tolist())
+    ).splitlines(keepends=True)
+    kept_lengths = np.bincount(
+        np.repeat(np.arange(len(labels)), lengths)[is_kept], minlength=len(labels)
+    )
+    line_ends = np.cumsum(kept_lengths).tolist()
+
+    return [
+        "".join(lines[start:end]) for start, end in zip([0] + line_ends[:-1], line_ends)
+    ]
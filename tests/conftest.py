@@ -0,0 +1,20 @@
+import pytest
+
+from src.models.model_filesystem_bucket_client import FilesystemBucketClient
+
+BUCKET_NAME = "data-sources"
+
+
+@pytest.fixture
+def bucket_name() -> str:
+    return BUCKET_NAME
+
+
+@pytest.fixture
+def bucket_client(tmp_path, bucket_name: str) -> FilesystemBucketClient:
+    """
+    A bucket client storing its buckets in a temporary folder, with `bucket_name` created.
+    """
+    bucket_client = FilesystemBucketClient(root_path=str(tmp_path / "buckets"))
+    bucket_client.make_bucket(bucket_name, enable_versioning=False)
+    return bucket_client
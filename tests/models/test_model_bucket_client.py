@@ -0,0 +1,212 @@
+import hashlib
+import io
+import os
+
+import pytest
+from minio import S3Error
+from minio.datatypes import Object
+
+from src.models.model_bucket_client import MinioClient
+from src.models.model_download_state import DownloadState
+
+BUCKET_NAME = "datasets"
+OBJECT_NAME = "dataset/images/0.jpg"
+OBJECT_DATA = bytes(range(256)) * 64
+
+
+class FakeObjectResponse:
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def stream(self, amt: int):
+        while chunk := self._stream.read(amt):
+            yield chunk
+
+    def close(self) -> None:
+        pass
+
+    def release_conn(self) -> None:
+        pass
+
+
+class FakeMinio:
+    def __init__(self, objects: dict[str, bytes], etag: str):
+        """
+        Serves objects from memory, recording the requests of their downloads.
+        """
+        self.objects = objects
+        self.etag = etag
+        self.get_object_requests: list[dict] = []
+
+    def list_objects(self, bucket_name: str, prefix: str, recursive: bool):
+        return [
+            Object(
+                bucket_name=bucket_name,
+                object_name=object_name,
+                etag=self.etag,
+                size=len(data),
+            )
+            for object_name, data in sorted(self.objects.items())
+            if object_name.startswith(prefix)
+        ]
+
+    def get_object(
+        self,
+        bucket_name: str,
+        object_name: str,
+        offset: int = 0,
+        request_headers: dict | None = None,
+    ) -> FakeObjectResponse:
+        self.get_object_requests.append(
+            {"offset": offset, "request_headers": request_headers}
+        )
+        return FakeObjectResponse(self.objects[object_name][offset:])
+
+
+def create_minio_client(fake_minio: FakeMinio) -> MinioClient:
+    minio_client = MinioClient(
+        endpoint="localhost:9000",
+        access_key="access-key",
+        secret_key="secret-key",
+        max_workers=2,
+    )
+    minio_client.client = fake_minio  # type: ignore[assignment]
+    return minio_client
+
+
+def test_download_folder_resumes_partial_file_with_if_match(tmp_path):
+    fake_minio = FakeMinio({OBJECT_NAME: OBJECT_DATA}, etag="etag-1")
+    local_file_path = tmp_path / OBJECT_NAME
+    local_file_path.parent.mkdir(parents=True)
+    partial_file_path = tmp_path / f"{OBJECT_NAME}.etag-1.part"
+    partial_file_path.write_bytes(OBJECT_DATA[:1000])
+
+    transfer_stats = create_minio_client(fake_minio).download_folder(
+        bucket_name=BUCKET_NAME, folder_name="dataset/", destination_path=str(tmp_path)
+    )
+
+    assert fake_minio.get_object_requests == [
+        {"offset": 1000, "request_headers": {"If-Match": '"etag-1"'}}
+    ]
+    assert local_file_path.read_bytes() == OBJECT_DATA
+    assert not partial_file_path.exists()
+    assert transfer_stats.transferred_bytes == len(OBJECT_DATA) - 1000
+
+
+def test_download_folder_does_not_resume_partial_file_of_another_etag(tmp_path):
+    fake_minio = FakeMinio({OBJECT_NAME: OBJECT_DATA}, etag="etag-2")
+    (tmp_path / OBJECT_NAME).parent.mkdir(parents=True)
+    (tmp_path / f"{OBJECT_NAME}.etag-1.part").write_bytes(b"stale content")
+
+    create_minio_client(fake_minio).download_folder(
+        bucket_name=BUCKET_NAME, folder_name="dataset/", destination_path=str(tmp_path)
+    )
+
+    assert fake_minio.get_object_requests == [
+        {"offset": 0, "request_headers": {"If-Match": '"etag-2"'}}
+    ]
+    assert (tmp_path / OBJECT_NAME).read_bytes() == OBJECT_DATA
+
+
+def test_download_folder_skips_complete_files(tmp_path):
+    fake_minio = FakeMinio({OBJECT_NAME: OBJECT_DATA}, etag="etag-1")
+    minio_client = create_minio_client(fake_minio)
+    minio_client.download_folder(
+        bucket_name=BUCKET_NAME, folder_name="dataset/", destination_path=str(tmp_path)
+    )
+
+    transfer_stats = minio_client.download_folder(
+        bucket_name=BUCKET_NAME, folder_name="dataset/", destination_path=str(tmp_path)
+    )
+
+    assert len(fake_minio.get_object_requests) == 1
+    assert transfer_stats.skipped_objects == 1
+    assert transfer_stats.transferred_objects == 0
+
+
+def test_download_state_recognizes_unrecorded_files_by_md5(tmp_path):
+    local_file_path = tmp_path / "0.jpg"
+    local_file_path.write_bytes(OBJECT_DATA)
+    download_state = DownloadState(str(tmp_path))
+
+    assert download_state.is_complete(
+        bucket_name=BUCKET_NAME,
+        object_name="0.jpg",
+        etag=hashlib.md5(OBJECT_DATA).hexdigest(),
+        size=len(OBJECT_DATA),
+        local_file_path=str(local_file_path),
+    )
+    # Multipart ETags are not the MD5 of the content
+    assert not download_state.is_complete(
+        bucket_name=BUCKET_NAME,
+        object_name="1.jpg",
+        etag=f"{hashlib.md5(OBJECT_DATA).hexdigest()}-2",
+        size=len(OBJECT_DATA),
+        local_file_path=str(local_file_path),
+    )
+    # Recognized files are recorded in the journal
+    assert DownloadState(str(tmp_path)).is_complete(
+        bucket_name=BUCKET_NAME,
+        object_name="0.jpg",
+        etag=hashlib.md5(OBJECT_DATA).hexdigest(),
+        size=len(OBJECT_DATA),
+        local_file_path=str(local_file_path),
+    )
+
+
+def test_filesystem_download_folder_skips_up_to_date_files(
+    bucket_client, bucket_name, tmp_path
+):
+    bucket_client.upload_data(
+        bucket_name=bucket_name,
+        object_name=OBJECT_NAME,
+        data=io.BytesIO(OBJECT_DATA),
+        length=len(OBJECT_DATA),
+    )
+    destination_path = str(tmp_path / "download")
+
+    first_transfer_stats = bucket_client.download_folder(
+        bucket_name=bucket_name,
+        folder_name="dataset/",
+        destination_path=destination_path,
+    )
+    second_transfer_stats = bucket_client.download_folder(
+        bucket_name=bucket_name,
+        folder_name="dataset/",
+        destination_path=destination_path,
+    )
+
+    local_file_path = os.path.join(destination_path, OBJECT_NAME)
+    with open(local_file_path, "rb") as f:
+        assert f.read() == OBJECT_DATA
+    # The downloaded file is not a hardlink to the stored object
+    assert os.stat(local_file_path).st_nlink == 1
+    assert first_transfer_stats.transferred_objects == 1
+    assert second_transfer_stats.transferred_objects == 0
+    assert second_transfer_stats.skipped_objects == 1
+
+
+def test_get_object_data_or_none_returns_none_for_missing_objects(
+    bucket_client, bucket_name
+):
+    bucket_client.upload_data(
+        bucket_name=bucket_name,
+        object_name=OBJECT_NAME,
+        data=io.BytesIO(OBJECT_DATA),
+        length=len(OBJECT_DATA),
+    )
+
+    assert bucket_client.get_object_data_or_none(bucket_name, OBJECT_NAME) == (
+        OBJECT_DATA
+    )
+    assert bucket_client.get_object_data_or_none(bucket_name, "dataset/other") is None
+
+
+def test_filesystem_missing_object_raises_no_such_key(bucket_client, bucket_name):
+    with pytest.raises(S3Error) as get_error:
+        bucket_client.get_object(bucket_name, OBJECT_NAME)
+    with pytest.raises(S3Error) as stat_error:
+        bucket_client.stat_object(bucket_name, OBJECT_NAME)
+
+    assert get_error.value.code == "NoSuchKey"
+    assert stat_error.value.code == "NoSuchKey"
@@ -0,0 +1,88 @@
+import io
+
+from src.models.model_data_source_manifest import DataSourceManifest, ManifestEntry
+
+
+def create_manifest_entry(index: int) -> ManifestEntry:
+    return ManifestEntry(
+        annotation_path=f"source/annotations/{index:03d}.json",
+        image_path=f"source/images/{index:03d}.jpg",
+        annotation={
+            "image_path": f"source/images/{index:03d}.jpg",
+            "label": [index % 3],
+            "bbox": [[0.5, 0.5, 0.2, 0.1]],
+        },
+        annotation_sha256=f"{index:064x}",
+        annotation_size=100 + index,
+        image_sha256=f"{index + 1000:064x}",
+        image_size=2000 + index,
+        image_format="jpeg",
+        image_version_id=f"version-{index}",
+    )
+
+
+def test_manifest_round_trips_through_bytes():
+    manifest = DataSourceManifest(
+        data_source_name="source",
+        entries=[create_manifest_entry(index) for index in (2, 0, 1)],
+    )
+    # Undecodable annotations are kept, without their content
+    manifest.add_entry(
+        ManifestEntry(
+            annotation_path="source/annotations/003.json",
+            image_path=None,
+            annotation=None,
+        )
+    )
+
+    loaded_manifest = DataSourceManifest.from_bytes("source", manifest.to_bytes())
+
+    assert [entry.to_dict() for entry in loaded_manifest] == [
+        entry.to_dict() for entry in manifest
+    ]
+    assert loaded_manifest.to_bytes() == manifest.to_bytes()
+
+
+def test_manifest_entries_are_sorted_by_annotation_path():
+    manifest = DataSourceManifest(data_source_name="source")
+    for index in (3, 1, 2):
+        manifest.add_entry(create_manifest_entry(index))
+    manifest.add_entry(create_manifest_entry(1))
+
+    assert len(manifest) == 3
+    assert [entry.annotation_path for entry in manifest] == [
+        "source/annotations/001.json",
+        "source/annotations/002.json",
+        "source/annotations/003.json",
+    ]
+
+
+def test_manifest_is_downloaded_from_its_object(bucket_client, bucket_name):
+    manifest = DataSourceManifest(
+        data_source_name="source",
+        entries=[create_manifest_entry(index) for index in range(3)],
+    )
+    manifest_data = manifest.to_bytes()
+    bucket_client.upload_data(
+        bucket_name=bucket_name,
+        object_name=manifest.get_object_name(),
+        data=io.BytesIO(manifest_data),
+        length=len(manifest_data),
+    )
+
+    downloaded_manifest = DataSourceManifest.download(
+        bucket_client=bucket_client,
+        bucket_name=bucket_name,
+        data_source_name="source",
+    )
+
+    assert downloaded_manifest is not None
+    assert downloaded_manifest.to_bytes() == manifest_data
+    assert (
+        DataSourceManifest.download(
+            bucket_client=bucket_client,
+            bucket_name=bucket_name,
+            data_source_name="other-source",
+        )
+        is None
+    )
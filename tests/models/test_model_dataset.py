@@ -0,0 +1,85 @@
+import collections
+import random
+
+from src.models.model_dataset import Dataset, SplitStrategy
+
+SAMPLE_KEYS = [f"source/images/{index:05d}.png" for index in range(10000)]
+
+
+def test_hash_splits_do_not_depend_on_sample_order():
+    dataset = Dataset(bucket_name="datasets", seed="seed")
+    shuffled_sample_keys = list(SAMPLE_KEYS)
+    random.Random(0).shuffle(shuffled_sample_keys)
+    other_dataset = Dataset(bucket_name="datasets", seed="seed")
+
+    splits = {sample_key: dataset.get_split(sample_key) for sample_key in SAMPLE_KEYS}
+    other_splits = {
+        sample_key: other_dataset.get_split(sample_key)
+        for sample_key in shuffled_sample_keys
+    }
+
+    assert other_splits == splits
+
+
+def test_hash_splits_are_stable_across_runs():
+    # Pinned, so that a dataset prepared again from the same data gets the same splits
+    assert [
+        Dataset(bucket_name="datasets").get_split(f"source/images/{index:03d}.png")
+        for index in range(8)
+    ] == ["train", "test", "validation", "train", "train", "test", "train", "test"]
+    assert [
+        Dataset(bucket_name="datasets", seed="other").get_split(
+            f"source/images/{index:03d}.png"
+        )
+        for index in range(8)
+    ] == [
+        "train",
+        "test",
+        "train",
+        "validation",
+        "train",
+        "validation",
+        "train",
+        "validation",
+    ]
+
+
+def test_hash_splits_depend_on_seed():
+    dataset = Dataset(bucket_name="datasets", seed="seed")
+    other_dataset = Dataset(bucket_name="datasets", seed="other-seed")
+
+    number_of_moved_samples = sum(
+        dataset.get_split(sample_key) != other_dataset.get_split(sample_key)
+        for sample_key in SAMPLE_KEYS
+    )
+
+    # Two independent draws with weights [0.6, 0.2, 0.2] differ 56% of the time
+    assert 0.5 * len(SAMPLE_KEYS) < number_of_moved_samples < 0.62 * len(SAMPLE_KEYS)
+
+
+def test_hash_splits_follow_distribution_weights():
+    dataset = Dataset(
+        bucket_name="datasets", seed="seed", distribution_weights=[0.7, 0.2, 0.1]
+    )
+
+    split_counts = collections.Counter(map(dataset.get_split, SAMPLE_KEYS))
+
+    for split_name, weight in zip(dataset.split_names, [0.7, 0.2, 0.1]):
+        assert abs(split_counts[split_name] / len(SAMPLE_KEYS) - weight) < 0.02
+
+
+def test_sequential_splits_follow_sample_order():
+    dataset = Dataset(
+        bucket_name="datasets", seed="seed", split_strategy=SplitStrategy.SEQUENTIAL
+    )
+    other_dataset = Dataset(
+        bucket_name="datasets", seed="seed", split_strategy=SplitStrategy.SEQUENTIAL
+    )
+
+    splits = [dataset.get_split(sample_key) for sample_key in SAMPLE_KEYS[:100]]
+    other_splits = [
+        other_dataset.get_split(sample_key) for sample_key in SAMPLE_KEYS[100:200]
+    ]
+
+    # Drawn from the seeded generator, whatever the samples
+    assert other_splits == splits
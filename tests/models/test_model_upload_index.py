@@ -0,0 +1,90 @@
+import hashlib
+
+from src.models.model_upload_index import UploadIndex
+
+CONTENT = b"image content"
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+MD5 = hashlib.md5(CONTENT).hexdigest()
+
+
+def test_stored_content_is_identified_by_sha256():
+    upload_index = UploadIndex()
+    upload_index.add_object("source/images/0.png", size=len(CONTENT), etag="etag")
+    upload_index.set_sha256("source/images/0.png", size=len(CONTENT), sha256=SHA256)
+
+    assert upload_index.is_stored("source/images/0.png", len(CONTENT), SHA256)
+    assert not upload_index.is_stored(
+        "source/images/0.png", len(CONTENT), hashlib.sha256(b"other").hexdigest()
+    )
+    assert not upload_index.is_stored("source/images/0.png", len(CONTENT) + 1, SHA256)
+    assert not upload_index.is_stored("source/images/1.png", len(CONTENT), SHA256)
+
+
+def test_sha256_of_another_size_is_not_attached():
+    upload_index = UploadIndex()
+    upload_index.add_object("source/images/0.png", size=len(CONTENT), etag=MD5)
+    upload_index.set_sha256("source/images/0.png", size=len(CONTENT) + 1, sha256="0")
+
+    assert upload_index.is_stored(
+        "source/images/0.png", len(CONTENT), SHA256, md5=lambda: MD5
+    )
+
+
+def test_stored_content_is_identified_by_md5_etag():
+    upload_index = UploadIndex()
+    upload_index.add_object("source/images/0.png", size=len(CONTENT), etag=MD5)
+
+    assert upload_index.is_stored(
+        "source/images/0.png", len(CONTENT), SHA256, md5=lambda: MD5
+    )
+    assert not upload_index.is_stored(
+        "source/images/0.png",
+        len(CONTENT),
+        SHA256,
+        md5=lambda: hashlib.md5(b"other").hexdigest(),
+    )
+    assert not upload_index.is_stored("source/images/0.png", len(CONTENT), SHA256)
+
+
+def test_multipart_etag_is_not_compared_with_md5():
+    upload_index = UploadIndex()
+    upload_index.add_object("source/images/0.png", size=len(CONTENT), etag=f"{MD5}-2")
+    upload_index.add_object("source/images/1.png", size=len(CONTENT), etag=None)
+
+    def _md5() -> str:
+        raise AssertionError("The content should not be hashed")
+
+    assert not upload_index.is_stored(
+        "source/images/0.png", len(CONTENT), SHA256, md5=_md5
+    )
+    assert not upload_index.is_stored(
+        "source/images/1.png", len(CONTENT), SHA256, md5=_md5
+    )
+
+
+def test_uploaded_content_is_recorded():
+    upload_index = UploadIndex()
+    upload_index.record_uploaded(
+        "source/images/0.png", size=len(CONTENT), sha256=SHA256
+    )
+    upload_index.record_skipped(size=len(CONTENT))
+
+    assert upload_index.is_stored("source/images/0.png", len(CONTENT), SHA256)
+    assert upload_index.stats.transferred_objects == 1
+    assert upload_index.stats.skipped_objects == 1
+    assert upload_index.stats.skipped_bytes == len(CONTENT)
+
+
+def test_versions_are_kept_from_the_manifest_and_uploads():
+    upload_index = UploadIndex()
+    upload_index.add_object("source/images/0.png", size=len(CONTENT), etag=MD5)
+    upload_index.set_sha256(
+        "source/images/0.png", size=len(CONTENT), sha256=SHA256, version_id="v0"
+    )
+    upload_index.record_uploaded(
+        "source/images/1.png", size=len(CONTENT), sha256=SHA256, version_id="v1"
+    )
+
+    assert upload_index.get_version_id("source/images/0.png") == "v0"
+    assert upload_index.get_version_id("source/images/1.png") == "v1"
+    assert upload_index.get_version_id("source/images/2.png") is None
@@ -0,0 +1,78 @@
+import pytest
+
+from src.models.model_upload_journal import CompletedItem, UploadJournal
+
+
+@pytest.fixture
+def upload_journal(tmp_path):
+    upload_journal = UploadJournal(str(tmp_path / "journal" / "uploads.sqlite"))
+    yield upload_journal
+    upload_journal.close()
+
+
+def test_unfinished_run_is_resumed(upload_journal, tmp_path):
+    run = upload_journal.start_run("source")
+    upload_journal.record_completed(
+        run.run_id,
+        CompletedItem(
+            item_key="source/images/0.png", size=10, sha256="0" * 64, mtime_ns=1
+        ),
+    )
+    upload_journal.record_completed(
+        run.run_id,
+        CompletedItem(
+            item_key="train/0", size=20, manifest_entry={"annotation_path": "a.json"}
+        ),
+    )
+    upload_journal.close()
+
+    reopened_upload_journal = UploadJournal(
+        str(tmp_path / "journal" / "uploads.sqlite")
+    )
+    resumed_run = reopened_upload_journal.start_run("source")
+    completed_items = sorted(
+        reopened_upload_journal.get_completed_items(resumed_run.run_id),
+        key=lambda completed_item: completed_item.item_key,
+    )
+    reopened_upload_journal.close()
+
+    assert resumed_run.run_id == run.run_id
+    assert not resumed_run.is_finished
+    assert (resumed_run.completed_items, resumed_run.completed_bytes) == (2, 30)
+    assert [
+        (item.item_key, item.size, item.sha256, item.mtime_ns, item.manifest_entry)
+        for item in completed_items
+    ] == [
+        ("source/images/0.png", 10, "0" * 64, 1, None),
+        ("train/0", 20, None, None, {"annotation_path": "a.json"}),
+    ]
+
+
+def test_finished_run_is_not_resumed(upload_journal):
+    run = upload_journal.start_run("source")
+    upload_journal.record_completed(
+        run.run_id, CompletedItem(item_key="source/images/0.png", size=10)
+    )
+    upload_journal.finish_run(run.run_id)
+
+    next_run = upload_journal.start_run("source")
+    finished_run = upload_journal.get_runs("source")[1]
+
+    assert next_run.run_id != run.run_id
+    assert list(upload_journal.get_completed_items(next_run.run_id)) == []
+    assert finished_run.is_finished
+    assert (finished_run.completed_items, finished_run.completed_bytes) == (1, 10)
+    # The completed items of a finished run are dropped
+    assert list(upload_journal.get_completed_items(run.run_id)) == []
+
+
+def test_runs_are_kept_per_data_source(upload_journal):
+    run = upload_journal.start_run("source")
+    other_run = upload_journal.start_run("other-source")
+
+    assert other_run.run_id != run.run_id
+    assert upload_journal.start_run("source").run_id == run.run_id
+    assert [run.run_id for run in upload_journal.get_runs()] == [
+        other_run.run_id,
+        run.run_id,
+    ]
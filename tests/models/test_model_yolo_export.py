@@ -0,0 +1,42 @@
+import json
+
+from src.models.model_dataset import Dataset
+from src.models.model_yolo_export import YoloLabelWriter
+
+
+def test_label_files_are_written_next_to_split_images(tmp_path):
+    dataset = Dataset(bucket_name="datasets", uuid="dataset")
+    yolo_label_writer = YoloLabelWriter(
+        dataset=dataset, destination_root_path=str(tmp_path), batch_size=2
+    )
+    annotations = {
+        "train": {"label": [0, 2], "bbox": [[0.5, 0.5, 0.2, 0.2]] * 2},
+        "validation": {"label": [1], "bbox": [[0.25, 0.25, 0.5, 0.5]]},
+    }
+    for split_name, annotation in annotations.items():
+        annotation_file_path = (
+            tmp_path / "dataset" / split_name / "annotations" / "0.json"
+        )
+        annotation_file_path.parent.mkdir(parents=True)
+        annotation_file_path.write_text(
+            json.dumps({**annotation, "image_path": "source/images/0.png"})
+        )
+        yolo_label_writer.add_downloaded_object(
+            f"dataset/{split_name}/annotations/0.json"
+        )
+    # Objects other than annotations are ignored
+    yolo_label_writer.add_downloaded_object("dataset/train/images/0.png")
+
+    data_file_path = yolo_label_writer.close()
+
+    assert (tmp_path / "dataset" / "train" / "labels" / "0.txt").read_text() == (
+        "0 0.500000 0.500000 0.200000 0.200000\n2 0.500000 0.500000 0.200000 0.200000\n"
+    )
+    assert (tmp_path / "dataset" / "validation" / "labels" / "0.txt").read_text() == (
+        "1 0.250000 0.250000 0.500000 0.500000\n"
+    )
+    assert yolo_label_writer.number_of_label_files == 2
+    with open(data_file_path) as f:
+        data_file_lines = f.read().splitlines()
+    assert 'val: "validation/images"' in data_file_lines
+    assert data_file_lines[-4:] == ["names:", '  0: "0"', '  1: "1"', '  2: "2"']
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import zipfile
+from typing import Callable
+
+import pytest
+
+from src.models.model_data_source import LocalDataSource
+from src.models.model_data_source_manifest import DataSourceManifest
+from src.models.model_sync_state import SyncState
+from src.models.model_upload_journal import UploadJournal
+from src.services.service_data_uploader import DataUploaderService
+
+DATA_SOURCE_NAME = "source"
+NUMBER_OF_SAMPLES = 4
+
+
+@pytest.fixture
+def data_source(tmp_path) -> LocalDataSource:
+    """
+    A local data source of `NUMBER_OF_SAMPLES` images and their annotations.
+    """
+    root_folder_path = tmp_path / DATA_SOURCE_NAME
+    (root_folder_path / "images").mkdir(parents=True)
+    (root_folder_path / "annotations").mkdir()
+    for index in range(NUMBER_OF_SAMPLES):
+        (root_folder_path / "images" / f"{index:03d}.png").write_bytes(
+            bytes([index]) * (1000 + index)
+        )
+        (root_folder_path / "annotations" / f"{index:03d}.json").write_text(
+            json.dumps(
+                {
+                    "label": [index % 2],
+                    "bbox": [[0.5, 0.5, 0.2, 0.2]],
+                    "image_path": f"{DATA_SOURCE_NAME}/images/{index:03d}.png",
+                }
+            )
+        )
+    return LocalDataSource(root_folder_path=str(root_folder_path))
+
+
+def test_upload_writes_manifest_of_annotations(bucket_client, bucket_name, data_source):
+    DataUploaderService(bucket_client).upload_data(bucket_name, data_source)
+
+    manifest = DataSourceManifest.download(
+        bucket_client=bucket_client,
+        bucket_name=bucket_name,
+        data_source_name=DATA_SOURCE_NAME,
+    )
+
+    assert manifest is not None
+    assert len(manifest) == NUMBER_OF_SAMPLES
+    for index, manifest_entry in enumerate(manifest):
+        image_object = bucket_client.stat_object(bucket_name, manifest_entry.image_path)
+        assert manifest_entry.annotation_path == (
+            f"{DATA_SOURCE_NAME}/annotations/{index:03d}.json"
+        )
+        assert manifest_entry.annotation["label"] == [index % 2]
+        assert manifest_entry.image_size == image_object.size
+        assert manifest_entry.image_sha256 == (
+            hashlib.sha256(bytes([index]) * (1000 + index)).hexdigest()
+        )
+
+
+def test_upload_skips_content_already_stored(bucket_client, bucket_name, data_source):
+    DataUploaderService(bucket_client).upload_data(bucket_name, data_source)
+    # Without the sync state, the files are hashed and compared with the manifest's hashes
+    bucket_client.remove_objects(
+        bucket_name, [SyncState.get_sync_state_object_name(DATA_SOURCE_NAME)]
+    )
+    image_file_path = os.path.join(data_source.root_folder_path, "images", "001.png")
+    with open(image_file_path, "r+b") as f:
+        f.write(b"\xff")
+
+    transfer_stats = DataUploaderService(bucket_client).upload_data(
+        bucket_name, data_source
+    )
+
+    assert transfer_stats.transferred_objects == 1
+    assert transfer_stats.skipped_objects == 2 * NUMBER_OF_SAMPLES - 1
+    with open(image_file_path, "rb") as f:
+        assert (
+            bucket_client.get_object(
+                bucket_name, f"{DATA_SOURCE_NAME}/images/001.png"
+            ).data
+            == f.read()
+        )
+
+
+@pytest.fixture
+def hashed_file_paths(monkeypatch) -> list[str]:
+    """
+    The paths of the files the uploader hashes, in the order it hashes them.
+    """
+    hashed_file_paths: list[str] = []
+    hash_file = DataUploaderService._hash_file
+
+    def _hash_file(file_path: str, hash_constructor: Callable) -> str:
+        hashed_file_paths.append(file_path)
+        return hash_file(file_path, hash_constructor)
+
+    monkeypatch.setattr(DataUploaderService, "_hash_file", staticmethod(_hash_file))
+    return hashed_file_paths
+
+
+def test_sync_skips_unchanged_files_without_reading_them(
+    bucket_client, bucket_name, data_source, hashed_file_paths
+):
+    DataUploaderService(bucket_client).upload_data(bucket_name, data_source)
+
+    transfer_stats = DataUploaderService(bucket_client).upload_data(
+        bucket_name, data_source
+    )
+
+    assert hashed_file_paths == []
+    assert transfer_stats.transferred_objects == 0
+    assert transfer_stats.skipped_objects == 2 * NUMBER_OF_SAMPLES
+
+
+def test_sync_hashes_touched_files_again(
+    bucket_client, bucket_name, data_source, hashed_file_paths
+):
+    DataUploaderService(bucket_client).upload_data(bucket_name, data_source)
+    image_file_path = os.path.join(data_source.root_folder_path, "images", "001.png")
+    os.utime(image_file_path, ns=(0, os.stat(image_file_path).st_mtime_ns + 10**9))
+
+    transfer_stats = DataUploaderService(bucket_client).upload_data(
+        bucket_name, data_source
+    )
+    sync_state = SyncState.download(bucket_client, bucket_name, DATA_SOURCE_NAME)
+
+    # The touched file's content did not change, so it is not uploaded again
+    assert hashed_file_paths == [image_file_path]
+    assert transfer_stats.transferred_objects == 0
+    assert sync_state is not None
+    assert {file_state.object_name: file_state.mtime_ns for file_state in sync_state}[
+        f"{DATA_SOURCE_NAME}/images/001.png"
+    ] == os.stat(image_file_path).st_mtime_ns
+
+
+def test_sync_uploads_changed_files(bucket_client, bucket_name, data_source):
+    DataUploaderService(bucket_client).upload_data(bucket_name, data_source)
+    image_file_path = os.path.join(data_source.root_folder_path, "images", "001.png")
+    with open(image_file_path, "ab") as f:
+        f.write(b"new content")
+
+    transfer_stats = DataUploaderService(bucket_client).upload_data(
+        bucket_name, data_source
+    )
+
+    assert transfer_stats.transferred_objects == 1
+    assert transfer_stats.skipped_objects == 2 * NUMBER_OF_SAMPLES - 1
+
+
+def test_sync_deletes_objects_of_removed_files(bucket_client, bucket_name, data_source):
+    DataUploaderService(bucket_client).upload_data(bucket_name, data_source)
+    os.remove(os.path.join(data_source.root_folder_path, "images", "001.png"))
+
+    transfer_stats = DataUploaderService(
+        bucket_client, delete_removed=True
+    ).upload_data(bucket_name, data_source)
+
+    object_names = {
+        bucket_object.object_name
+        for bucket_object in bucket_client.list_objects(
+            bucket_name, prefix=f"{DATA_SOURCE_NAME}/", recursive=True
+        )
+    }
+    assert transfer_stats.deleted_objects == 1
+    assert f"{DATA_SOURCE_NAME}/images/001.png" not in object_names
+    assert f"{DATA_SOURCE_NAME}/images/002.png" in object_names
+    assert DataSourceManifest.get_manifest_object_name(DATA_SOURCE_NAME) in object_names
+    assert SyncState.get_sync_state_object_name(DATA_SOURCE_NAME) in object_names
+
+
+def test_interrupted_upload_resumes_from_journal(
+    bucket_client, bucket_name, data_source, hashed_file_paths, monkeypatch, tmp_path
+):
+    upload_manifest = DataUploaderService._upload_manifest
+    number_of_interruptions = 1
+
+    def _upload_manifest(self, *args, **kwargs) -> None:
+        nonlocal number_of_interruptions
+        if number_of_interruptions > 0:
+            number_of_interruptions -= 1
+            raise ConnectionError("Interrupted upload")
+        upload_manifest(self, *args, **kwargs)
+
+    monkeypatch.setattr(DataUploaderService, "_upload_manifest", _upload_manifest)
+    upload_journal = UploadJournal(str(tmp_path / "uploads.sqlite"))
+
+    with pytest.raises(ConnectionError):
+        DataUploaderService(bucket_client, upload_journal=upload_journal).upload_data(
+            bucket_name, data_source
+        )
+    interrupted_run = upload_journal.get_runs(DATA_SOURCE_NAME)[0]
+    hashed_file_paths.clear()
+
+    # Neither the sync state nor the manifest were uploaded, the journal alone resumes
+    transfer_stats = DataUploaderService(
+        bucket_client, upload_journal=upload_journal
+    ).upload_data(bucket_name, data_source)
+    resumed_run = upload_journal.get_runs(DATA_SOURCE_NAME)[0]
+    upload_journal.close()
+
+    assert not interrupted_run.is_finished
+    assert interrupted_run.completed_items == 2 * NUMBER_OF_SAMPLES
+    assert hashed_file_paths == []
+    assert transfer_stats.transferred_objects == 0
+    assert resumed_run.run_id == interrupted_run.run_id
+    assert resumed_run.is_finished
+    assert (
+        DataSourceManifest.download(bucket_client, bucket_name, DATA_SOURCE_NAME)
+        is not None
+    )
+
+
+def test_undecoded_image_is_read_from_a_chained_url(tmp_path):
+    image_data = bytes([0x89]) + b"PNG\r\n\x1a\n" + b"\x00" * 32
+    archive_path = tmp_path / "images.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("images/000.png", image_data)
+
+    sha256, encoded_image_data, image_extension, _ = DataUploaderService._encode_image(
+        {"bytes": None, "path": f"zip://images/000.png::{archive_path}"}
+    )
+
+    assert bytes(encoded_image_data) == image_data
+    assert sha256 == hashlib.sha256(image_data).hexdigest()
+    assert image_extension == "png"
@@ -0,0 +1,236 @@
+import io
+import json
+import logging
+
+import pytest
+from PIL import Image
+
+from src.models.model_data_source import LocalDataSource
+from src.models.model_data_source_manifest import DataSourceManifest
+from src.models.model_dataset import Dataset, SplitStrategy
+from src.models.model_dataset_statistics import DatasetStatistics
+from src.services.service_data_uploader import DataUploaderService
+from src.services.service_dataset_preparator import DatasetPreparatorService
+from src.steps.data.data_validators import ImageValidationLevel
+
+DATA_SOURCE_NAME = "source"
+DATASETS_BUCKET_NAME = "datasets"
+NUMBER_OF_SAMPLES = 12
+
+
+def get_image_data(index: int) -> bytes:
+    with io.BytesIO() as f:
+        Image.new("RGB", (16 + index, 8 + index), color=(index, 0, 0)).save(
+            f, format="PNG"
+        )
+        return f.getvalue()
+
+
+@pytest.fixture
+def data_source(tmp_path) -> LocalDataSource:
+    """
+    A local data source of `NUMBER_OF_SAMPLES` PNG images and their annotations.
+    """
+    root_folder_path = tmp_path / DATA_SOURCE_NAME
+    (root_folder_path / "images").mkdir(parents=True)
+    (root_folder_path / "annotations").mkdir()
+    for index in range(NUMBER_OF_SAMPLES):
+        (root_folder_path / "images" / f"{index:03d}.png").write_bytes(
+            get_image_data(index)
+        )
+        (root_folder_path / "annotations" / f"{index:03d}.json").write_text(
+            json.dumps(
+                {
+                    "label": [index % 3],
+                    "bbox": [[0.5, 0.5, 0.2, 0.2]],
+                    "image_path": f"{DATA_SOURCE_NAME}/images/{index:03d}.png",
+                }
+            )
+        )
+    return LocalDataSource(root_folder_path=str(root_folder_path))
+
+
+@pytest.fixture
+def uploaded_data_source(bucket_client, bucket_name, data_source) -> LocalDataSource:
+    """
+    The local data source, uploaded with its manifest, next to an empty datasets' bucket.
+    """
+    DataUploaderService(bucket_client).upload_data(bucket_name, data_source)
+    bucket_client.make_bucket(DATASETS_BUCKET_NAME, enable_versioning=False)
+    return data_source
+
+
+@pytest.fixture
+def read_annotation_file_paths(monkeypatch) -> list[str]:
+    """
+    The annotations whose sample the preparator reads from the bucket, in the order it reads them.
+    """
+    read_annotation_file_paths: list[str] = []
+    read_sample = DatasetPreparatorService._read_sample
+
+    def _read_sample(self, source_bucket_name, annotation_file_path, *args):
+        read_annotation_file_paths.append(annotation_file_path)
+        return read_sample(self, source_bucket_name, annotation_file_path, *args)
+
+    monkeypatch.setattr(DatasetPreparatorService, "_read_sample", _read_sample)
+    return read_annotation_file_paths
+
+
+def remove_manifest(bucket_client, bucket_name: str) -> None:
+    bucket_client.remove_objects(
+        bucket_name, [DataSourceManifest.get_manifest_object_name(DATA_SOURCE_NAME)]
+    )
+
+
+def get_splits(dataset: Dataset) -> dict[str, str]:
+    return {entry.annotation_file_path: entry.split_name for entry in dataset.manifest}
+
+
+@pytest.mark.parametrize("has_manifest", [True, False])
+def test_splits_do_not_depend_on_worker_counts(
+    bucket_client, bucket_name, uploaded_data_source, has_manifest
+):
+    if not has_manifest:
+        remove_manifest(bucket_client, bucket_name)
+    datasets = []
+    for workers in [1, 8]:
+        dataset = Dataset(
+            bucket_name=DATASETS_BUCKET_NAME, split_strategy=SplitStrategy.SEQUENTIAL
+        )
+        DatasetPreparatorService(
+            bucket_client,
+            fetch_workers=workers,
+            validate_workers=workers,
+            copy_workers=workers,
+            max_in_flight=workers,
+        ).prepare_dataset(bucket_name, dataset, uploaded_data_source)
+        datasets.append(dataset)
+
+    serial_dataset, concurrent_dataset = datasets
+    assert len(serial_dataset.manifest) == NUMBER_OF_SAMPLES
+    assert get_splits(concurrent_dataset) == get_splits(serial_dataset)
+
+
+@pytest.mark.parametrize("has_manifest", [True, False])
+@pytest.mark.parametrize(
+    "image_validation_level", [ImageValidationLevel.HEADER, ImageValidationLevel.FULL]
+)
+def test_validation_levels_reject_the_same_corrupt_image(
+    bucket_client,
+    bucket_name,
+    data_source,
+    image_validation_level,
+    has_manifest,
+):
+    image_file_path = f"{data_source.root_folder_path}/images/001.png"
+    with open(image_file_path, "wb") as f:
+        f.write(b"not an image")
+    DataUploaderService(bucket_client).upload_data(bucket_name, data_source)
+    bucket_client.make_bucket(DATASETS_BUCKET_NAME, enable_versioning=False)
+    if not has_manifest:
+        remove_manifest(bucket_client, bucket_name)
+    dataset = Dataset(bucket_name=DATASETS_BUCKET_NAME)
+
+    number_of_samples = DatasetPreparatorService(
+        bucket_client, image_validation_level=image_validation_level
+    ).prepare_dataset(bucket_name, dataset, data_source)
+
+    assert number_of_samples == NUMBER_OF_SAMPLES - 1
+    assert f"{DATA_SOURCE_NAME}/annotations/001.json" not in get_splits(dataset)
+
+
+def test_unchanged_samples_are_carried_over_from_the_parent(
+    bucket_client, bucket_name, uploaded_data_source, read_annotation_file_paths
+):
+    parent_dataset = Dataset(bucket_name=DATASETS_BUCKET_NAME)
+    DatasetPreparatorService(bucket_client).prepare_dataset(
+        bucket_name, parent_dataset, uploaded_data_source
+    )
+    image_file_path = f"{uploaded_data_source.root_folder_path}/images/001.png"
+    with open(image_file_path, "wb") as f:
+        f.write(get_image_data(NUMBER_OF_SAMPLES))
+    DataUploaderService(bucket_client).upload_data(bucket_name, uploaded_data_source)
+    read_annotation_file_paths.clear()
+    # With another seed, the samples' hash splits would change
+    dataset = Dataset(
+        bucket_name=DATASETS_BUCKET_NAME, seed="other", parent_uuid=parent_dataset.uuid
+    )
+
+    number_of_samples = DatasetPreparatorService(bucket_client).prepare_dataset(
+        bucket_name,
+        dataset,
+        uploaded_data_source,
+        parent_manifest=parent_dataset.manifest,
+    )
+
+    assert number_of_samples == NUMBER_OF_SAMPLES
+    assert read_annotation_file_paths == [f"{DATA_SOURCE_NAME}/annotations/001.json"]
+    assert get_splits(dataset) == get_splits(parent_dataset)
+    for entry in dataset.manifest:
+        image_object_name = dataset.format_bucket_image_path(
+            image_file_path=entry.image_file_path, split_name=entry.split_name
+        )
+        with open(
+            f"{uploaded_data_source.root_folder_path}/images/"
+            f"{entry.image_file_path.split('/')[-1]}",
+            "rb",
+        ) as f:
+            assert (
+                bucket_client.get_object(DATASETS_BUCKET_NAME, image_object_name).data
+                == f.read()
+            )
+
+
+def test_statistics_are_uploaded_with_the_dataset(
+    bucket_client, bucket_name, uploaded_data_source
+):
+    dataset = Dataset(bucket_name=DATASETS_BUCKET_NAME)
+
+    DatasetPreparatorService(bucket_client).prepare_dataset(
+        bucket_name, dataset, uploaded_data_source
+    )
+    statistics = DatasetStatistics.download(
+        bucket_client=bucket_client,
+        bucket_name=DATASETS_BUCKET_NAME,
+        dataset_uuid=dataset.uuid,
+    )
+
+    splits = list(get_splits(dataset).values())
+    assert statistics is not None
+    assert statistics["number_of_samples"] == NUMBER_OF_SAMPLES
+    assert statistics["image_bytes"] == sum(
+        len(get_image_data(index)) for index in range(NUMBER_OF_SAMPLES)
+    )
+    assert {
+        split_name: split_statistics["number_of_samples"]
+        for split_name, split_statistics in statistics["splits"].items()
+    } == {split_name: splits.count(split_name) for split_name in dataset.split_names}
+    assert sorted(statistics["classes"]) == ["0", "1", "2"]
+    assert statistics["image_width"]["min"] == 16
+    assert statistics["image_width"]["max"] == 16 + NUMBER_OF_SAMPLES - 1
+    assert (
+        statistics["data_sources"][DATA_SOURCE_NAME]["number_of_records"]
+        == NUMBER_OF_SAMPLES
+    )
+
+
+def test_stratified_splits_fall_back_to_hash_without_manifest(
+    bucket_client, bucket_name, uploaded_data_source, caplog
+):
+    remove_manifest(bucket_client, bucket_name)
+    dataset = Dataset(
+        bucket_name=DATASETS_BUCKET_NAME, split_strategy=SplitStrategy.STRATIFIED
+    )
+
+    with caplog.at_level(logging.WARNING):
+        DatasetPreparatorService(bucket_client).prepare_dataset(
+            bucket_name, dataset, uploaded_data_source
+        )
+
+    assert f"The data source {DATA_SOURCE_NAME} has no manifest" in caplog.text
+    assert get_splits(dataset) == {
+        f"{DATA_SOURCE_NAME}/annotations/{index:03d}.json": dataset.get_split(
+            f"{DATA_SOURCE_NAME}/images/{index:03d}.png"
+        )
+        for index in range(NUMBER_OF_SAMPLES)
+    }
@@ -0,0 +1,139 @@
+import io
+import json
+
+import pytest
+
+from src.models.model_annotation_batch import AnnotationLayout
+from src.models.model_dataset import Dataset, DatasetFormat
+from src.models.model_dataset_manifest import DatasetManifestEntry
+from src.services.service_dataset_sharder import DatasetSharderService
+
+NUMBER_OF_SAMPLES = 6
+
+
+def upload_object(bucket_client, bucket_name: str, object_name: str, data: bytes):
+    bucket_client.upload_data(
+        bucket_name=bucket_name,
+        object_name=object_name,
+        data=io.BytesIO(data),
+        length=len(data),
+    )
+
+
+def store_prepared_dataset(bucket_client, dataset: Dataset) -> None:
+    """
+    Stores the objects and manifest of a prepared dataset, whose odd samples' PNG images were
+    stored as JPEG.
+    """
+    for index in range(NUMBER_OF_SAMPLES):
+        split_name = dataset.split_names[index % len(dataset.split_names)]
+        image_format = "jpeg" if index % 2 else None
+        annotation_file_path = f"source/annotations/{index:03d}.json"
+        image_file_path = f"source/images/{index:03d}.png"
+        annotation_object_name = dataset.format_bucket_annotation_path(
+            annotation_file_path=annotation_file_path, split_name=split_name
+        )
+        annotation = {"image_path": image_file_path, "label": [index]}
+
+        upload_object(
+            bucket_client,
+            dataset.bucket_name,
+            dataset.format_bucket_image_path(
+                image_file_path=image_file_path,
+                split_name=split_name,
+                image_format=image_format,
+            ),
+            f"image-{index}".encode(),
+        )
+        if dataset.annotation_layout == AnnotationLayout.BATCHED:
+            dataset.get_annotation_batch_writer(split_name).add(
+                annotation_object_name, annotation
+            )
+        else:
+            upload_object(
+                bucket_client,
+                dataset.bucket_name,
+                annotation_object_name,
+                json.dumps(annotation).encode(),
+            )
+        dataset.manifest.add_entry(
+            DatasetManifestEntry(
+                annotation_file_path=annotation_file_path,
+                image_file_path=image_file_path,
+                split_name=split_name,
+                image_format=image_format,
+            )
+        )
+
+    for split_name, batch_writer in dataset.get_annotation_batch_writers().items():
+        batch = batch_writer.get_open_batch()
+        assert batch is not None
+        upload_object(bucket_client, dataset.bucket_name, *batch)
+        upload_object(
+            bucket_client,
+            dataset.bucket_name,
+            dataset.get_annotation_index_path(split_name),
+            batch_writer.index.to_bytes(),
+        )
+    upload_object(
+        bucket_client,
+        dataset.bucket_name,
+        dataset.get_manifest_path(),
+        dataset.manifest.to_bytes(),
+    )
+
+
+@pytest.mark.parametrize(
+    "annotation_layout", [AnnotationLayout.OBJECTS, AnnotationLayout.BATCHED]
+)
+def test_unpacked_shards_name_images_after_their_stored_format(
+    bucket_client, bucket_name, tmp_path, annotation_layout
+):
+    dataset = Dataset(bucket_name=bucket_name, annotation_layout=annotation_layout)
+    store_prepared_dataset(bucket_client, dataset)
+
+    shard_index = DatasetSharderService(
+        bucket_client, temporary_path=str(tmp_path)
+    ).write_shards(dataset)
+    dataset.download(bucket_client, str(tmp_path / "dataset"))
+    number_of_samples = dataset.unpack_shards(str(tmp_path / "dataset"))
+
+    assert dataset.dataset_format == DatasetFormat.SHARDS
+    assert number_of_samples == shard_index.get_number_of_samples() == NUMBER_OF_SAMPLES
+    for index in range(NUMBER_OF_SAMPLES):
+        split_name = dataset.split_names[index % len(dataset.split_names)]
+        image_file_name = f"{index:03d}.jpg" if index % 2 else f"{index:03d}.png"
+        with open(
+            tmp_path
+            / "dataset"
+            / dataset.uuid
+            / split_name
+            / "images"
+            / image_file_name,
+            "rb",
+        ) as f:
+            assert f.read() == f"image-{index}".encode()
+
+
+def test_split_objects_are_removed_once_packed(bucket_client, bucket_name, tmp_path):
+    dataset = Dataset(bucket_name=bucket_name)
+    store_prepared_dataset(bucket_client, dataset)
+    # Sharded from another run than the preparation, from its downloaded manifest
+    retrieved_dataset = Dataset(bucket_name=bucket_name, uuid=dataset.uuid)
+
+    DatasetSharderService(bucket_client, temporary_path=str(tmp_path)).write_shards(
+        retrieved_dataset
+    )
+
+    object_names = {
+        bucket_object.object_name
+        for bucket_object in bucket_client.list_objects(
+            bucket_name=bucket_name, prefix=f"{dataset.uuid}/", recursive=True
+        )
+    }
+    assert dataset.get_manifest_path() in object_names
+    assert dataset.get_shard_index_path() in object_names
+    assert all(
+        object_name.startswith(f"{dataset.get_shards_folder_path()}/")
+        for object_name in object_names - {dataset.get_manifest_path()}
+    )
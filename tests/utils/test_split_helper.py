@@ -0,0 +1,87 @@
+import random
+
+import numpy as np
+
+from src.models.model_dataset import Dataset, SplitStrategy
+from src.utils.split_helper import (
+    UNLABELLED_STRATUM,
+    get_label_strata,
+    get_stratified_splits,
+    hash_sample_keys,
+)
+
+SAMPLE_KEYS = [f"source/images/{index:05d}.png" for index in range(1000)]
+
+
+def test_sample_key_hashes_do_not_depend_on_order():
+    hashes = hash_sample_keys(SAMPLE_KEYS, seed="seed")
+    shuffled_indices = list(range(len(SAMPLE_KEYS)))
+    random.Random(0).shuffle(shuffled_indices)
+
+    shuffled_hashes = hash_sample_keys(
+        [SAMPLE_KEYS[index] for index in shuffled_indices], seed="seed"
+    )
+
+    assert (shuffled_hashes == hashes[shuffled_indices]).all()
+    assert len(np.unique(hashes)) == len(SAMPLE_KEYS)
+    assert (hash_sample_keys(SAMPLE_KEYS, seed="other-seed") != hashes).all()
+
+
+def test_sample_key_hashes_ignore_padding_of_shorter_keys():
+    hashes = hash_sample_keys(["a", "a" * 100], seed="seed")
+
+    assert hashes[0] == hash_sample_keys(["a"], seed="seed")[0]
+    assert hashes[1] == hash_sample_keys(["a" * 100], seed="seed")[0]
+
+
+def test_samples_are_stratified_by_rarest_label():
+    strata = get_label_strata([[0, 0, 1], [0], [1, 2], [], [0, 2]])
+
+    # Label 0 is in 3 samples, labels 1 and 2 in 2, ties being broken by value
+    assert strata.tolist() == [1, 0, 1, UNLABELLED_STRATUM, 2]
+
+
+def test_stratified_splits_follow_weights_in_each_stratum():
+    strata = np.repeat([0, 1, 2], [800, 150, 50])
+    sample_hashes = hash_sample_keys(SAMPLE_KEYS, seed="seed")
+
+    splits = get_stratified_splits(strata, sample_hashes, weights=[0.6, 0.2, 0.2])
+
+    for stratum, stratum_count in ((0, 800), (1, 150), (2, 50)):
+        split_counts = np.bincount(splits[strata == stratum], minlength=3)
+        assert split_counts.tolist() == [
+            int(stratum_count * 0.6),
+            int(stratum_count * 0.2),
+            int(stratum_count * 0.2),
+        ]
+
+
+def test_stratified_splits_give_every_split_a_sample_of_rare_strata():
+    strata = np.repeat([0, 1], [997, 3])
+    sample_hashes = hash_sample_keys(SAMPLE_KEYS, seed="seed")
+
+    splits = get_stratified_splits(strata, sample_hashes, weights=[0.8, 0.1, 0.1])
+
+    assert sorted(splits[strata == 1].tolist()) == [0, 1, 2]
+    assert np.bincount(splits, minlength=3).sum() == len(SAMPLE_KEYS)
+
+
+def test_stratified_splits_are_stable_across_orders():
+    labels = [[index % 7] for index in range(len(SAMPLE_KEYS))]
+    dataset = Dataset(
+        bucket_name="datasets", seed="seed", split_strategy=SplitStrategy.STRATIFIED
+    )
+    dataset.assign_stratified_splits(SAMPLE_KEYS, labels)
+    shuffled_dataset = Dataset(
+        bucket_name="datasets", seed="seed", split_strategy=SplitStrategy.STRATIFIED
+    )
+    shuffled_indices = list(range(len(SAMPLE_KEYS)))
+    random.Random(0).shuffle(shuffled_indices)
+    shuffled_dataset.assign_stratified_splits(
+        [SAMPLE_KEYS[index] for index in shuffled_indices],
+        [labels[index] for index in shuffled_indices],
+    )
+
+    assert [shuffled_dataset.get_split(key) for key in SAMPLE_KEYS] == [
+        dataset.get_split(key) for key in SAMPLE_KEYS
+    ]
@@ -0,0 +1,55 @@
+from src.utils.yolo_helper import format_yolo_labels
+
+
+def test_boxes_are_written_as_normalized_lines():
+    label_files = format_yolo_labels(
+        labels=[[0, 3], [1]],
+        bboxes=[
+            [[0.5, 0.5, 0.2, 0.4], [0.25, 0.75, 0.1, 0.1]],
+            [[0.1, 0.2, 0.05, 0.1]],
+        ],
+    )
+
+    assert label_files == [
+        "0 0.500000 0.500000 0.200000 0.400000\n3 0.250000 0.750000 0.100000 0.100000\n",
+        "1 0.100000 0.200000 0.050000 0.100000\n",
+    ]
+
+
+def test_boxes_overflowing_the_image_are_clipped():
+    label_files = format_yolo_labels(
+        labels=[[2]],
+        # Spans [-0.1, 0.3] horizontally and [0.8, 1.2] vertically
+        bboxes=[[[0.1, 1.0, 0.4, 0.4]]],
+    )
+
+    assert label_files == ["2 0.150000 0.900000 0.300000 0.200000\n"]
+
+
+def test_invalid_boxes_are_dropped():
+    label_files = format_yolo_labels(
+        labels=[[0, -1, 1, 2], [4]],
+        bboxes=[
+            [
+                # Without an area, negative label, outside of the image, kept
+                [0.5, 0.5, 0.0, 0.2],
+                [0.5, 0.5, 0.2, 0.2],
+                [1.5, 0.5, 0.2, 0.2],
+                [0.5, 0.5, 0.2, 0.2],
+            ],
+            # Label without a box
+            [],
+        ],
+    )
+
+    assert label_files == ["2 0.500000 0.500000 0.200000 0.200000\n", ""]
+
+
+def test_annotations_without_boxes_have_empty_label_files():
+    assert format_yolo_labels(
+        labels=[[], [0]], bboxes=[[], [[0.5, 0.5, 1.0, 1.0]]]
+    ) == [
+        "",
+        "0 0.500000 0.500000 1.000000 1.000000\n",
+    ]
+    assert format_yolo_labels(labels=[], bboxes=[]) == []